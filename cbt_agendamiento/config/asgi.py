@@ -3,6 +3,10 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Se sirve con uvicorn junto al worker WSGI (servicio `api` de
+docker-compose.prod.yaml, con ASGI_API=True) para las APIs de sondeo async:
+api_mis_notificaciones, api_estadisticas y api_buscar_propietario.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -42,6 +42,34 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# --- PERFILAMIENTO (Opt-in) ---
+# Métricas por vista en /panel-operativo/metricas/ (formato Prometheus).
+PERFILAMIENTO_ACTIVO = os.environ.get('PERFILAMIENTO_ACTIVO', 'False') == 'True'
+PERFILAMIENTO_UMBRAL_MS = int(os.environ.get('PERFILAMIENTO_UMBRAL_MS', '1000'))  # Guardar perfil si supera
+PERFILAMIENTO_MUESTREO = float(os.environ.get('PERFILAMIENTO_MUESTREO', '0'))     # Fracción bajo cProfile
+PERFILAMIENTO_DIRECTORIO = os.environ.get('PERFILAMIENTO_DIRECTORIO', os.path.join(BASE_DIR, 'perfiles'))
+
+if PERFILAMIENTO_ACTIVO:
+    MIDDLEWARE.insert(0, 'core.middleware.PerfilamientoMiddleware')
+
+# --- MONITOR SQL (Consultas lentas y repetidas) ---
+# Los comandos de gestión siempre imprimen su resumen; en vistas es opt-in.
+SQL_MONITOR_ACTIVO = os.environ.get('SQL_MONITOR_ACTIVO', 'False') == 'True'
+SQL_LENTA_MS = int(os.environ.get('SQL_LENTA_MS', '200'))
+SQL_REPETICIONES_MAX = int(os.environ.get('SQL_REPETICIONES_MAX', '5'))
+
+if SQL_MONITOR_ACTIVO:
+    MIDDLEWARE.append('core.instrumentacion.MonitorConsultasMiddleware')
+
+# --- WORKER ASGI (APIs de sondeo async) ---
+# El servicio `api` (config.asgi bajo uvicorn) atiende las APIs JSON que sondea
+# el navegador. WhiteNoise solo es síncrono y obligaría a saltar a un hilo en
+# cada petición: los estáticos los sirve el worker WSGI.
+ASGI_API = os.environ.get('ASGI_API', 'False') == 'True'
+
+if ASGI_API:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -60,20 +88,91 @@ TEMPLATES = [
     },
 ]
 
+if PERFILAMIENTO_ACTIVO:
+    # Backend idéntico a DjangoTemplates que además cronometra el render
+    TEMPLATES[0]['BACKEND'] = 'core.metricas.DjangoTemplatesMedido'
+
 WSGI_APPLICATION = 'config.wsgi.application'
 
 
 # --- BASE DE DATOS (POSTGIS) ---
-# dj_database_url lee la variable DATABASE_URL o usa la default local
+# dj_database_url lee la variable DATABASE_URL o usa la default local.
+# Conexiones persistentes por worker con chequeo de salud antes de reutilizarlas
+# (Django 4.2 no trae pool propio). Con DB_PGBOUNCER=True el pool lo hace
+# PgBouncer en modo transacción, que no admite cursores del lado del servidor.
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'False') == 'True'
+_OPCIONES_DB = {
+    'conn_max_age': 600,                              # Mantiene la conexión viva 10 min (Rendimiento)
+    'conn_health_checks': True,                       # Descarta conexiones caídas (reinicio/failover de RDS)
+    'disable_server_side_cursors': DB_PGBOUNCER,
+    'ssl_require': not DEBUG,                         # En producción (AWS RDS) requiere SSL
+}
 DATABASES = {
     'default': dj_database_url.config(
         default=os.environ.get('DATABASE_URL', 'postgis://postgres:supersecreto@db:5432/bomberos_db'),
-        conn_max_age=600,         # Mantiene la conexión viva 10 min (Rendimiento)
-        ssl_require=not DEBUG     # En producción (AWS RDS) requiere SSL
+        **_OPCIONES_DB
     )
 }
-# Forzar el motor PostGIS explícitamente
-DATABASES['default']['ENGINE'] = 'django.contrib.gis.db.backends.postgis'
+# Réplica de lectura para informes y estadísticas (core.routers). Para probar
+# en local basta con apuntarla al mismo servidor: es otra conexión (alias).
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL', '')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(DATABASE_REPLICA_URL, **_OPCIONES_DB)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['core.routers.RouterReplica']
+
+# Forzar el motor PostGIS explícitamente (SpatiaLite se respeta como sustituto local para pruebas)
+for _db in DATABASES.values():
+    if _db['ENGINE'] != 'django.contrib.gis.db.backends.spatialite':
+        _db['ENGINE'] = 'django.contrib.gis.db.backends.postgis'
+
+
+# --- CACHÉ (core.cache) ---
+# CACHE_URL=redis://host:6379/0 comparte la caché entre workers (Redis o un
+# servidor compatible). Sin ella cada proceso usa su propia memoria. El alias
+# 'local' es siempre por proceso: core.cache lo usa si la compartida falla.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+CACHE_TIMEOUT_SOCKET = float(os.environ.get('CACHE_TIMEOUT_SOCKET', '0.5'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+        'KEY_PREFIX': 'cbt',
+        'OPTIONS': {'socket_connect_timeout': CACHE_TIMEOUT_SOCKET, 'socket_timeout': CACHE_TIMEOUT_SOCKET},
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cbt',
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cbt-local',
+    },
+}
+
+
+# --- SESIONES E IDENTIDAD (core.identidad) ---
+# Sesiones leídas de la caché compartida (con respaldo en la tabla) y usuario
+# autenticado cacheado por usuario. ModelBackend queda solo para las sesiones
+# abiertas antes del cambio (guardan su ruta); se puede quitar cuando caduquen.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'default'
+AUTHENTICATION_BACKENDS = [
+    'core.identidad.BackendCacheado',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+
+# --- LOGGING ---
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core': {'handlers': ['console'], 'level': os.environ.get('CORE_LOG_LEVEL', 'INFO')},
+    },
+}
 
 
 # Password validation
@@ -133,11 +232,37 @@ DEFAULT_FROM_EMAIL = 'Cuerpo de Bomberos Tulcán <notificaciones@bomberostulcan.
 
 # SMS (AWS SNS):
 # Las credenciales se toman de variables de entorno en producción.
-# En local, el código en utils.py hará una simulación si no encuentra las claves.
+# En local (sin claves) se usa el backend de consola de core.sms.
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID', '')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY', '')
 AWS_REGION = 'us-east-1'
 
+SMS_BACKEND = os.environ.get(
+    'SMS_BACKEND',
+    'core.sms.SNSBackend' if AWS_ACCESS_KEY_ID and not DEBUG else 'core.sms.ConsolaBackend'
+)
+SMS_REMITENTE = os.environ.get('SMS_REMITENTE', '')               # SenderID (si el operador lo admite)
+SMS_POR_SEGUNDO = float(os.environ.get('SMS_POR_SEGUNDO', '10'))  # Cuota de SNS por cuenta
+SMS_HILOS = int(os.environ.get('SMS_HILOS', '4'))
+
+# ADMISIÓN DE RESERVAS (core.admision):
+# Límite de peticiones por usuario e IP (por minuto) y espera máxima (segundos,
+# corta: retiene el worker) en la cola de reservas de una agenda antes de pedir
+# al usuario que reintente.
+ADMISION_POR_USUARIO = int(os.environ.get('ADMISION_POR_USUARIO', '30'))
+ADMISION_POR_IP = int(os.environ.get('ADMISION_POR_IP', '120'))
+ADMISION_ESPERA_COLA = float(os.environ.get('ADMISION_ESPERA_COLA', '0.25'))
+ADMISION_TTL_DISPONIBILIDAD = int(os.environ.get('ADMISION_TTL_DISPONIBILIDAD', '5'))
+# Número de proxies de confianza delante de la app (para leer X-Forwarded-For)
+ADMISION_PROXIES = int(os.environ.get('ADMISION_PROXIES', '0'))
+
+# PDF (core.pdf):
+# Hoja de ruta e informe generados con WeasyPrint en un pool de procesos.
+# El directorio debe ser compartido por todos los workers (volumen en Docker);
+# con PDF_PROCESOS=0 se genera dentro de la petición.
+PDF_DIRECTORIO = os.environ.get('PDF_DIRECTORIO', os.path.join(BASE_DIR, 'pdf'))
+PDF_PROCESOS = int(os.environ.get('PDF_PROCESOS', '2'))
+
 
 # ==============================================================================
 #                      SEGURIDAD (ISO 27001 / OWASP)
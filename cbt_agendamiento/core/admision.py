@@ -0,0 +1,141 @@
+"""
+Capa de admisión para las ráfagas de reservas (p. ej. al anunciar una visita
+rural, todos los propietarios de la parroquia abren la agenda a la vez).
+
+- Límite de peticiones por usuario y por IP con contadores en la caché
+  (ventana fija de un minuto); al superarlo se responde 429 con Retry-After.
+- Disponibilidad en el espacio `cache.DISPONIBILIDAD`: las lecturas
+  simultáneas de una parroquia comparten un único GROUP BY en lugar de
+  repetirlo cada una.
+- Cola corta para los POST de reserva: una reserva por agenda a la vez; si
+  la agenda está ocupada se reintenta solo una fracción de segundo y luego se
+  avisa al usuario, en lugar de retener el worker o esperar el bloqueo
+  `select_for_update` en la base de datos.
+"""
+import secrets
+import time
+from contextlib import contextmanager
+from datetime import date
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count
+from django.shortcuts import render
+
+from . import cache
+from .models import Turno
+
+VENTANA = 60                    # Segundos por ventana del límite de peticiones
+PAUSA_COLA = 0.05               # Segundos entre intentos de tomar la agenda
+
+
+class ColaLlena(Exception):
+    """La reserva no consiguió turno en la cola dentro del tiempo de espera."""
+
+
+# ==============================================================================
+#                            LÍMITE DE PETICIONES
+# ==============================================================================
+
+def ip_cliente(request):
+    """IP del cliente; X-Forwarded-For solo se usa si hay proxies de confianza."""
+    proxies = getattr(settings, 'ADMISION_PROXIES', 0)
+    if proxies:
+        reenviadas = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(reenviadas) >= proxies:
+            return reenviadas[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def consumir(clave, limite, ventana=VENTANA):
+    """Cuenta una petición para `clave`. Devuelve los segundos a esperar (0 si se admite)."""
+    if not limite:
+        return 0
+    ahora = int(time.time())
+    inicio = ahora // ventana * ventana
+    key = (clave, inicio)
+    cache.LIMITES.add(key, 0, ventana + 1)
+    try:
+        usadas = cache.LIMITES.incr(key)
+    except ValueError:
+        # La clave caducó entre add() e incr()
+        cache.LIMITES.set(key, 1, ventana + 1)
+        usadas = 1
+    return max(1, inicio + ventana - ahora) if usadas > limite else 0
+
+
+def limitar_reservas(vista):
+    """Decorador: 429 al superar ADMISION_POR_USUARIO o ADMISION_POR_IP por minuto."""
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        limites = [(f"ip:{ip_cliente(request)}", getattr(settings, 'ADMISION_POR_IP', 0))]
+        if request.user.is_authenticated:
+            limites.append((f"usuario:{request.user.pk}", getattr(settings, 'ADMISION_POR_USUARIO', 0)))
+        espera = max(consumir(clave, limite) for clave, limite in limites)
+        if espera:
+            respuesta = render(request, '429.html', {'espera': espera}, status=429)
+            respuesta['Retry-After'] = str(espera)
+            return respuesta
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+# ==============================================================================
+#                             DISPONIBILIDAD
+# ==============================================================================
+
+def invalidar_disponibilidad(**kwargs):
+    """Tras una reserva o un cambio de estado: las lecturas siguientes recalculan."""
+    cache.DISPONIBILIDAD.invalidar()
+
+
+def ocupacion(parroquia):
+    """
+    {(agenda_id, bloque): ocupados} de las agendas vigentes de la parroquia con
+    un solo GROUP BY, compartido por las peticiones simultáneas. Solo sirve para
+    mostrar la disponibilidad: la reserva vuelve a contar bajo bloqueo.
+    """
+    hoy = date.today()
+
+    def calcular():
+        filas = Turno.objects.filter(
+            agenda__parroquia_destino=parroquia, fecha_agenda__gte=hoy, agenda__cupos_habilitados=True,
+        ).exclude(estado__in=Turno.ESTADOS_SIN_CUPO).values('agenda_id', 'bloque').annotate(n=Count('id')).order_by()
+        return {(f['agenda_id'], f['bloque']): f['n'] for f in filas}
+
+    return cache.DISPONIBILIDAD.obtener(
+        (parroquia, hoy), calcular, getattr(settings, 'ADMISION_TTL_DISPONIBILIDAD', 5),
+    )
+
+
+# ==============================================================================
+#                           COLA DE RESERVAS (POST)
+# ==============================================================================
+
+def agenda_pedida(request):
+    """agenda_id del POST como entero; None si falta o no es un número."""
+    valor = request.POST.get('agenda_id', '')
+    return int(valor) if valor.isdigit() else None
+
+
+@contextmanager
+def cola_reserva(agenda_id, espera=None):
+    """
+    Turno para reservar en una agenda: una reserva a la vez por agenda (entre
+    procesos, vía la caché). Si otra la tiene, se reintenta cada PAUSA_COLA
+    hasta ADMISION_ESPERA_COLA segundos (0: se rechaza al primer intento) y
+    luego se lanza ColaLlena. Al salir, la ficha se libera solo si sigue
+    siendo la propia: si caducó y otra petición tomó la agenda, no se toca.
+    """
+    espera = getattr(settings, 'ADMISION_ESPERA_COLA', 0.25) if espera is None else espera
+    clave = ('agenda', agenda_id)
+    ficha = secrets.randbits(62)
+    limite = time.monotonic() + espera
+    while not cache.COLAS.add(clave, ficha):
+        if time.monotonic() + PAUSA_COLA > limite:
+            raise ColaLlena(agenda_id)
+        time.sleep(PAUSA_COLA)
+    try:
+        yield
+    finally:
+        cache.COLAS.liberar(clave, ficha)
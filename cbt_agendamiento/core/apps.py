@@ -4,3 +4,25 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from django.contrib.auth import get_user_model
+
+        from . import geo, identidad
+        from .models import Establecimiento, PerfilUsuario, Turno
+
+        # Cualquier cambio de turno o de ubicación invalida las teselas del mapa
+        for modelo in (Turno, Establecimiento):
+            post_save.connect(geo.invalidar_mapa, sender=modelo, dispatch_uid=f'mapa_{modelo.__name__}_save')
+            post_delete.connect(geo.invalidar_mapa, sender=modelo, dispatch_uid=f'mapa_{modelo.__name__}_delete')
+
+        # La identidad cacheada del usuario (perfil, locales) se descarta al cambiar
+        for modelo, receptor in (
+            (get_user_model(), identidad.al_guardar_usuario),
+            (PerfilUsuario, identidad.al_guardar_perfil),
+            (Establecimiento, identidad.al_guardar_establecimiento),
+        ):
+            post_save.connect(receptor, sender=modelo, dispatch_uid=f'identidad_{modelo.__name__}_save')
+            post_delete.connect(receptor, sender=modelo, dispatch_uid=f'identidad_{modelo.__name__}_delete')
@@ -0,0 +1,29 @@
+"""
+Apoyo para las vistas async de las APIs de sondeo (servidas por el worker
+ASGI, ver config/asgi.py).
+
+En Django 4.2 `login_required` y la carga de `request.user` son síncronos: la
+sesión y el usuario se resuelven una sola vez con sync_to_async (con
+`identidad.BackendCacheado` suele ser un acierto de caché) y después el objeto
+se usa desde la corrutina sin bloquear el bucle de eventos.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+
+
+async def usuario(request):
+    """`request.user` ya resuelto, usable sin consultas desde código async."""
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+def login_requerido_async(vista):
+    """`login_required` para vistas async (el de Django 4.2 solo envuelve vistas síncronas)."""
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        if not (await usuario(request)).is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await vista(request, *args, **kwargs)
+    return envoltura
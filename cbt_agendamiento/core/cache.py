@@ -0,0 +1,334 @@
+"""
+Subsistema de caché de `core`.
+
+El backend se configura desde el entorno (ver CACHES en settings): con
+CACHE_URL=redis://... la caché se comparte entre workers (Redis o compatible);
+sin ella cada proceso usa su LocMemCache. El alias 'local' es siempre por
+proceso y sirve de respaldo: si la caché compartida falla, las operaciones
+pasan a la local durante PAUSA_RESPALDO segundos en lugar de romper la
+petición.
+
+Todas las cachés de la app se declaran como `Espacio` al final del módulo:
+
+- Claves con espacio de nombres y, si el espacio es versionado, con su
+  versión: invalidar es cambiar la versión (las claves viejas caducan solas).
+- `obtener()` protege contra estampidas: el primer cálculo se hace una sola
+  vez (hilos del proceso + candado en la caché) y, antes de caducar, un único
+  lector recalcula de forma anticipada (XFetch) mientras el resto sigue
+  sirviendo el valor vigente.
+- Contadores de aciertos por espacio en `metricas` (hit ratio en Prometheus).
+"""
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+from . import metricas
+
+logger = logging.getLogger('core.cache')
+
+ESPERA_CALCULO = 3      # Máximo que un lector espera el cálculo de otro
+PAUSA_RESPALDO = 30     # Segundos en la caché local tras un fallo de la compartida
+BETA = 1.0              # > 1 adelanta más el recálculo anticipado
+
+_respaldo_hasta = 0.0
+_vuelos = {}
+_vuelos_lock = threading.Lock()
+_vuelos_async = {}
+
+# Compare-and-delete atómico en Redis: borra la clave solo si aún guarda el valor
+_BORRAR_SI_IGUAL = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+def _borrar_si_igual(backend, key, valor):
+    """
+    delete(key) solo si la clave guarda `valor` (un entero: RedisCache no lo
+    serializa y el script lo compara tal cual). En LocMemCache, que es por
+    proceso, basta con leer y borrar.
+    """
+    if isinstance(backend, RedisCache):
+        key = backend.make_and_validate_key(key)
+        return bool(backend._cache.get_client(key, write=True).eval(_BORRAR_SI_IGUAL, 1, key, valor))
+    if backend.get(key) != valor:
+        return False
+    return backend.delete(key)
+
+
+def _op(metodo, *args):
+    """
+    Ejecuta `metodo` (nombre de un método de la caché o función que recibe el
+    backend) en la caché compartida o, si no responde, en la local.
+    """
+    global _respaldo_hasta
+    local = caches['local']
+    backend = local if time.monotonic() < _respaldo_hasta else caches['default']
+
+    def ejecutar(b):
+        return metodo(b, *args) if callable(metodo) else getattr(b, metodo)(*args)
+
+    try:
+        return ejecutar(backend)
+    except ValueError:
+        raise  # incr() de una clave inexistente: lo resuelve quien llama
+    except Exception:
+        if backend is local:
+            raise
+        logger.warning("Caché compartida no disponible; se usa la local %ss", PAUSA_RESPALDO, exc_info=True)
+        _respaldo_hasta = time.monotonic() + PAUSA_RESPALDO
+        return ejecutar(local)
+
+
+async def _aop(metodo, *args):
+    """_op() con los métodos async de la caché (aget, aset...)."""
+    global _respaldo_hasta
+    local = caches['local']
+    backend = local if time.monotonic() < _respaldo_hasta else caches['default']
+    try:
+        return await getattr(backend, f"a{metodo}")(*args)
+    except ValueError:
+        raise
+    except Exception:
+        if backend is local:
+            raise
+        logger.warning("Caché compartida no disponible; se usa la local %ss", PAUSA_RESPALDO, exc_info=True)
+        _respaldo_hasta = time.monotonic() + PAUSA_RESPALDO
+        return await getattr(local, f"a{metodo}")(*args)
+
+
+def _vigente(delta, expira):
+    """
+    XFetch: la probabilidad de recalcular crece al acercarse la caducidad y
+    con lo que tardó el último cálculo (1 - random() evita log(0)).
+    """
+    return time.time() - delta * BETA * math.log(1 - random.random()) < expira
+
+
+class Espacio:
+    """
+    Espacio de nombres de la caché. Las claves se pasan como texto o como
+    tupla de partes: ('turnos', z, x, y) -> 'mapa:<versión>:turnos:z:x:y'.
+    """
+
+    def __init__(self, nombre, ttl=300, versionado=True):
+        self.nombre = nombre
+        self.ttl = ttl
+        self.versionado = versionado
+
+    # --- Versiones ---
+    def version(self):
+        return _op('get_or_set', f"{self.nombre}:version", time.time_ns, None)
+
+    def invalidar(self, **kwargs):
+        """
+        Cambia la versión del espacio (acepta **kwargs para usarse como
+        receptor de señales). Es un sello de tiempo y no un contador para que
+        una versión desalojada nunca vuelva a coincidir con claves viejas.
+        """
+        _op('set', f"{self.nombre}:version", time.time_ns(), None)
+
+    def clave(self, clave):
+        return self._componer(clave, self.version() if self.versionado else None)
+
+    async def aclave(self, clave):
+        version = await _aop('get_or_set', f"{self.nombre}:version", time.time_ns, None) if self.versionado else None
+        return self._componer(clave, version)
+
+    def _componer(self, clave, version):
+        partes = clave if isinstance(clave, tuple) else (clave,)
+        prefijo = (self.nombre, version) if self.versionado else (self.nombre,)
+        return ':'.join(map(str, prefijo + partes))
+
+    # --- Operaciones simples ---
+    def get(self, clave, default=None):
+        return _op('get', self.clave(clave), default)
+
+    def set(self, clave, valor, ttl=None):
+        _op('set', self.clave(clave), valor, self.ttl if ttl is None else ttl)
+
+    def add(self, clave, valor, ttl=None):
+        return _op('add', self.clave(clave), valor, self.ttl if ttl is None else ttl)
+
+    def incr(self, clave, delta=1):
+        return _op('incr', self.clave(clave), delta)
+
+    def delete(self, clave):
+        _op('delete', self.clave(clave))
+
+    def liberar(self, clave, valor):
+        """delete() solo si `clave` aún guarda `valor` (p. ej. la ficha de quien la tomó)."""
+        return _op(_borrar_si_igual, self.clave(clave), valor)
+
+    # --- Lectura con cálculo ---
+    def obtener(self, clave, calcular, ttl=None):
+        """
+        Valor de `clave` o, si falta, `calcular()` guardado `ttl` segundos.
+        Cuenta un acierto o un fallo en las métricas del espacio.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        key = self.clave(clave)
+        entrada = _op('get', key)
+        if entrada is None:
+            self._contar(False)
+            return self._calcular_una_vez(key, calcular, ttl)
+
+        self._contar(True)
+        valor, delta, expira = entrada
+        if _vigente(delta, expira):
+            return valor
+        candado = f"{key}:calculando"
+        if not _op('add', candado, 1, ESPERA_CALCULO):
+            return valor  # Otro lector ya lo está recalculando
+        try:
+            return self._guardar(key, calcular, ttl)
+        finally:
+            _op('delete', candado)
+
+    def _guardar(self, key, calcular, ttl):
+        inicio = time.perf_counter()
+        valor = calcular()
+        delta = time.perf_counter() - inicio
+        _op('set', key, (valor, delta, time.time() + ttl), ttl)
+        return valor
+
+    def _leer(self, key):
+        entrada = _op('get', key)
+        return entrada[0] if entrada is not None else None
+
+    def _calcular_una_vez(self, key, calcular, ttl):
+        """
+        Primer cálculo de `key`: los hilos del proceso esperan al primero y,
+        entre procesos, un candado en la caché hace que el resto espere el
+        resultado. Si el cálculo ajeno no llega a tiempo, cada lector calcula
+        por su cuenta (nunca se queda sin respuesta).
+        """
+        with _vuelos_lock:
+            evento = _vuelos.get(key)
+            lider = evento is None
+            if lider:
+                evento = _vuelos[key] = threading.Event()
+        if not lider:
+            evento.wait(ESPERA_CALCULO)
+            valor = self._leer(key)
+            return valor if valor is not None else calcular()
+
+        candado = f"{key}:calculando"
+        propio = False
+        try:
+            propio = _op('add', candado, 1, ESPERA_CALCULO)
+            if not propio:
+                valor = self._esperar(key)
+                if valor is not None:
+                    return valor
+            return self._guardar(key, calcular, ttl)
+        finally:
+            if propio:
+                _op('delete', candado)
+            with _vuelos_lock:
+                _vuelos.pop(key, None)
+            evento.set()
+
+    def _esperar(self, key):
+        limite = time.monotonic() + ESPERA_CALCULO
+        pausa = 0.02
+        while time.monotonic() < limite:
+            valor = self._leer(key)
+            if valor is not None:
+                return valor
+            time.sleep(pausa)
+            pausa = min(pausa * 2, 0.2)
+        return None
+
+    # --- Lectura con cálculo (async) ---
+    async def aobtener(self, clave, calcular, ttl=None):
+        """
+        obtener() para vistas async: `calcular` devuelve una corrutina (p. ej.
+        el ORM async) y la caché se usa con sus métodos async.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        key = await self.aclave(clave)
+        entrada = await _aop('get', key)
+        if entrada is None:
+            self._contar(False)
+            return await self._acalcular_una_vez(key, calcular, ttl)
+
+        self._contar(True)
+        valor, delta, expira = entrada
+        if _vigente(delta, expira):
+            return valor
+        candado = f"{key}:calculando"
+        if not await _aop('add', candado, 1, ESPERA_CALCULO):
+            return valor
+        try:
+            return await self._aguardar(key, calcular, ttl)
+        finally:
+            await _aop('delete', candado)
+
+    async def _aguardar(self, key, calcular, ttl):
+        inicio = time.perf_counter()
+        valor = await calcular()
+        delta = time.perf_counter() - inicio
+        await _aop('set', key, (valor, delta, time.time() + ttl), ttl)
+        return valor
+
+    async def _acalcular_una_vez(self, key, calcular, ttl):
+        """Como _calcular_una_vez(): las corrutinas del proceso comparten una tarea."""
+        tarea = _vuelos_async.get(key)
+        if tarea is None:
+            tarea = _vuelos_async[key] = asyncio.ensure_future(self._acalcular_con_candado(key, calcular, ttl))
+            tarea.add_done_callback(lambda _: _vuelos_async.pop(key, None))
+        try:
+            return await asyncio.wait_for(asyncio.shield(tarea), ESPERA_CALCULO)
+        except asyncio.TimeoutError:
+            return await calcular()
+
+    async def _acalcular_con_candado(self, key, calcular, ttl):
+        candado = f"{key}:calculando"
+        propio = await _aop('add', candado, 1, ESPERA_CALCULO)
+        try:
+            if not propio:
+                limite = time.monotonic() + ESPERA_CALCULO
+                pausa = 0.02
+                while time.monotonic() < limite:
+                    entrada = await _aop('get', key)
+                    if entrada is not None:
+                        return entrada[0]
+                    await asyncio.sleep(pausa)
+                    pausa = min(pausa * 2, 0.2)
+            return await self._aguardar(key, calcular, ttl)
+        finally:
+            if propio:
+                await _aop('delete', candado)
+
+    # --- Métricas ---
+    def _contar(self, acierto):
+        metricas.registrar_cache(acierto)
+        metricas.registro.contar_cache(self.nombre, acierto)
+
+    def tasa_aciertos(self):
+        return metricas.registro.tasa_aciertos(self.nombre)
+
+
+# ==============================================================================
+#                            ESPACIOS DE LA APP
+# ==============================================================================
+
+# Teselas del mapa operativo; versión cambiada por las señales de Turno/Establecimiento
+MAPA = Espacio('mapa', ttl=60 * 10)
+# Ocupación por parroquia para las pantallas de reserva (core.admision)
+DISPONIBILIDAD = Espacio('disponibilidad', ttl=5)
+# Contadores del dashboard (api_estadisticas)
+ESTADISTICAS = Espacio('estadisticas', ttl=30)
+# Usuario autenticado con perfil e ids de locales (core.identidad); por usuario, sin versión
+IDENTIDAD = Espacio('identidad', ttl=60, versionado=False)
+# Contadores de límite de peticiones y fichas de la cola de reservas: sin versión
+LIMITES = Espacio('admision', versionado=False)
+COLAS = Espacio('cola', ttl=30, versionado=False)
+# Versión del informe de inspecciones (cambia con cada refresco de la vista materializada)
+INFORME = Espacio('informe')
+# Marcas de los PDF en generación (core.pdf): compartidas para generar cada uno una sola vez
+PDF = Espacio('pdf', versionado=False)
@@ -0,0 +1,310 @@
+"""
+Planificación de capacidad con sobrecupo según el historial de turnos.
+
+Las tasas de ausencia (NO_REALIZADA) y de cancelación (CANCELADO/RECHAZADO)
+se agregan en la base de datos con un único GROUP BY por parroquia, día de la
+semana y giro de negocio. Un turno cancelado libera su cupo (y la lista de
+espera lo vuelve a ocupar), así que la ausencia se mide solo sobre las
+reservas que conservaron su cupo y es la única que reduce la asistencia; la
+tasa de cancelación se conserva como dato informativo. Cada nivel se
+suaviza hacia el nivel superior (giro -> parroquia+día -> parroquia ->
+global) para que los grupos con pocos turnos no produzcan tasas extremas.
+
+El sobrecupo de una jornada es el mayor número de reservas adicionales tal
+que la probabilidad de que se presenten más visitas que la capacidad física
+(modelo binomial) no supere el riesgo configurado.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from math import comb
+
+from django.db.models import Count, F, Q
+from django.db.models.functions import ExtractIsoWeekDay
+
+from .models import AgendaDiaria, Turno
+
+ESTADOS_FINALES = ('TERMINADO', 'NO_REALIZADA', 'CANCELADO', 'RECHAZADO')
+ESTADOS_CANCELACION = ('CANCELADO', 'RECHAZADO')
+PESO_PREVIO = 20            # Turnos "virtuales" del nivel superior al suavizar
+RIESGO_DEFECTO = 0.10       # Probabilidad máxima de exceder la capacidad física
+MAX_SOBRECUPO = 0.5         # Nunca más del 50 % sobre la capacidad
+BLOQUES = ('MANANA', 'TARDE')
+
+
+@dataclass
+class Conteo:
+    total: int = 0
+    ausencias: int = 0
+    cancelaciones: int = 0
+
+    @property
+    def vigentes(self):
+        """Reservas que conservaron su cupo hasta el día de la agenda."""
+        return self.total - self.cancelaciones
+
+    def __iadd__(self, otro):
+        self.total += otro.total
+        self.ausencias += otro.ausencias
+        self.cancelaciones += otro.cancelaciones
+        return self
+
+
+@dataclass
+class Tasas:
+    ausencia: float = 0.0
+    cancelacion: float = 0.0
+    muestras: int = 0
+
+    @property
+    def asistencia(self):
+        # Las cancelaciones liberan el cupo: solo la ausencia deja una visita sin hacer
+        return max(0.0, 1 - self.ausencia)
+
+    def suavizar(self, conteo, peso=PESO_PREVIO):
+        """
+        Tasas del grupo `conteo` con `self` como previa (media bayesiana). La
+        ausencia se mide sobre las reservas vigentes y la cancelación sobre el total.
+        """
+        return Tasas(
+            ausencia=_media(conteo.ausencias, conteo.vigentes, self.ausencia, peso),
+            cancelacion=_media(conteo.cancelaciones, conteo.total, self.cancelacion, peso),
+            muestras=conteo.total,
+        )
+
+
+def _media(casos, total, previa, peso):
+    n = total + peso
+    return (casos + peso * previa) / n if n else previa
+
+
+# ==============================================================================
+#                                 HISTORIAL
+# ==============================================================================
+
+def agregar_historial(desde=None, hasta=None):
+    """
+    Una consulta: conteos por (parroquia, día ISO, giro) de los turnos ya
+    cerrados con agenda en [desde, hasta).
+    """
+    qs = Turno.objects.filter(estado__in=ESTADOS_FINALES)
+    if desde:
+        qs = qs.filter(fecha_agenda__gte=desde)
+    if hasta:
+        qs = qs.filter(fecha_agenda__lt=hasta)
+    return qs.values(
+        parroquia=F('agenda__parroquia_destino'),
+        dia=ExtractIsoWeekDay('fecha_agenda'),
+        tipo=F('establecimiento__tipo_id'),
+    ).annotate(
+        total=Count('id'),
+        ausencias=Count('id', filter=Q(estado='NO_REALIZADA')),
+        cancelaciones=Count('id', filter=Q(estado__in=ESTADOS_CANCELACION)),
+    ).order_by()
+
+
+class ModeloTasas:
+    """Tasas jerárquicas a partir de las filas de `agregar_historial`."""
+
+    def __init__(self, filas):
+        self.grupos = {}
+        global_ = Conteo()
+        por_parroquia = defaultdict(Conteo)
+        por_dia = defaultdict(Conteo)
+        for f in filas:
+            conteo = Conteo(f['total'], f['ausencias'], f['cancelaciones'])
+            self.grupos[(f['parroquia'], f['dia'], f['tipo'])] = conteo
+            global_ += conteo
+            por_parroquia[f['parroquia']] += conteo
+            por_dia[(f['parroquia'], f['dia'])] += conteo
+
+        self.global_ = Tasas().suavizar(global_, peso=0) if global_.total else Tasas()
+        self._parroquia = {p: self.global_.suavizar(c) for p, c in por_parroquia.items()}
+        self._dia = {k: self.parroquia(k[0]).suavizar(c) for k, c in por_dia.items()}
+
+    @classmethod
+    def desde_historial(cls, desde=None, hasta=None):
+        return cls(agregar_historial(desde, hasta))
+
+    def parroquia(self, parroquia):
+        return self._parroquia.get(parroquia, self.global_)
+
+    def dia(self, parroquia, dia):
+        return self._dia.get((parroquia, dia), self.parroquia(parroquia))
+
+    def tasas(self, parroquia, dia, tipo=None):
+        previa = self.dia(parroquia, dia)
+        conteo = self.grupos.get((parroquia, dia, tipo)) if tipo is not None else None
+        return previa.suavizar(conteo) if conteo else previa
+
+
+# ==============================================================================
+#                                 SOBRECUPO
+# ==============================================================================
+
+def prob_exceso(reservas, asistencia, capacidad):
+    """P(visitas presentes > capacidad) con reservas ~ Binomial(reservas, asistencia)."""
+    fallo = 1 - asistencia
+    return sum(
+        comb(reservas, k) * asistencia ** k * fallo ** (reservas - k)
+        for k in range(capacidad + 1, reservas + 1)
+    )
+
+
+def sobrecupo(capacidad, asistencia, riesgo=RIESGO_DEFECTO):
+    """Reservas adicionales admisibles sobre `capacidad` para el riesgo dado."""
+    if capacidad <= 0 or asistencia >= 1:
+        return 0
+    extra = 0
+    maximo = int(capacidad * MAX_SOBRECUPO)
+    while extra < maximo and prob_exceso(capacidad + extra + 1, asistencia, capacidad) <= riesgo:
+        extra += 1
+    return extra
+
+
+@dataclass
+class Recomendacion:
+    agenda: AgendaDiaria
+    bloque: str
+    capacidad: int
+    tasas: Tasas
+    sobrecupo: int
+
+    @property
+    def campo(self):
+        return f"sobrecupo_{self.bloque.lower()}"
+
+
+def _mezcla_reservas(agendas):
+    """{(agenda_id, bloque): {tipo_id: reservas}} de los turnos vigentes, en una consulta."""
+    mezcla = defaultdict(dict)
+    filas = Turno.objects.filter(agenda__in=agendas).exclude(estado__in=Turno.ESTADOS_SIN_CUPO).values(
+        'agenda_id', 'bloque', tipo=F('establecimiento__tipo_id'),
+    ).annotate(n=Count('id')).order_by()
+    for f in filas:
+        mezcla[(f['agenda_id'], f['bloque'])][f['tipo']] = f['n']
+    return mezcla
+
+
+def recomendar(agendas, modelo=None, riesgo=RIESGO_DEFECTO):
+    """
+    Una Recomendacion por agenda y jornada. La tasa de cada jornada pondera las
+    reservas ya hechas por su giro; los cupos libres usan la tasa parroquia+día.
+    """
+    agendas = list(agendas)
+    modelo = modelo or ModeloTasas.desde_historial()
+    mezcla = _mezcla_reservas(agendas)
+    recomendaciones = []
+    for agenda in agendas:
+        dia = agenda.fecha.isoweekday()
+        base = modelo.dia(agenda.parroquia_destino, dia)
+        for bloque in BLOQUES:
+            capacidad = getattr(agenda, f"capacidad_{bloque.lower()}")
+            reservas = mezcla.get((agenda.id, bloque), {})
+            tasas = _ponderar(
+                [(modelo.tasas(agenda.parroquia_destino, dia, tipo), n) for tipo, n in reservas.items()]
+                + [(base, max(0, capacidad - sum(reservas.values())))]
+            ) or base
+            recomendaciones.append(
+                Recomendacion(agenda, bloque, capacidad, tasas, sobrecupo(capacidad, tasas.asistencia, riesgo))
+            )
+    return recomendaciones
+
+
+def _ponderar(tasas_pesos):
+    total = sum(n for _, n in tasas_pesos)
+    if not total:
+        return None
+    return Tasas(
+        ausencia=sum(t.ausencia * n for t, n in tasas_pesos) / total,
+        cancelacion=sum(t.cancelacion * n for t, n in tasas_pesos) / total,
+        muestras=sum(t.muestras for t, _ in tasas_pesos),
+    )
+
+
+def aplicar(recomendaciones):
+    """Guarda el sobrecupo recomendado en las agendas (un bulk_update). Devuelve cuántas cambiaron."""
+    cambiadas = {}
+    for r in recomendaciones:
+        if getattr(r.agenda, r.campo) != r.sobrecupo:
+            setattr(r.agenda, r.campo, r.sobrecupo)
+            cambiadas[r.agenda.id] = r.agenda
+    AgendaDiaria.objects.bulk_update(list(cambiadas.values()), ['sobrecupo_manana', 'sobrecupo_tarde'])
+    return len(cambiadas)
+
+
+# ==============================================================================
+#                        SIMULACIÓN SOBRE MESES PASADOS
+# ==============================================================================
+
+@dataclass
+class ResumenSimulacion:
+    desde: object
+    hasta: object
+    dias: int = 0
+    jornadas: int = 0
+    jornadas_llenas: int = 0
+    reservas_extra: float = 0.0
+    visitas: int = 0
+    visitas_sim: float = 0.0
+    viajes_perdidos: int = 0
+    viajes_perdidos_sim: float = 0.0
+    desbordes_sim: float = 0.0
+
+    @staticmethod
+    def _tasa(perdidos, visitas):
+        return perdidos / (perdidos + visitas) if perdidos + visitas else 0.0
+
+    @property
+    def tasa_perdidos(self):
+        return self._tasa(self.viajes_perdidos, self.visitas)
+
+    @property
+    def tasa_perdidos_sim(self):
+        return self._tasa(self.viajes_perdidos_sim, self.visitas_sim)
+
+
+def simular(desde, hasta, riesgo=RIESGO_DEFECTO):
+    """
+    Repite las agendas de [desde, hasta) con el sobrecupo que se habría
+    recomendado usando solo el historial anterior a `desde`.
+
+    La demanda observada está censurada por la capacidad: solo las jornadas
+    que se llenaron habrían recibido las reservas extra, y cada una aporta en
+    valor esperado (asistencia) visitas y (ausencia) viajes perdidos. Las
+    visitas que superen la capacidad física se cuentan como desbordes.
+    """
+    resumen = ResumenSimulacion(desde, hasta)
+    agendas = list(AgendaDiaria.objects.filter(fecha__gte=desde, fecha__lt=hasta))
+    if not agendas:
+        return resumen
+
+    resultados = {
+        (f['agenda_id'], f['bloque']): f
+        for f in Turno.objects.filter(agenda__in=agendas).values('agenda_id', 'bloque').annotate(
+            total=Count('id'),
+            presentes=Count('id', filter=Q(estado__in=('TERMINADO', 'EJECUTADA'))),
+            ausencias=Count('id', filter=Q(estado='NO_REALIZADA')),
+            liberados=Count('id', filter=Q(estado__in=Turno.ESTADOS_SIN_CUPO)),
+        ).order_by()
+    }
+    modelo = ModeloTasas.desde_historial(hasta=desde)
+    resumen.dias = len({a.fecha for a in agendas})
+
+    for r in recomendar(agendas, modelo, riesgo):
+        fila = resultados.get((r.agenda.id, r.bloque))
+        if not fila:
+            continue
+        resumen.jornadas += 1
+        resumen.visitas += fila['presentes']
+        resumen.viajes_perdidos += fila['ausencias']
+
+        extra = 0
+        if fila['total'] - fila['liberados'] >= r.capacidad:  # Ocupación como en las vistas de reserva
+            resumen.jornadas_llenas += 1
+            extra = r.sobrecupo
+        presentes = fila['presentes'] + extra * r.tasas.asistencia
+        resumen.reservas_extra += extra
+        resumen.visitas_sim += min(presentes, r.capacidad)
+        resumen.desbordes_sim += max(0.0, presentes - r.capacidad)
+        resumen.viajes_perdidos_sim += fila['ausencias'] + extra * r.tasas.ausencia
+    return resumen
@@ -0,0 +1,95 @@
+"""
+Historial de estados de Turno (EventoTurno) y latencias entre estados.
+
+El motor de transiciones inserta un evento por turno que cambia, en el mismo
+bulk_create y la misma transacción que el UPDATE; las altas los inserta el
+modelo. Con el historial se responde, por ejemplo:
+
+    latencias('PENDIENTE', 'CONFIRMADO', agrupar='parroquia')   # espera de aprobación
+    latencias('EJECUTADA', 'TERMINADO', agrupar='inspector')    # visita -> formulario
+
+La consulta recorre solo los eventos del intervalo pedido (índice BRIN sobre
+`fecha`), agrega por turno y calcula los percentiles en PostgreSQL
+(`percentile_cont`): no se traen filas a Python. Se lee de la réplica.
+"""
+from datetime import timedelta
+
+from django.db import connections, router
+from django.utils import timezone
+
+from .models import AgendaDiaria, EventoTurno, Turno
+from .routers import leer_de_replica
+
+PERCENTILES = (0.5, 0.9, 0.99)
+VENTANA = timedelta(days=365)
+
+# Agrupación -> expresión SQL (p = par de eventos del turno, a = su agenda)
+AGRUPACIONES = {
+    None: "NULL",
+    'parroquia': "a.parroquia_destino",
+    'inspector': "p.actor_id",
+}
+
+
+def registrar(previos, hacia, actor=None):
+    """Inserta un evento por turno. `previos`: {turno_id: estado anterior}."""
+    ahora = timezone.now()
+    actor_id = getattr(actor, 'pk', actor)
+    EventoTurno.objects.bulk_create([
+        EventoTurno(turno_id=turno_id, desde=desde, hacia=hacia, actor_id=actor_id, fecha=ahora)
+        for turno_id, desde in previos.items()
+    ])
+
+
+def _sql_latencias(agrupar):
+    evento = EventoTurno._meta.db_table
+    # Solo la parroquia necesita el turno: el resto sale únicamente de los eventos
+    uniones = (
+        f"JOIN {Turno._meta.db_table} t ON t.id = p.turno_id "
+        f"JOIN {AgendaDiaria._meta.db_table} a ON a.id = t.agenda_id"
+    ) if agrupar == 'parroquia' else ""
+    return f"""
+        WITH pares AS (
+            SELECT turno_id,
+                   MIN(fecha) FILTER (WHERE hacia = %(desde)s) AS inicio,
+                   MIN(fecha) FILTER (WHERE hacia = %(hacia)s) AS fin,
+                   MIN(actor_id) FILTER (WHERE hacia = %(hacia)s) AS actor_id
+            FROM {evento}
+            WHERE fecha >= %(inicio)s AND fecha < %(fin)s AND hacia IN (%(desde)s, %(hacia)s)
+            GROUP BY turno_id
+        )
+        SELECT {AGRUPACIONES[agrupar]} AS grupo, COUNT(*) AS total,
+               percentile_cont(%(percentiles)s::float8[]) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM p.fin - p.inicio))
+        FROM pares p {uniones}
+        WHERE p.inicio IS NOT NULL AND p.fin >= p.inicio
+        GROUP BY 1
+        ORDER BY 2 DESC
+    """
+
+
+@leer_de_replica()
+def latencias(desde, hacia, agrupar=None, inicio=None, fin=None, percentiles=PERCENTILES):
+    """
+    Percentiles (en segundos) del tiempo entre entrar en `desde` y entrar en
+    `hacia`, para los turnos con ambos eventos dentro de [inicio, fin) (por
+    defecto, el último año). `agrupar`: None, 'parroquia' o 'inspector' (quien
+    hizo la segunda transición).
+
+    Devuelve [{'grupo', 'total', 'p50', 'p90', ...}] de mayor a menor total.
+    """
+    if agrupar not in AGRUPACIONES:
+        raise ValueError(f"Agrupación no válida: {agrupar}")
+    fin = fin or timezone.now()
+    inicio = inicio or fin - VENTANA
+    parametros = {
+        'desde': desde, 'hacia': hacia, 'inicio': inicio, 'fin': fin, 'percentiles': list(percentiles),
+    }
+    with connections[router.db_for_read(EventoTurno)].cursor() as cursor:
+        cursor.execute(_sql_latencias(agrupar), parametros)
+        filas = cursor.fetchall()
+
+    claves = [f"p{round(p * 100):g}" for p in percentiles]
+    return [
+        {'grupo': grupo, 'total': total, **dict(zip(claves, valores))}
+        for grupo, total, valores in filas
+    ]
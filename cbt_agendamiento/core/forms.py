@@ -25,12 +25,19 @@ class TipoEstablecimientoForm(forms.ModelForm):
 class ConfiguracionGlobalForm(forms.ModelForm):
     class Meta:
         model = ConfiguracionSistema
-        fields = ['def_capacidad_manana', 'def_capacidad_tarde']
+        fields = ['def_capacidad_manana', 'def_capacidad_tarde', 'sobrecupo_automatico', 'riesgo_sobrecupo']
         widgets = {
             'def_capacidad_manana': forms.NumberInput(attrs={'class': 'form-control bg-dark text-white border-secondary'}),
             'def_capacidad_tarde': forms.NumberInput(attrs={'class': 'form-control bg-dark text-white border-secondary'}),
+            'riesgo_sobrecupo': forms.NumberInput(attrs={'class': 'form-control bg-dark text-white border-secondary', 'step': '0.01', 'min': '0', 'max': '0.5'}),
         }
 
+    def clean_riesgo_sobrecupo(self):
+        riesgo = self.cleaned_data['riesgo_sobrecupo']
+        if not 0 <= riesgo <= 0.5:
+            raise forms.ValidationError("El riesgo debe estar entre 0 y 0.5.")
+        return riesgo
+
 # --- 2. GESTIÓN DE AGENDA (CORREGIDO AQUÍ) ---
 
 class EdicionAgendaForm(forms.ModelForm):
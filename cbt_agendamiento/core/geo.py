@@ -0,0 +1,171 @@
+"""
+Servicio geoespacial: consultas de proximidad resueltas en PostGIS y
+utilidades sobre las columnas planas `latitud`/`longitud`.
+
+En PostGIS se usa el cast a geography (distancias en metros) apoyado en el
+índice GiST `core_establecimiento_ubicacion_geog_gist`. En SpatiaLite (pruebas
+locales) se cae a las funciones genéricas de GeoDjango.
+"""
+import math
+
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.db.models import Avg, BooleanField, Count, F, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Floor
+
+from . import cache
+from .models import Establecimiento
+
+# Estación CBT (Punto de partida de las rutas)
+ORIGEN_ESTACION = (0.8234943, -77.7071697)  # (lat, lng)
+METROS_POR_GRADO = 111_320
+
+# Teselas del mapa: celdas de agrupación por lado y zoom desde el que se
+# devuelven puntos individuales en lugar de clústeres.
+CELDAS_POR_TESELA = 8
+ZOOM_DETALLE = 16
+MAX_PUNTOS_TESELA = 500
+
+
+def _es_postgis():
+    return connection.vendor == 'postgresql'
+
+
+def _punto(lat, lng):
+    return Point(lng, lat, srid=4326)
+
+
+def mas_cercanos(lat, lng, queryset=None, limite=10, campo='ubicacion'):
+    """
+    Los `limite` establecimientos más cercanos al punto, ordenados por KNN
+    (`<->` sobre geography, resuelto con el índice GiST). Anota `distancia_m`.
+    """
+    qs = (queryset if queryset is not None else Establecimiento.objects.all()).filter(**{f"{campo}__isnull": False})
+    punto = _punto(lat, lng)
+    if _es_postgis():
+        columna = f'"{qs.model._meta.db_table}"."{campo}"' if '__' not in campo else None
+        if columna:
+            distancia = RawSQL(f"{columna}::geography <-> ST_GeogFromText(%s)", (punto.wkt,), output_field=FloatField())
+            return qs.annotate(distancia_m=distancia).order_by('distancia_m')[:limite]
+    return qs.annotate(distancia_m=Distance(campo, punto)).order_by('distancia_m')[:limite]
+
+
+def dentro_de_radio(lat, lng, metros, queryset=None):
+    """Establecimientos a menos de `metros` del punto (ST_DWithin sobre geography)."""
+    qs = queryset if queryset is not None else Establecimiento.objects.all()
+    punto = _punto(lat, lng)
+    if _es_postgis():
+        cerca = RawSQL(
+            f'ST_DWithin("{qs.model._meta.db_table}"."ubicacion"::geography, ST_GeogFromText(%s), %s)',
+            (punto.wkt, metros), output_field=BooleanField(),
+        )
+        return qs.alias(cerca=cerca).filter(cerca=True)
+    # Aproximación en grados para SpatiaLite (suficiente a la escala de Tulcán)
+    return qs.filter(ubicacion__dwithin=(punto, metros / METROS_POR_GRADO))
+
+
+def coordenadas(queryset, *campos, prefijo=''):
+    """
+    values() con las coordenadas planas del establecimiento (`prefijo` para
+    consultas que parten de Turno, p. ej. prefijo='establecimiento__').
+    """
+    return queryset.filter(**{f"{prefijo}latitud__isnull": False}).values(
+        *campos, lat=F(f"{prefijo}latitud"), lng=F(f"{prefijo}longitud"),
+    )
+
+
+def distancia_m(lat1, lng1, lat2, lng2):
+    """Distancia equirectangular en metros (precisa a escala urbana, sin GEOS)."""
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * 6_371_000
+
+
+def ruta_vecino_mas_cercano(paradas, origen=ORIGEN_ESTACION):
+    """
+    Ordena `paradas` (dicts con 'lat' y 'lng') por vecino más cercano desde
+    `origen`. Las paradas sin coordenadas quedan fuera de la ruta.
+    """
+    pendientes = [p for p in paradas if p.get('lat') is not None]
+    ruta = []
+    lat, lng = origen
+    while pendientes:
+        siguiente = min(pendientes, key=lambda p: distancia_m(lat, lng, p['lat'], p['lng']))
+        pendientes.remove(siguiente)
+        ruta.append(siguiente)
+        lat, lng = siguiente['lat'], siguiente['lng']
+    return ruta
+
+
+# ==============================================================================
+#                    TESELAS GEOJSON (MAPA AGRUPADO POR ZOOM)
+# ==============================================================================
+
+def limites_tesela(z, x, y):
+    """(oeste, sur, este, norte) en grados de la tesela XYZ (esquema OSM/Leaflet)."""
+    n = 2 ** z
+    oeste = x / n * 360 - 180
+    este = (x + 1) / n * 360 - 180
+    norte = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    sur = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return oeste, sur, este, norte
+
+
+def _punto_geojson(lat, lng, **propiedades):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [lng, lat]},
+        'properties': propiedades,
+    }
+
+
+def tesela_geojson(queryset, z, x, y, prefijo='establecimiento__'):
+    """
+    FeatureCollection de los turnos de `queryset` dentro de la tesela.
+
+    Por debajo de ZOOM_DETALLE la agrupación se hace en la base de datos
+    (rejilla de CELDAS_POR_TESELA² sobre latitud/longitud, GROUP BY) y cada
+    clúster trae su total y su centroide; a partir de ese zoom se devuelven
+    los puntos individuales.
+    """
+    oeste, sur, este, norte = limites_tesela(z, x, y)
+    lat, lng = F(f"{prefijo}latitud"), F(f"{prefijo}longitud")
+    qs = queryset.filter(**{
+        f"{prefijo}latitud__gte": sur, f"{prefijo}latitud__lt": norte,
+        f"{prefijo}longitud__gte": oeste, f"{prefijo}longitud__lt": este,
+    }).order_by()
+
+    if z >= ZOOM_DETALLE:
+        filas = qs.values('id', 'estado', nombre=F(f"{prefijo}nombre_comercial"), lat=lat, lng=lng)[:MAX_PUNTOS_TESELA]
+        features = [
+            _punto_geojson(f['lat'], f['lng'], id=f['id'], nombre=f['nombre'], estado=f['estado'], total=1)
+            for f in filas
+        ]
+    else:
+        celda = (este - oeste) / CELDAS_POR_TESELA
+        grupos = qs.annotate(
+            celda_x=Floor((lng - oeste) / celda),
+            celda_y=Floor((lat - sur) / celda),
+        ).values('celda_x', 'celda_y').annotate(
+            total=Count('id'),
+            confirmados=Count('id', filter=Q(estado='CONFIRMADO')),
+            lat_media=Avg(lat),
+            lng_media=Avg(lng),
+        )
+        features = [
+            _punto_geojson(g['lat_media'], g['lng_media'], total=g['total'], confirmados=g['confirmados'])
+            for g in grupos
+        ]
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def invalidar_mapa(**kwargs):
+    """Receptor de señales: cambia la versión de las teselas en caché."""
+    cache.MAPA.invalidar()
+
+
+def tesela_cacheada(clave, z, x, y, generar):
+    """GeoJSON de la tesela desde el espacio `cache.MAPA` (versionado)."""
+    return cache.MAPA.obtener((clave, z, x, y), generar)
@@ -0,0 +1,130 @@
+"""
+Asignación de horas estimadas (`Turno.hora_estimada`) por agenda y jornada.
+
+Las tablas de horarios (lunes a jueves y viernes) se calculan una sola vez al
+importar el módulo. Los turnos confirmados de cada agenda/jornada se ordenan
+por la ruta del inspector (vecino más cercano desde la estación) y reciben la
+hora del slot correspondiente; si hay más visitas que slots, se reparten de
+forma uniforme sobre la jornada.
+
+La asignación es incremental y estable: la hora de un turno ya confirmado no
+cambia (se le comunicó en el aviso y el SMS de confirmación). Al confirmar un
+turno solo se le asigna a él el slot libre más cercano al que le tocaría por
+su lugar en la ruta; al cancelar, su slot queda libre para el siguiente.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import F
+
+from . import geo
+from .models import Turno
+
+DURACION_VISITA = timedelta(minutes=30)
+
+# (inicio, fin) de cada jornada; el viernes la atención es más corta
+JORNADAS = {
+    'SEMANA': {'MANANA': (time(9, 0), time(12, 30)), 'TARDE': (time(14, 45), time(16, 30))},
+    'VIERNES': {'MANANA': (time(10, 0), time(12, 30)), 'TARDE': (time(14, 45), time(15, 30))},
+}
+
+
+def _slots(inicio, fin):
+    actual = datetime.combine(date.min, inicio)
+    limite = datetime.combine(date.min, fin)
+    slots = []
+    while actual < limite:
+        slots.append(actual.time())
+        actual += DURACION_VISITA
+    return tuple(slots)
+
+
+# Tablas precalculadas: {'SEMANA'|'VIERNES': {'MANANA'|'TARDE': (time, ...)}}
+TABLAS = {
+    tipo: {bloque: _slots(*rango) for bloque, rango in bloques.items()}
+    for tipo, bloques in JORNADAS.items()
+}
+
+
+def slots(fecha, bloque):
+    """Horas de inicio de las visitas de `bloque` en `fecha` (tupla precalculada)."""
+    return TABLAS['VIERNES' if fecha.weekday() == 4 else 'SEMANA'].get(bloque, ())
+
+
+def ventana(hora):
+    """'09:30 - 10:00' para una hora estimada ('' si aún no tiene)."""
+    if hora is None:
+        return ''
+    fin = (datetime.combine(date.min, hora) + DURACION_VISITA).time()
+    return f"{hora:%H:%M} - {fin:%H:%M}"
+
+
+def repartir(cantidad, horas):
+    """
+    Hora para cada una de `cantidad` visitas: un slot por visita mientras
+    alcancen y, si no, reparto uniforme (varias visitas comparten slot).
+    """
+    if not horas:
+        return [None] * cantidad
+    if cantidad <= len(horas):
+        return list(horas[:cantidad])
+    return [horas[i * len(horas) // cantidad] for i in range(cantidad)]
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def completar(orden, horas):
+    """
+    {id: hora} para los turnos de `orden` (orden de la ruta) que aún no tienen
+    hora. Las horas ya asignadas se respetan; cada turno nuevo recibe el slot
+    libre más cercano al de su posición en la ruta y, si no queda ninguno,
+    comparte ese slot (reparto uniforme, como `repartir`).
+    """
+    ideales = repartir(len(orden), horas)
+    ocupadas = {t['hora_estimada'] for t in orden if t['hora_estimada'] is not None}
+    libres = [h for h in horas if h not in ocupadas]
+    nuevas = {}
+    for t, ideal in zip(orden, ideales):
+        if t['hora_estimada'] is not None:
+            continue
+        if libres and ideal is not None:
+            ideal = min(libres, key=lambda h: abs(_minutos(h) - _minutos(ideal)))
+            libres.remove(ideal)
+        nuevas[t['id']] = ideal
+    return nuevas
+
+
+def asignar(agenda_id, bloque):
+    """
+    Asigna hora a los turnos confirmados de una agenda/jornada que aún no la
+    tienen, sin mover las ya asignadas. Devuelve cuántas filas cambiaron.
+    """
+    turnos = list(Turno.objects.filter(agenda_id=agenda_id, bloque=bloque, estado='CONFIRMADO').values(
+        'id', 'hora_estimada',
+        fecha=F('fecha_agenda'), lat=F('establecimiento__latitud'), lng=F('establecimiento__longitud'),
+    ).order_by('id'))
+    if not turnos:
+        return 0
+
+    # Orden de la hoja de ruta; los locales sin coordenadas van al final, en orden de llegada
+    orden = geo.ruta_vecino_mas_cercano(turnos) + [t for t in turnos if t['lat'] is None]
+
+    cambios = [
+        Turno(id=turno_id, hora_estimada=hora)
+        for turno_id, hora in completar(orden, slots(turnos[0]['fecha'], bloque)).items() if hora is not None
+    ]
+    Turno.objects.bulk_update(cambios, ['hora_estimada'])
+    return len(cambios)
+
+
+def asignar_para(ids):
+    """Completa las horas de las agendas/jornadas a las que pertenecen los turnos `ids`."""
+    grupos = Turno.objects.filter(id__in=ids).values_list('agenda_id', 'bloque').distinct()
+    return sum(asignar(agenda_id, bloque) for agenda_id, bloque in grupos.order_by())
+
+
+def asignar_fecha(fecha):
+    """Completa las horas de todas las agendas/jornadas con turnos confirmados en `fecha`."""
+    grupos = Turno.objects.filter(fecha_agenda=fecha, estado='CONFIRMADO').values_list('agenda_id', 'bloque').distinct()
+    return sum(asignar(agenda_id, bloque) for agenda_id, bloque in grupos.order_by())
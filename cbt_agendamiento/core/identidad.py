@@ -0,0 +1,56 @@
+"""
+Contexto de identidad del usuario autenticado sin consultas por petición.
+
+- Sesiones `cached_db` (settings): se leen de la caché compartida y solo van
+  a la base de datos si la clave no está.
+- `BackendCacheado`: el usuario de la sesión, con su perfil y la lista de ids
+  de sus establecimientos, se guarda por usuario en `cache.IDENTIDAD` con un
+  TTL corto. Guardar o borrar el usuario, su perfil o uno de sus
+  establecimientos lo invalida (las señales se conectan en apps.py).
+- `request.user` ya es ese objeto: `user.is_staff`, `user.perfil` y
+  `ids_establecimientos(user)` no consultan durante la petición.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from . import cache
+
+
+def _cargar(user_id):
+    usuario = get_user_model().objects.select_related('perfil').filter(pk=user_id).first()
+    if usuario is not None:
+        usuario.ids_establecimientos = list(usuario.establecimientos.values_list('id', flat=True))
+    return usuario
+
+
+class BackendCacheado(ModelBackend):
+    """ModelBackend cuyo get_user() (una vez por petición) sale de la caché."""
+
+    def get_user(self, user_id):
+        usuario = cache.IDENTIDAD.obtener(('usuario', user_id), lambda: _cargar(user_id))
+        return usuario if usuario is not None and self.user_can_authenticate(usuario) else None
+
+
+def ids_establecimientos(user):
+    """Ids de los locales del usuario; memoizado en el propio objeto."""
+    if not hasattr(user, 'ids_establecimientos'):
+        user.ids_establecimientos = list(user.establecimientos.values_list('id', flat=True))
+    return user.ids_establecimientos
+
+
+def invalidar_usuario(user_id):
+    if user_id is not None:
+        cache.IDENTIDAD.delete(('usuario', user_id))
+
+
+# --- Receptores de señales ---
+def al_guardar_usuario(sender, instance, **kwargs):
+    invalidar_usuario(instance.pk)
+
+
+def al_guardar_perfil(sender, instance, **kwargs):
+    invalidar_usuario(instance.user_id)
+
+
+def al_guardar_establecimiento(sender, instance, **kwargs):
+    invalidar_usuario(instance.propietario_id)
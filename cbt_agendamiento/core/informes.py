@@ -0,0 +1,67 @@
+"""
+Informe de inspecciones terminadas (vista materializada `core_informe_inspecciones`).
+
+El informe mensual/anual y su Excel leen filas ya aplanadas (fecha,
+formulario, local, dirección, RUC, inspector) de FilaInforme, con índice por
+fecha: sin JOINs ni COUNT sobre Turno en cada página.
+
+La vista se refresca con `REFRESH MATERIALIZED VIEW CONCURRENTLY` (los
+lectores no se bloquean mientras tanto):
+- tras el commit de cada cierre (TERMINADO), en un hilo de fondo y agrupando
+  los cierres que llegan mientras un refresco está en curso;
+- con el comando `refrescar_informe` (cron nocturno), que recoge además los
+  cambios de nombre o dirección de los locales y de los inspectores.
+
+Fuera de PostgreSQL (SQLite/SpatiaLite en pruebas) la migración crea una vista
+normal con la misma consulta y refrescar() no hace nada.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections, transaction
+
+from . import cache
+from .models import FilaInforme
+
+logger = logging.getLogger(__name__)
+
+_pool_refresco = ThreadPoolExecutor(max_workers=1, thread_name_prefix='informe')
+_cerrojo = threading.Lock()
+_pendiente = False
+
+
+def refrescar():
+    """Refresca la vista sin bloquear a los lectores (necesita su índice único)."""
+    # En SQLite/SpatiaLite (pruebas) es una vista normal, siempre al día
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {FilaInforme._meta.db_table}')
+    cache.INFORME.invalidar()  # Los PDF ya generados del informe dejan de valer
+
+
+def _refrescar_en_fondo():
+    global _pendiente
+    with _cerrojo:
+        _pendiente = False
+    try:
+        refrescar()
+    except Exception:
+        logger.exception("Error refrescando el informe de inspecciones")
+    finally:
+        connections.close_all()
+
+
+def _encolar():
+    global _pendiente
+    with _cerrojo:
+        # Si ya hay uno esperando, ese refresco verá también este cierre
+        if _pendiente:
+            return
+        _pendiente = True
+    _pool_refresco.submit(_refrescar_en_fondo)
+
+
+def programar_refresco():
+    """Refresca la vista en segundo plano tras el commit de la transacción en curso."""
+    transaction.on_commit(_encolar)
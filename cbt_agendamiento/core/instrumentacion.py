@@ -0,0 +1,123 @@
+"""
+Instrumentación de base de datos: huellas SQL, log de consultas lentas y
+detector de consultas repetidas (N+1) por petición o por comando.
+"""
+import logging
+import re
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger('core.sql')
+
+# Orden importante: primero cadenas, luego números, al final listas IN (?, ?, ...)
+_NORMALIZACIONES = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def huella_sql(sql):
+    """Normaliza literales y parámetros para agrupar consultas equivalentes."""
+    for patron, reemplazo in _NORMALIZACIONES:
+        sql = patron.sub(reemplazo, sql)
+    return sql.strip()
+
+
+class MonitorConsultas:
+    """
+    Wrapper para `connection.execute_wrapper` que agrupa las consultas por huella,
+    registra las que superan SQL_LENTA_MS y detecta las que se repiten más de
+    SQL_REPETICIONES_MAX veces (síntoma típico de N+1).
+    """
+
+    def __init__(self, origen, umbral_ms=None, repeticiones_max=None):
+        self.origen = origen
+        self.umbral_ms = umbral_ms if umbral_ms is not None else getattr(settings, 'SQL_LENTA_MS', 200)
+        self.repeticiones_max = repeticiones_max if repeticiones_max is not None else getattr(settings, 'SQL_REPETICIONES_MAX', 5)
+        self.conteo = Counter()
+        self.tiempo = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion_ms = (perf_counter() - inicio) * 1000
+            huella = huella_sql(sql)
+            self.conteo[huella] += 1
+            self.tiempo[huella] += duracion_ms
+            if duracion_ms >= self.umbral_ms:
+                logger.warning("SQL lenta (%.1f ms) en %s: %s", duracion_ms, self.origen, huella)
+
+    @contextmanager
+    def activo(self):
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(self))
+            yield self
+
+    @property
+    def total(self):
+        return sum(self.conteo.values())
+
+    def repetidas(self):
+        """[(huella, veces, ms_totales)] de las consultas sobre el límite, de mayor a menor."""
+        return [
+            (huella, veces, self.tiempo[huella])
+            for huella, veces in self.conteo.most_common()
+            if veces > self.repeticiones_max
+        ]
+
+    def resumen(self):
+        lineas = [
+            f"[SQL] {self.origen}: {self.total} consultas, {len(self.conteo)} distintas, "
+            f"{sum(self.tiempo.values()):.1f} ms"
+        ]
+        for huella, veces, ms in self.repetidas():
+            lineas.append(f"   x{veces} ({ms:.1f} ms) {huella[:200]}")
+        return "\n".join(lineas)
+
+
+class MonitorConsultasMiddleware:
+    """
+    Activa MonitorConsultas por petición (SQL_MONITOR_ACTIVO=True) y registra un
+    aviso cuando una vista repite consultas por encima del límite.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            origen = f"vista:{resolve(request.path_info).url_name}"
+        except Resolver404:
+            origen = f"ruta:{request.path_info}"
+
+        monitor = MonitorConsultas(origen)
+        with monitor.activo():
+            response = self.get_response(request)
+
+        if monitor.repetidas():
+            logger.warning(monitor.resumen())
+        return response
+
+
+class ComandoInstrumentado(BaseCommand):
+    """BaseCommand que mide sus consultas y escribe el resumen al terminar."""
+
+    def execute(self, *args, **options):
+        monitor = MonitorConsultas(f"comando:{self.__module__.rsplit('.', 1)[-1]}")
+        try:
+            with monitor.activo():
+                return super().execute(*args, **options)
+        finally:
+            self.stdout.write(self.style.NOTICE(monitor.resumen()))
@@ -0,0 +1,126 @@
+"""
+Lista de espera por agenda y jornada con relleno automático de cupos.
+
+Cuando una transición libera cupo (CANCELADO o RECHAZADO), el motor de
+transiciones llama a `rellenar_para` dentro de la misma transacción: se
+bloquea la agenda (el mismo bloqueo que usan las vistas de reserva), se
+cuentan los cupos libres y se promueven por orden de llegada tantas entradas
+como cupos haya. Cada promoción crea un Turno PENDIENTE (pasa por la revisión
+normal del inspector) y encola el aviso y el SMS al propietario.
+"""
+from datetime import date
+
+from django.db import transaction
+
+from .models import AgendaDiaria, ListaEspera, Notificacion, Turno
+
+ESTADOS_ACTIVOS = ('PENDIENTE', 'CONFIRMADO')
+AVISO = ("¡Se liberó un cupo! 🎉", "Su local {local} pasó de la lista de espera a una solicitud para el {fecha}. El inspector la revisará en breve.")
+SMS = "CBT: Se libero un cupo para {local} el {fecha}. Su solicitud ya esta en revision."
+
+
+def ocupados(agenda_id, bloque):
+    return Turno.objects.filter(agenda_id=agenda_id, bloque=bloque).exclude(estado__in=Turno.ESTADOS_SIN_CUPO).count()
+
+
+def inscribir(local, agenda, bloque, telefono, referencia=None):
+    """Anota el local al final de la lista. Devuelve (entrada, creada)."""
+    return ListaEspera.objects.get_or_create(
+        agenda=agenda, bloque=bloque, establecimiento=local, estado='ESPERANDO',
+        defaults={'telefono_contacto': telefono, 'referencia_ubicacion': referencia},
+    )
+
+
+def retirar(local):
+    """Saca al local de todas sus listas (p. ej. porque ya reservó un turno)."""
+    return ListaEspera.objects.filter(establecimiento=local, estado='ESPERANDO').update(estado='RETIRADO')
+
+
+def posiciones(local):
+    """{(agenda_id, bloque): posición en la fila} de las esperas activas del local."""
+    agendas = ListaEspera.objects.filter(establecimiento=local, estado='ESPERANDO').values('agenda_id')
+    filas = ListaEspera.objects.filter(agenda__in=agendas, estado='ESPERANDO').values_list(
+        'agenda_id', 'bloque', 'establecimiento_id',
+    ).order_by('fecha_registro', 'id')
+
+    contador, posicion = {}, {}
+    for agenda_id, bloque, establecimiento_id in filas:
+        clave = (agenda_id, bloque)
+        contador[clave] = contador.get(clave, 0) + 1
+        if establecimiento_id == local.id:
+            posicion[clave] = contador[clave]
+    return posicion
+
+
+def rellenar(agenda_id, bloque):
+    """
+    Promueve las primeras entradas de la fila a turnos PENDIENTE mientras haya
+    cupo. Debe ejecutarse dentro de una transacción. Devuelve los turnos creados.
+    """
+    # Solo agendas futuras: para hoy ya no hay tiempo de avisar al propietario
+    agenda = AgendaDiaria.objects.select_for_update().filter(
+        id=agenda_id, cupos_habilitados=True, fecha__gt=date.today(),
+    ).first()
+    if not agenda:
+        return []
+    libres = agenda.cupo(bloque) - ocupados(agenda_id, bloque)
+    if libres <= 0:
+        return []
+
+    # SKIP LOCKED: una entrada que otra transacción está promoviendo no se toca
+    fila = list(ListaEspera.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+        agenda=agenda, bloque=bloque, estado='ESPERANDO',
+    ).select_related('establecimiento').order_by('fecha_registro', 'id'))
+    if not fila:
+        return []
+
+    # Un local con otra solicitud activa sale de la lista en lugar de ocupar el cupo
+    con_turno = set(Turno.objects.filter(
+        establecimiento__in=[e.establecimiento_id for e in fila],
+        estado__in=ESTADOS_ACTIVOS, fecha_agenda__gte=date.today(),
+    ).values_list('establecimiento_id', flat=True))
+    retiradas = [e for e in fila if e.establecimiento_id in con_turno]
+    promovidas = [e for e in fila if e.establecimiento_id not in con_turno][:libres]
+
+    turnos = Turno.objects.bulk_create([
+        Turno(
+            agenda=agenda, establecimiento_id=e.establecimiento_id, bloque=bloque, estado='PENDIENTE',
+            telefono_contacto=e.telefono_contacto, referencia_ubicacion=e.referencia_ubicacion,
+            observaciones="LISTA DE ESPERA",
+        ) for e in promovidas
+    ])
+    for entrada, turno in zip(promovidas, turnos):
+        entrada.estado, entrada.turno = 'PROMOVIDO', turno
+    for entrada in retiradas:
+        entrada.estado = 'RETIRADO'
+    ListaEspera.objects.bulk_update(promovidas + retiradas, ['estado', 'turno'])
+
+    _avisar(agenda, promovidas)
+    return turnos
+
+
+def _avisar(agenda, promovidas):
+    if not promovidas:
+        return
+    fecha = agenda.fecha.strftime("%d/%m/%Y")
+    titulo, mensaje = AVISO
+    Notificacion.objects.bulk_create([
+        Notificacion(
+            usuario_id=e.establecimiento.propietario_id, titulo=titulo, tipo='SUCCESS', link="/portal/",
+            mensaje=mensaje.format(local=e.establecimiento.nombre_comercial, fecha=fecha),
+        ) for e in promovidas
+    ])
+    from . import sms
+    sms.programar_lote([
+        sms.MensajeSMS(e.telefono_contacto, SMS.format(local=e.establecimiento.nombre_comercial, fecha=fecha), [e.turno_id])
+        for e in promovidas
+    ], motivo='LISTA_ESPERA')
+
+
+def rellenar_para(ids):
+    """Rellena las agendas/jornadas de los turnos `ids` que acaban de liberar cupo."""
+    grupos = Turno.objects.filter(
+        id__in=ids, fecha_agenda__gt=date.today(),
+    ).values_list('agenda_id', 'bloque').distinct().order_by()
+    with transaction.atomic():
+        return [t for agenda_id, bloque in grupos for t in rellenar(agenda_id, bloque)]
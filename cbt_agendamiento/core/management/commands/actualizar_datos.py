@@ -1,8 +1,11 @@
-from django.core.management.base import BaseCommand
+from core.instrumentacion import ComandoInstrumentado
 from core.models import Turno
+from core.transiciones import transicionar_consulta
 from datetime import date
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce, Concat
 
-class Command(BaseCommand):
+class Command(ComandoInstrumentado):
     help = 'Actualiza automáticamente los turnos vencidos a NO_REALIZADA'
 
     def handle(self, *args, **kwargs):
@@ -10,15 +13,19 @@ class Command(BaseCommand):
         
         # Buscar turnos confirmados cuya fecha ya pasó (menor a hoy)
         turnos_vencidos = Turno.objects.filter(
-            agenda__fecha__lt=hoy,
+            fecha_agenda__lt=hoy,
             estado='CONFIRMADO'
         )
         
-        count = 0
-        for turno in turnos_vencidos:
-            turno.estado = 'NO_REALIZADA'
-            turno.observaciones = (turno.observaciones or "") + " [SISTEMA: Marcado como NO REALIZADA por fecha vencida sin formulario]"
-            turno.save()
-            count += 1
+        # Un UPDATE condicional por bloque (si alguien lo cerró mientras tanto, no se toca)
+        count = transicionar_consulta(
+            turnos_vencidos, 'NO_REALIZADA', desde='CONFIRMADO',
+            condicion=Q(fecha_agenda__lt=hoy),
+            campos={'observaciones': Concat(
+                Coalesce('observaciones', Value('')),
+                Value(" [SISTEMA: Marcado como NO REALIZADA por fecha vencida sin formulario]"),
+            )},
+            aviso=False,
+        )
             
         self.stdout.write(self.style.SUCCESS(f"Proceso completado. {count} turnos marcados como NO_REALIZADA."))
\ No newline at end of file
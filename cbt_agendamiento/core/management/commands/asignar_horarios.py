@@ -0,0 +1,28 @@
+from datetime import date, datetime
+
+from core import horarios
+from core.instrumentacion import ComandoInstrumentado
+from core.models import Turno
+
+
+class Command(ComandoInstrumentado):
+    help = 'Asigna la hora estimada a los turnos confirmados que aún no la tienen (orden de la hoja de ruta)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Solo esta fecha (AAAA-MM-DD). Por defecto, de hoy en adelante")
+
+    def handle(self, *args, **options):
+        if options['fecha']:
+            fechas = [datetime.strptime(options['fecha'], '%Y-%m-%d').date()]
+        else:
+            fechas = Turno.objects.filter(
+                estado='CONFIRMADO', fecha_agenda__gte=date.today(),
+            ).values_list('fecha_agenda', flat=True).distinct().order_by('fecha_agenda')
+
+        total = 0
+        for fecha in fechas:
+            cambios = horarios.asignar_fecha(fecha)
+            total += cambios
+            self.stdout.write(f"   - {fecha}: {cambios} hora(s) actualizada(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Horarios asignados. {total} turnos actualizados."))
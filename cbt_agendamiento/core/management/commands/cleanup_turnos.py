@@ -1,8 +1,10 @@
-from django.core.management.base import BaseCommand
-from core.models import Turno, Notificacion
+from core.instrumentacion import ComandoInstrumentado
+from core.models import Turno
+from core.transiciones import transicionar_consulta
 from datetime import date
+from django.db.models import Q
 
-class Command(BaseCommand):
+class Command(ComandoInstrumentado):
     help = 'Limpia turnos vencidos y actualiza estados automáticamente'
 
     def handle(self, *args, **kwargs):
@@ -17,24 +19,16 @@ class Command(BaseCommand):
         # Acción: Rechazar automáticamente por caducidad.
         pendientes_vencidos = Turno.objects.filter(
             estado='PENDIENTE',
-            agenda__fecha__lt=hoy
+            fecha_agenda__lt=hoy
         )
         
-        count_pend = 0
-        for t in pendientes_vencidos:
-            t.estado = 'RECHAZADO'
-            t.observaciones = "SISTEMA: Solicitud caducada. La fecha solicitada pasó sin gestión del inspector."
-            t.save()
-            
-            # Notificar al usuario para que no se quede esperando
-            Notificacion.objects.create(
-                usuario=t.establecimiento.propietario,
-                titulo="Solicitud Caducada 🕒",
-                mensaje=f"Su solicitud para el {t.agenda.fecha} expiró sin confirmación. Por favor agende nuevamente.",
-                tipo="WARNING",
-                link="/portal/"
-            )
-            count_pend += 1
+        # Transición en bloque + notificación al usuario para que no se quede esperando
+        count_pend = transicionar_consulta(
+            pendientes_vencidos, 'RECHAZADO', desde='PENDIENTE',
+            condicion=Q(fecha_agenda__lt=hoy),
+            campos={'observaciones': "SISTEMA: Solicitud caducada. La fecha solicitada pasó sin gestión del inspector."},
+            aviso=("Solicitud Caducada 🕒", "Su solicitud para el {fecha} expiró sin confirmación. Por favor agende nuevamente.", 'WARNING'),
+        )
 
         # ---------------------------------------------------------
         # CASO 2: Turnos CONFIRMADOS que ya pasaron de fecha
@@ -44,25 +38,16 @@ class Command(BaseCommand):
         # NOTA CRÍTICA: NO tocamos los que están en estado 'EJECUTADA'.
         confirmados_vencidos = Turno.objects.filter(
             estado='CONFIRMADO',
-            agenda__fecha__lt=hoy
+            fecha_agenda__lt=hoy
         )
         
-        count_conf = 0
-        for t in confirmados_vencidos:
-            # Cambiamos a NO_REALIZADA (que en tu modelo se visualiza como 'AUSENTE' o similar)
-            t.estado = 'NO_REALIZADA' 
-            t.observaciones = "SISTEMA: Cierre automático por falta de gestión del turno."
-            t.save()
-            
-            # Notificación de Disculpa/Aviso
-            Notificacion.objects.create(
-                usuario=t.establecimiento.propietario,
-                titulo="Inspección No Registrada ⚠️",
-                mensaje=f"La visita del {t.agenda.fecha} no tiene registro de ejecución. Por favor solicite un nuevo turno.",
-                tipo="ERROR",
-                link="/portal/"
-            )
-            count_conf += 1
+        # Cambiamos a NO_REALIZADA (que en tu modelo se visualiza como 'AUSENTE' o similar)
+        count_conf = transicionar_consulta(
+            confirmados_vencidos, 'NO_REALIZADA', desde='CONFIRMADO',
+            condicion=Q(fecha_agenda__lt=hoy),
+            campos={'observaciones': "SISTEMA: Cierre automático por falta de gestión del turno."},
+            aviso=("Inspección No Registrada ⚠️", "La visita del {fecha} no tiene registro de ejecución. Por favor solicite un nuevo turno.", 'ERROR'),
+        )
 
         self.stdout.write(self.style.SUCCESS(
             f"LIMPIEZA COMPLETA:\n"
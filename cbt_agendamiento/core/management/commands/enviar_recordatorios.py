@@ -1,63 +1,162 @@
-from django.core.management.base import BaseCommand
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+
 from django.core.mail import send_mail
-from core.models import Turno
-from core.utils import enviar_sms 
-from datetime import date
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+
+from core import sms as gateway_sms
+from core.instrumentacion import ComandoInstrumentado
+from core.models import RegistroEnvio, Turno
+
+MOTIVO = 'RECORDATORIO'
+JORNADAS = dict(Turno._meta.get_field('bloque').choices)
 
-class Command(BaseCommand):
+
+class Command(ComandoInstrumentado):
     help = 'Envía recordatorios por correo y SMS a las inspecciones de HOY'
 
-    def handle(self, *args, **kwargs):
-        hoy = date.today()
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Fecha de la agenda (AAAA-MM-DD). Por defecto, hoy")
+        parser.add_argument('--hilos', type=int, default=8, help="Envíos simultáneos")
+        parser.add_argument('--lote', type=int, default=500, help="Filas por lectura y por escritura del registro")
+
+    def handle(self, *args, **options):
+        hoy = datetime.strptime(options['fecha'], '%Y-%m-%d').date() if options['fecha'] else date.today()
         self.stdout.write(f"--> Buscando inspecciones confirmadas para hoy: {hoy}")
-        
-        turnos_hoy = Turno.objects.filter(agenda__fecha=hoy, estado='CONFIRMADO')
-        
-        if not turnos_hoy:
+
+        # 1. LO YA ENTREGADO (Una consulta: las re-ejecuciones no repiten envíos)
+        entregados = set(RegistroEnvio.objects.filter(
+            turno__fecha_agenda=hoy, motivo=MOTIVO, estado='ENVIADO',
+        ).values_list('turno_id', 'canal', 'destinatario'))
+
+        # 2. UNA SOLA CONSULTA CON TODO LO NECESARIO (Sin cargas perezosas por fila)
+        # Prioridad teléfono: Turno > Perfil
+        filas = Turno.objects.filter(fecha_agenda=hoy, estado='CONFIRMADO').values(
+            'id', 'bloque',
+            local=F('establecimiento__nombre_comercial'),
+            email=F('establecimiento__propietario__email'),
+            telefono=Coalesce(NullIf('telefono_contacto', Value('')), 'establecimiento__propietario__perfil__telefono'),
+        ).order_by('id').iterator(chunk_size=options['lote'])
+
+        # 3. AGRUPAR POR DESTINATARIO (Un propietario con varios locales recibe un solo aviso)
+        # Los teléfonos se normalizan una vez por número distinto: '099...' y '+59399...' son el mismo
+        correos = defaultdict(list)
+        sms = defaultdict(list)
+        numeros = {}
+        total_turnos = 0
+        for fila in filas:
+            total_turnos += 1
+            if fila['email'] and (fila['id'], 'EMAIL', fila['email']) not in entregados:
+                correos[fila['email']].append(fila)
+            if fila['telefono']:
+                if fila['telefono'] not in numeros:
+                    numeros[fila['telefono']] = gateway_sms.normalizar_telefono(fila['telefono'])
+                numero = numeros[fila['telefono']] or fila['telefono']
+                if (fila['id'], 'SMS', numero) not in entregados:
+                    sms[numero].append(fila)
+
+        if not total_turnos:
             self.stdout.write(self.style.WARNING("No hay inspecciones confirmadas para hoy."))
             return
+        if not correos and not sms:
+            self.stdout.write(self.style.SUCCESS(f"Los {total_turnos} recordatorios de hoy ya fueron enviados."))
+            return
 
-        count = 0
-        for turno in turnos_hoy:
-            # Datos de contacto
-            # Usamos getattr para evitar error si el usuario no tiene email
-            email = getattr(turno.establecimiento.propietario, 'email', None)
-            
-            # Prioridad teléfono: Turno > Perfil
-            telefono = turno.telefono_contacto
-            if not telefono and hasattr(turno.establecimiento.propietario, 'perfil'):
-                telefono = turno.establecimiento.propietario.perfil.telefono
-                
-            local = turno.establecimiento.nombre_comercial
-            jornada = turno.get_bloque_display()
-
-            # 1. ENVIAR CORREO
-            if email:
-                try:
-                    asunto = f"RECORDATORIO: Inspección HOY - {local}"
-                    mensaje = f"""
-                    Estimado usuario,
-                    
-                    Le recordamos que TIENE UNA INSPECCIÓN PROGRAMADA PARA HOY.
-                    
-                    Local: {local}
-                    Jornada: {jornada}
-                    
-                    Por favor, asegúrese de que haya una persona encargada en el local.
-                    """
-                    send_mail(asunto, mensaje, 'sistema@bomberostulcan.gob.ec', [email], fail_silently=True)
-                    self.stdout.write(f"   - Email enviado a {email}")
-                except: pass
-
-            # 2. ENVIAR SMS
-            if telefono:
+        # 4. RENDERIZAR Y DESPACHAR EN PARALELO (Solo E/S en los hilos; la BD queda en este hilo)
+        # Los SMS van a core.sms (su propio pool y límite de tasa) en lotes de --lote, junto a los correos
+        lote = options['lote']
+        mensajes_sms = [
+            gateway_sms.MensajeSMS(destino, self._mensaje_sms(turnos), [t['id'] for t in turnos])
+            for destino, turnos in sms.items()
+        ]
+
+        # 5. REGISTRO DE ENTREGAS A MEDIDA QUE TERMINAN (Upsert: un fallo previo se sobrescribe al reintentar)
+        # Se escribe cada --lote filas y, al final o ante una interrupción, lo que quede: si el
+        # proceso cae, la re-ejecución no repite lo ya entregado
+        registros = []
+        enviados = fallidos = 0
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, options['hilos'])) as pool:
+                futuros = {pool.submit(gateway_sms.enviar_lote, mensajes_sms[i:i + lote]): None
+                           for i in range(0, len(mensajes_sms), lote)}
+                futuros.update({pool.submit(self._enviar_correo, destino, *self._mensaje_correo(turnos)): (destino, turnos)
+                                for destino, turnos in correos.items()})
                 try:
-                    msg_sms = f"RECORDATORIO CBT: Hoy tiene inspeccion en {local}. Horario: {jornada}. Por favor estar presente."
-                    # Enviamos el SMS usando la utilidad
-                    enviar_sms(telefono, msg_sms)
-                    self.stdout.write(f"   - SMS enviado a {telefono}")
-                    count += 1
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"   - Error SMS: {e}"))
-        
-        self.stdout.write(self.style.SUCCESS(f"Proceso terminado. {count} notificaciones procesadas."))
\ No newline at end of file
+                    for futuro in as_completed(futuros):
+                        ok, ko, nuevos = self._resultado(futuro, futuros[futuro])
+                        enviados, fallidos, registros = enviados + ok, fallidos + ko, registros + nuevos
+                        if len(registros) >= lote:
+                            gateway_sms.registrar_envios(registros, lote=lote)
+                            registros = []
+                except BaseException:
+                    # Lo que aún no salió ya no se envía: no quedaría registrado
+                    for pendiente in futuros:
+                        pendiente.cancel()
+                    raise
+        finally:
+            gateway_sms.registrar_envios(registros, lote=lote)
+
+        estilo = self.style.SUCCESS if not fallidos else self.style.WARNING
+        self.stdout.write(estilo(
+            f"Proceso terminado. {total_turnos} inspecciones, {enviados} notificaciones enviadas, {fallidos} fallidas."
+        ))
+
+    def _resultado(self, futuro, correo):
+        """Informa un envío terminado (lote de SMS si `correo` es None); devuelve (enviados, fallidos, registros)."""
+        if correo is None:
+            mensajes = futuro.result()
+            for mensaje in mensajes:
+                if mensaje.error:
+                    self.stdout.write(self.style.ERROR(f"   - Error SMS a {mensaje.telefono}: {mensaje.error}"))
+                else:
+                    self.stdout.write(f"   - SMS enviado a {mensaje.numero} ({len(mensaje.turnos)} local(es))")
+            fallidos = sum(1 for m in mensajes if m.error)
+            return len(mensajes) - fallidos, fallidos, gateway_sms.registros_sms(mensajes, MOTIVO)
+
+        destino, turnos = correo
+        error = futuro.exception()
+        if error:
+            self.stdout.write(self.style.ERROR(f"   - Error EMAIL a {destino}: {error}"))
+        else:
+            self.stdout.write(f"   - EMAIL enviado a {destino} ({len(turnos)} local(es))")
+        registros = [
+            RegistroEnvio(
+                turno_id=t['id'], motivo=MOTIVO, canal='EMAIL', destinatario=destino,
+                estado='FALLIDO' if error else 'ENVIADO', detalle=str(error)[:255] if error else '',
+                fecha=timezone.now(),
+            ) for t in turnos
+        ]
+        return (0, 1, registros) if error else (1, 0, registros)
+
+    @staticmethod
+    def _detalle(turnos):
+        return "\n".join(f"  - {t['local']} (Jornada: {JORNADAS.get(t['bloque'], t['bloque'])})" for t in turnos)
+
+    def _mensaje_correo(self, turnos):
+        if len(turnos) == 1:
+            asunto = f"RECORDATORIO: Inspección HOY - {turnos[0]['local']}"
+        else:
+            asunto = f"RECORDATORIO: {len(turnos)} inspecciones HOY"
+        cuerpo = (
+            "Estimado usuario,\n\n"
+            "Le recordamos que TIENE INSPECCIONES PROGRAMADAS PARA HOY:\n\n"
+            f"{self._detalle(turnos)}\n\n"
+            "Por favor, asegúrese de que haya una persona encargada en cada local."
+        )
+        return asunto, cuerpo
+
+    @staticmethod
+    def _mensaje_sms(turnos):
+        if len(turnos) == 1:
+            t = turnos[0]
+            return (f"RECORDATORIO CBT: Hoy tiene inspeccion en {t['local']}. "
+                    f"Horario: {JORNADAS.get(t['bloque'], t['bloque'])}. Por favor estar presente.")
+        locales = ", ".join(t['local'] for t in turnos)
+        return f"RECORDATORIO CBT: Hoy tiene {len(turnos)} inspecciones ({locales}). Por favor estar presente."
+
+    @staticmethod
+    def _enviar_correo(destino, asunto, cuerpo):
+        send_mail(asunto, cuerpo, 'sistema@bomberostulcan.gob.ec', [destino], fail_silently=False)
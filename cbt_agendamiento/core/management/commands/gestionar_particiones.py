@@ -0,0 +1,48 @@
+from datetime import date
+
+from django.db import connection, transaction
+
+from core import particiones
+from core.instrumentacion import ComandoInstrumentado
+
+
+class Command(ComandoInstrumentado):
+    help = 'Crea las particiones mensuales de los próximos meses y archiva las antiguas (ejecutar a diario o mensualmente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses-adelante', type=int, default=particiones.MESES_ADELANTE,
+                            help="Meses futuros con partición ya creada")
+        parser.add_argument('--retener-turnos', type=int, default=0,
+                            help="Meses de turnos a conservar en línea (0 = no archivar)")
+        parser.add_argument('--retener-notificaciones', type=int, default=0,
+                            help="Meses de notificaciones a conservar en línea (0 = no archivar)")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING("El particionado solo existe en PostgreSQL; nada que hacer."))
+            return
+
+        hoy = date.today()
+        retencion = {
+            'core_turno': options['retener_turnos'],
+            'core_notificacion': options['retener_notificaciones'],
+        }
+        with transaction.atomic(), connection.cursor() as cursor:
+            for tabla in particiones.TABLAS:
+                if not particiones.es_particionada(cursor, tabla):
+                    self.stdout.write(self.style.WARNING(f"{tabla}: no está particionada (¿migraciones pendientes?)"))
+                    continue
+
+                creadas = particiones.asegurar_futuras(cursor, tabla, hoy, options['meses_adelante'])
+                self.stdout.write(f"{tabla}: {len(creadas)} particiones nuevas {', '.join(creadas)}")
+
+                # Se archiva por meses completos: el mes en curso nunca sale
+                if retencion[tabla]:
+                    limite = particiones.sumar_meses(hoy, -retencion[tabla])
+                    archivadas = particiones.archivar(cursor, tabla, limite)
+                    self.stdout.write(
+                        f"{tabla}: {len(archivadas)} particiones anteriores a {limite} "
+                        f"movidas al esquema '{particiones.ESQUEMA_ARCHIVO}' {', '.join(archivadas)}"
+                    )
+
+        self.stdout.write(self.style.SUCCESS("PARTICIONES AL DÍA"))
@@ -0,0 +1,40 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from core import eventos
+from core.instrumentacion import ComandoInstrumentado
+from core.models import Turno
+
+ESTADOS = [codigo for codigo, _ in Turno.ESTADOS]
+
+
+def _horas(segundos):
+    return f"{segundos / 3600:8.1f} h" if segundos is not None else "       -"
+
+
+class Command(ComandoInstrumentado):
+    help = 'Percentiles del tiempo entre dos estados de turno (p. ej. espera de aprobación) por parroquia o inspector'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', default='PENDIENTE', choices=ESTADOS, help="Estado de partida")
+        parser.add_argument('--hacia', default='CONFIRMADO', choices=ESTADOS, help="Estado de llegada")
+        parser.add_argument('--por', choices=['parroquia', 'inspector'], help="Agrupación (por defecto, global)")
+        parser.add_argument('--dias', type=int, default=eventos.VENTANA.days, help="Días hacia atrás a considerar")
+
+    def handle(self, *args, **options):
+        fin = timezone.now()
+        inicio = timezone.make_aware(datetime.combine(fin.date() - timedelta(days=options['dias']), time.min))
+        filas = eventos.latencias(options['desde'], options['hacia'], agrupar=options['por'], inicio=inicio, fin=fin)
+
+        self.stdout.write(f"--> {options['desde']} -> {options['hacia']} desde {inicio:%d/%m/%Y}")
+        if not filas:
+            self.stdout.write(self.style.WARNING("Sin turnos con ambos eventos en el periodo."))
+            return
+
+        self.stdout.write(f"{'GRUPO':<20} {'TURNOS':>7} {'P50':>10} {'P90':>10} {'P99':>10}")
+        for fila in filas:
+            grupo = 'TODOS' if fila['grupo'] is None else str(fila['grupo'])
+            self.stdout.write(
+                f"{grupo:<20} {fila['total']:>7} {_horas(fila['p50'])} {_horas(fila['p90'])} {_horas(fila['p99'])}"
+            )
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+
+from core.instrumentacion import ComandoInstrumentado
+
+
+def _sesion(username):
+    """Cookie de sesión de `username` (como si hubiera iniciado sesión)."""
+    try:
+        user = User.objects.get(username=username)
+    except User.DoesNotExist:
+        raise CommandError(f"No existe el usuario {username}")
+    sesion = import_module(settings.SESSION_ENGINE).SessionStore()
+    sesion[SESSION_KEY] = str(user.pk)
+    sesion[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    sesion[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    sesion.create()
+    return f"{settings.SESSION_COOKIE_NAME}={sesion.session_key}"
+
+
+async def _leer_respuesta(reader):
+    """(código, mantener_conexión) leyendo la respuesta completa (Content-Length)."""
+    estado = await reader.readline()
+    if not estado:
+        raise ConnectionResetError
+    version, codigo = estado.split()[:2]
+    largo, cerrar = 0, version != b'HTTP/1.1'
+    while (linea := await reader.readline()) not in (b'\r\n', b''):
+        nombre, _, valor = linea.partition(b':')
+        nombre = nombre.strip().lower()
+        if nombre == b'content-length':
+            largo = int(valor)
+        elif nombre == b'connection' and valor.strip().lower() == b'close':
+            cerrar = True
+    await reader.readexactly(largo)
+    return int(codigo), not cerrar
+
+
+async def _sondeador(host, puerto, peticion, fin, intervalo, resultado):
+    conexion = None
+    while time.monotonic() < fin:
+        inicio = time.perf_counter()
+        reutilizada = conexion is not None
+        try:
+            if conexion is None:
+                conexion = await asyncio.open_connection(host, puerto)
+            reader, writer = conexion
+            writer.write(peticion)
+            await writer.drain()
+            codigo, mantener = await _leer_respuesta(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            conexion = None
+            if not reutilizada:  # Una conexión keep-alive cerrada por el servidor se reabre sin contar error
+                resultado['errores'] += 1
+                await asyncio.sleep(0.05)
+            continue
+        resultado['latencias'].append(time.perf_counter() - inicio)
+        if codigo != 200:
+            resultado['errores'] += 1
+        if not mantener:  # El worker sync de gunicorn cierra tras cada respuesta
+            conexion[1].close()
+            conexion = None
+        if intervalo:
+            await asyncio.sleep(intervalo)
+    if conexion:
+        conexion[1].close()
+
+
+async def _medir(url, cookie, concurrencia, duracion, intervalo):
+    partes = urlsplit(url)
+    peticion = (
+        f"GET {partes.path or '/'}{'?' + partes.query if partes.query else ''} HTTP/1.1\r\n"
+        f"Host: {partes.netloc}\r\nCookie: {cookie}\r\nAccept: application/json\r\n\r\n"
+    ).encode()
+    resultado = {'latencias': [], 'errores': 0}
+    fin = time.monotonic() + duracion
+    await asyncio.gather(*(
+        _sondeador(partes.hostname, partes.port or 80, peticion, fin, intervalo, resultado)
+        for _ in range(concurrencia)
+    ))
+    return resultado
+
+
+def _percentil(ordenadas, q):
+    return ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))] if ordenadas else 0.0
+
+
+class Command(ComandoInstrumentado):
+    help = 'Compara peticiones/s y latencia p99 de una API de sondeo servida por WSGI y por ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', default='http://127.0.0.1:8000', help="URL base del worker WSGI")
+        parser.add_argument('--asgi', default='http://127.0.0.1:8001', help="URL base del worker ASGI")
+        parser.add_argument('--ruta', default='/api/notificaciones/', help="Ruta a sondear")
+        parser.add_argument('--usuario', required=True, help="Usuario (cédula) con el que se sondea")
+        parser.add_argument('--concurrencia', type=int, default=500, help="Sondeadores simultáneos")
+        parser.add_argument('--duracion', type=float, default=30, help="Segundos por servidor")
+        parser.add_argument('--intervalo', type=float, default=0, help="Pausa entre sondeos de cada cliente (0 = sin pausa)")
+
+    def handle(self, *args, **options):
+        cookie = _sesion(options['usuario'])
+        self.stdout.write(
+            f"--> {options['concurrencia']} sondeadores sobre {options['ruta']} durante {options['duracion']:g}s por servidor"
+        )
+        for nombre in ('wsgi', 'asgi'):
+            url = options[nombre].rstrip('/') + options['ruta']
+            r = asyncio.run(_medir(url, cookie, options['concurrencia'], options['duracion'], options['intervalo']))
+            latencias = sorted(r['latencias'])
+            self.stdout.write(
+                f"   {nombre.upper()}: {len(latencias) / options['duracion']:.0f} pet/s | "
+                f"p50 {_percentil(latencias, 0.5) * 1000:.0f} ms | p99 {_percentil(latencias, 0.99) * 1000:.0f} ms | "
+                f"errores {r['errores']}"
+            )
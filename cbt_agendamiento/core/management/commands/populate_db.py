@@ -1,6 +1,6 @@
 import random
 from datetime import date, timedelta
-from django.core.management.base import BaseCommand
+from core.instrumentacion import ComandoInstrumentado
 from django.contrib.auth.models import User
 from django.contrib.gis.geos import Point
 from django.db import transaction
@@ -11,7 +11,7 @@ from core.models import (
     TasaPago, RequisitoLegal
 )
 
-class Command(BaseCommand):
+class Command(ComandoInstrumentado):
     help = 'Genera un ecosistema de datos completo para pruebas de estrés (Alta Densidad)'
 
     def handle(self, *args, **kwargs):
@@ -0,0 +1,24 @@
+from core import notificaciones
+from core.instrumentacion import ComandoInstrumentado
+
+
+class Command(ComandoInstrumentado):
+    help = 'Pliega el exceso de no leídas por usuario y borra por lotes las notificaciones caducadas (ejecutar a diario)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=notificaciones.LOTE_PURGA, help="Filas por DELETE")
+        parser.add_argument('--tope', type=int, default=notificaciones.TOPE_NO_LEIDAS,
+                            help="No leídas que conserva cada usuario")
+
+    def handle(self, *args, **options):
+        # 1. TOPE POR USUARIO (Primero: lo plegado queda leído y entra en la purga más adelante)
+        plegadas = notificaciones.colapsar(tope=options['tope'])
+        self.stdout.write(f"--> {plegadas} notificaciones plegadas por superar el tope de {options['tope']} sin leer")
+
+        # 2. RETENCIÓN (Lotes cortos: no bloquea la campana de los usuarios conectados)
+        borradas = notificaciones.purgar(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"PURGA COMPLETA: {borradas} notificaciones borradas "
+            f"(leídas de más de {notificaciones.RETENCION_LEIDAS.days} días o de más de "
+            f"{notificaciones.RETENCION_MAXIMA.days} días)"
+        ))
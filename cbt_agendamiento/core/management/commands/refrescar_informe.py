@@ -0,0 +1,13 @@
+from core import informes
+from core.instrumentacion import ComandoInstrumentado
+from core.models import FilaInforme
+
+
+class Command(ComandoInstrumentado):
+    help = 'Refresca (CONCURRENTLY) la vista materializada del informe de inspecciones (ejecutar cada noche)'
+
+    def handle(self, *args, **options):
+        informes.refrescar()
+        self.stdout.write(self.style.SUCCESS(
+            f"INFORME AL DÍA: {FilaInforme.objects.count()} inspecciones terminadas"
+        ))
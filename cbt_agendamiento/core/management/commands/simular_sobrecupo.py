@@ -0,0 +1,48 @@
+from datetime import date
+
+from core import capacidad
+from core.instrumentacion import ComandoInstrumentado
+from core.models import AgendaDiaria, ConfiguracionSistema
+from core.routers import leer_de_replica
+
+
+def _inicio_mes(fecha, meses_atras=0):
+    mes = fecha.year * 12 + fecha.month - 1 - meses_atras
+    return date(mes // 12, mes % 12 + 1, 1)
+
+
+class Command(ComandoInstrumentado):
+    help = 'Simula el sobrecupo sobre los meses pasados y, opcionalmente, lo aplica a las agendas futuras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=6, help="Meses completos a simular")
+        parser.add_argument('--riesgo', type=float, help="Probabilidad máxima de exceder la capacidad (por defecto, la configurada)")
+        parser.add_argument('--aplicar', action='store_true', help="Guarda el sobrecupo recomendado en las agendas futuras")
+
+    def handle(self, *args, **options):
+        config, _ = ConfiguracionSistema.objects.get_or_create(solo_id=1)
+        riesgo = options['riesgo'] if options['riesgo'] is not None else config.riesgo_sobrecupo
+        hoy = date.today()
+
+        # 1. REPETIR LOS MESES PASADOS (Cada mes solo conoce el historial anterior a él)
+        self.stdout.write(f"--> Simulando {options['meses']} meses con riesgo {riesgo:.0%}")
+        for atras in range(options['meses'], 0, -1):
+            with leer_de_replica():  # Solo historial: no compite con las reservas del primario
+                r = capacidad.simular(_inicio_mes(hoy, atras), _inicio_mes(hoy, atras - 1), riesgo)
+            if not r.jornadas:
+                self.stdout.write(f"   {r.desde:%Y-%m}: sin agendas")
+                continue
+            dias = r.dias or 1
+            self.stdout.write(
+                f"   {r.desde:%Y-%m}: {r.jornadas_llenas}/{r.jornadas} jornadas llenas, +{r.reservas_extra:.0f} reservas | "
+                f"visitas/día {r.visitas / dias:.1f} -> {r.visitas_sim / dias:.1f} | "
+                f"viajes perdidos {r.tasa_perdidos:.1%} -> {r.tasa_perdidos_sim:.1%} | "
+                f"desbordes {r.desbordes_sim:.1f}"
+            )
+
+        # 2. APLICAR A LAS AGENDAS FUTURAS
+        if not options['aplicar']:
+            return
+        agendas = AgendaDiaria.objects.filter(fecha__gte=hoy, cupos_habilitados=True)
+        cambiadas = capacidad.aplicar(capacidad.recomendar(agendas, riesgo=riesgo))
+        self.stdout.write(self.style.SUCCESS(f"Sobrecupo actualizado en {cambiadas} agendas."))
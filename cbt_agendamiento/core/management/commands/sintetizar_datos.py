@@ -0,0 +1,217 @@
+import multiprocessing
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.core.management.base import CommandError
+from django.db import connections, transaction
+from faker import Faker
+
+from core.instrumentacion import ComandoInstrumentado
+from core.models import (
+    AgendaDiaria, Establecimiento, OPCIONES_PARROQUIA, PerfilUsuario,
+    TipoEstablecimiento, Turno,
+)
+
+# Escalas predefinidas (número de establecimientos)
+ESCALAS = {'1k': 1_000, '10k': 10_000, '100k': 100_000}
+
+TIPOS_BASE = ['FARMACIA', 'TIENDA DE ABARROTES', 'RESTAURANTE', 'PANADERIA', 'FERRETERIA', 'HOTEL']
+PASSWORD_DEMO = 'cbt-demo-2025'
+
+# Estado compartido con los procesos hijos (se hereda por fork)
+_CONTEXTO = {}
+
+
+def _pools(semilla):
+    """Genera una sola vez los catálogos de texto (Faker es lento por fila)."""
+    fake = Faker('es_ES')
+    fake.seed_instance(semilla)
+    return {
+        'nombres': [fake.first_name().upper() for _ in range(300)],
+        'apellidos': [fake.last_name().upper() for _ in range(300)],
+        'calles': [fake.street_name().upper() for _ in range(300)],
+        'empresas': [fake.company().upper() for _ in range(300)],
+    }
+
+
+def _generar_bloque(bloque):
+    """
+    Construye en memoria y guarda un bloque de usuarios con sus locales y turnos.
+    Cada bloque tiene su propia semilla, así el resultado no depende del número
+    de procesos. Se confirma en una transacción por bloque.
+    """
+    ctx = _CONTEXTO
+    rng = random.Random(f"{ctx['semilla']}-{bloque}")
+    pools = ctx['pools']
+    inicio = bloque * ctx['lote']
+    fin = min(inicio + ctx['lote'], ctx['usuarios'])
+    hoy = ctx['hoy']
+
+    with transaction.atomic():
+        # 1. USUARIOS
+        usuarios = []
+        for i in range(inicio, fin):
+            cedula = f"{ctx['prefijo']}{i:08d}"
+            usuarios.append(User(
+                username=cedula,
+                password=ctx['password_hash'],
+                first_name=rng.choice(pools['nombres']),
+                last_name=rng.choice(pools['apellidos']),
+                email=f"{cedula}@correo.test",
+            ))
+        User.objects.bulk_create(usuarios, batch_size=ctx['lote_sql'])
+
+        PerfilUsuario.objects.bulk_create([
+            PerfilUsuario(
+                user=u, ruc=f"{u.username}001",
+                telefono=f"09{rng.randrange(10**8):08d}",
+                fecha_ultima_actualizacion=hoy - timedelta(days=rng.randint(0, 365)),
+            ) for u in usuarios
+        ], batch_size=ctx['lote_sql'])
+
+        # 2. ESTABLECIMIENTOS (1 a 2 por usuario)
+        locales = []
+        for u in usuarios:
+            for _ in range(rng.randint(1, 2)):
+                tipo_id = rng.choice(ctx['tipos'])
+                lng, lat = -77.7173 + rng.uniform(-0.03, 0.03), 0.8119 + rng.uniform(-0.03, 0.03)
+                locales.append(Establecimiento(
+                    propietario=u,
+                    razon_social=rng.choice(pools['empresas']),
+                    nombre_comercial=f"{ctx['nombres_tipo'][tipo_id]} {rng.choice(pools['apellidos'])}",
+                    tipo_id=tipo_id,
+                    direccion=f"{rng.choice(pools['calles'])} {rng.randint(1, 999)}",
+                    parroquia=rng.choice(ctx['parroquias']),
+                    ubicacion=Point(lng, lat, srid=4326),
+                    latitud=lat, longitud=lng,  # bulk_create no pasa por save()
+                    ubicacion_verificada=True,
+                ))
+        Establecimiento.objects.bulk_create(locales, batch_size=ctx['lote_sql'])
+
+        # 3. TURNOS (Historial y trámites activos en la agenda de su parroquia)
+        turnos = []
+        for local in locales:
+            telefono = f"09{rng.randrange(10**8):08d}"
+            pasadas = ctx['agendas_pasadas'].get(local.parroquia)
+            if pasadas and rng.random() > 0.2:
+                for _ in range(rng.randint(1, 2)):
+                    estado = rng.choices(['TERMINADO', 'CANCELADO', 'RECHAZADO', 'NO_REALIZADA'], weights=[70, 10, 10, 10])[0]
+                    turnos.append(Turno(
+                        agenda_id=rng.choice(pasadas), establecimiento=local,
+                        bloque=rng.choice(['MANANA', 'TARDE']), estado=estado,
+                        telefono_contacto=telefono, referencia_ubicacion="HISTÓRICO SINTÉTICO",
+                        numero_formulario=f"F-{rng.randint(10000, 99999)}" if estado == 'TERMINADO' else None,
+                        inspector_id=rng.choice(ctx['inspectores']) if ctx['inspectores'] and estado == 'TERMINADO' else None,
+                    ))
+            futuras = ctx['agendas_futuras'].get(local.parroquia)
+            if futuras and rng.random() > 0.85:
+                turnos.append(Turno(
+                    agenda_id=rng.choice(futuras), establecimiento=local,
+                    bloque=rng.choice(['MANANA', 'TARDE']),
+                    estado='CONFIRMADO' if rng.random() > 0.4 else 'PENDIENTE',
+                    telefono_contacto=telefono, referencia_ubicacion="SOLICITUD SINTÉTICA",
+                ))
+        Turno.objects.bulk_create(turnos, batch_size=ctx['lote_sql'])
+
+    return len(usuarios), len(locales), len(turnos)
+
+
+class Command(ComandoInstrumentado):
+    help = 'Sintetiza datos masivos y reproducibles para pruebas de carga (bulk_create por lotes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', default='1k', help="Establecimientos a generar: 1k, 10k, 100k o un número")
+        parser.add_argument('--semilla', type=int, default=2025, help="Semilla (misma semilla = mismos datos)")
+        parser.add_argument('--lote', type=int, default=1000, help="Usuarios por transacción")
+        parser.add_argument('--lote-sql', type=int, default=2000, help="Filas por INSERT")
+        parser.add_argument('--procesos', type=int, default=1, help="Procesos trabajadores")
+        parser.add_argument('--dias-historial', type=int, default=300, help="Días de agenda hacia atrás")
+        parser.add_argument('--dias-futuro', type=int, default=60, help="Días de agenda hacia adelante")
+
+    def handle(self, *args, **options):
+        escala = options['escala']
+        try:
+            total_locales = ESCALAS[escala] if escala in ESCALAS else int(escala)
+        except ValueError:
+            raise CommandError(f"Escala inválida: {escala}. Use {', '.join(ESCALAS)} o un número.")
+
+        semilla = options['semilla']
+        prefijo = f"{10 + semilla % 90:02d}"
+        if User.objects.filter(username__regex=rf"^{prefijo}[0-9]{{8}}$").exists():
+            raise CommandError(f"Ya existen usuarios sintéticos con el prefijo {prefijo}. Use otra --semilla.")
+
+        t0 = time.perf_counter()
+        hoy = date.today()
+        self.stdout.write(self.style.WARNING(f"⚠️  Sintetizando ~{total_locales:,} establecimientos (semilla {semilla})..."))
+
+        # 1. CATÁLOGOS Y AGENDA (Una sola vez, compartidos por todos los bloques)
+        for nombre in TIPOS_BASE:
+            TipoEstablecimiento.objects.get_or_create(nombre=nombre)
+        nombres_tipo = dict(TipoEstablecimiento.objects.values_list('id', 'nombre'))
+
+        parroquias = [p[0] for p in OPCIONES_PARROQUIA]
+        agendas = []
+        for i in range(-options['dias_historial'], options['dias_futuro'] + 1):
+            dia = hoy + timedelta(days=i)
+            if dia.weekday() >= 5:
+                continue
+            for zona in parroquias:
+                agendas.append(AgendaDiaria(fecha=dia, parroquia_destino=zona, capacidad_manana=6, capacidad_tarde=4))
+        AgendaDiaria.objects.bulk_create(agendas, batch_size=options['lote_sql'], ignore_conflicts=True)
+
+        agendas_pasadas, agendas_futuras = {}, {}
+        rango = AgendaDiaria.objects.filter(
+            fecha__gte=hoy - timedelta(days=options['dias_historial']),
+            fecha__lte=hoy + timedelta(days=options['dias_futuro']),
+        ).values_list('id', 'fecha', 'parroquia_destino')
+        for agenda_id, fecha, zona in rango:
+            destino = agendas_pasadas if fecha < hoy else agendas_futuras
+            destino.setdefault(zona, []).append(agenda_id)
+        self.stdout.write(f"1. Agenda lista: {len(agendas):,} jornadas ({time.perf_counter() - t0:.1f}s)")
+
+        # 2. CONTEXTO COMPARTIDO (Un solo hash de contraseña: PBKDF2 por fila es prohibitivo)
+        usuarios = -(-total_locales * 2 // 3)  # ~1.5 locales por usuario
+        _CONTEXTO.update({
+            'semilla': semilla,
+            'prefijo': prefijo,
+            'pools': _pools(semilla),
+            'password_hash': make_password(PASSWORD_DEMO),
+            'usuarios': usuarios,
+            'lote': options['lote'],
+            'lote_sql': options['lote_sql'],
+            'hoy': hoy,
+            'tipos': sorted(nombres_tipo),
+            'nombres_tipo': nombres_tipo,
+            'parroquias': parroquias,
+            'agendas_pasadas': agendas_pasadas,
+            'agendas_futuras': agendas_futuras,
+            'inspectores': list(User.objects.filter(is_staff=True).values_list('id', flat=True)),
+        })
+
+        # 3. BLOQUES (En paralelo si se piden procesos; cada hijo abre su conexión)
+        bloques = range(-(-usuarios // options['lote']))
+        totales = [0, 0, 0]
+        if options['procesos'] > 1:
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(options['procesos']) as pool:
+                resultados = pool.imap_unordered(_generar_bloque, bloques)
+                self._acumular(resultados, totales, t0)
+        else:
+            self._acumular(map(_generar_bloque, bloques), totales, t0)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ SÍNTESIS COMPLETADA en {time.perf_counter() - t0:.1f}s: "
+            f"{totales[0]:,} usuarios, {totales[1]:,} establecimientos, {totales[2]:,} turnos. "
+            f"Contraseña de los usuarios: {PASSWORD_DEMO}"
+        ))
+
+    def _acumular(self, resultados, totales, t0):
+        for n_usuarios, n_locales, n_turnos in resultados:
+            totales[0] += n_usuarios
+            totales[1] += n_locales
+            totales[2] += n_turnos
+            self.stdout.write(f"   ... {totales[1]:,} establecimientos ({time.perf_counter() - t0:.1f}s)")
@@ -0,0 +1,169 @@
+"""
+Registro de métricas en memoria por vista (formato Prometheus).
+
+Cada proceso (worker de gunicorn) mantiene su propio registro: el endpoint de
+métricas expone los datos del worker que atiende la petición.
+"""
+import math
+import threading
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+
+# Límites de los buckets en segundos (acumulativos, estilo Prometheus)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+VENTANA_MUESTRAS = 500  # Muestras recientes por vista para percentiles
+
+# Medición de la petición en curso (la llenan middleware, backend de plantillas y caché)
+medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class Histograma:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.suma = 0.0
+        self.total = 0
+        self.recientes = deque(maxlen=VENTANA_MUESTRAS)
+
+    def observar(self, valor):
+        self.suma += valor
+        self.total += 1
+        self.recientes.append(valor)
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                self.buckets[i] += 1
+
+    def percentil(self, q):
+        """Percentil por rango más cercano: el menor valor con al menos q·n muestras <= él."""
+        if not self.recientes:
+            return 0.0
+        ordenadas = sorted(self.recientes)
+        # El épsilon absorbe el redondeo de q·n (0.95 * 100 = 95.00000000000001)
+        rango = math.ceil(q * len(ordenadas) - 1e-9)
+        return ordenadas[min(len(ordenadas), max(rango, 1)) - 1]
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.duracion = defaultdict(Histograma)
+            self.duracion_sql = defaultdict(Histograma)
+            self.consultas = defaultdict(int)
+            self.plantillas = defaultdict(float)
+            self.cache = defaultdict(int)
+            self.cache_espacios = defaultdict(int)
+            self.peticiones = defaultdict(int)
+
+    def registrar(self, vista, medicion):
+        with self._lock:
+            self.peticiones[(vista, medicion['estado'])] += 1
+            self.duracion[vista].observar(medicion['duracion'])
+            self.duracion_sql[vista].observar(medicion['sql_duracion'])
+            self.consultas[vista] += medicion['sql_consultas']
+            self.plantillas[vista] += medicion['plantillas']
+            self.cache[(vista, 'hit')] += medicion['cache_hit']
+            self.cache[(vista, 'miss')] += medicion['cache_miss']
+
+    def contar_cache(self, espacio, acierto):
+        with self._lock:
+            self.cache_espacios[(espacio, 'hit' if acierto else 'miss')] += 1
+
+    def tasa_aciertos(self, espacio):
+        aciertos = self.cache_espacios.get((espacio, 'hit'), 0)
+        total = aciertos + self.cache_espacios.get((espacio, 'miss'), 0)
+        return aciertos / total if total else 0.0
+
+    def exportar(self):
+        """Devuelve el registro en formato de texto de Prometheus."""
+        lineas = []
+        with self._lock:
+            lineas += ['# HELP cbt_http_requests_total Peticiones atendidas por vista y código HTTP.',
+                       '# TYPE cbt_http_requests_total counter']
+            for (vista, estado), n in sorted(self.peticiones.items()):
+                lineas.append(f'cbt_http_requests_total{{vista="{vista}",estado="{estado}"}} {n}')
+
+            for nombre, ayuda, datos in (
+                ('cbt_http_request_duration_seconds', 'Tiempo de pared por petición.', self.duracion),
+                ('cbt_sql_duration_seconds', 'Tiempo total en SQL por petición.', self.duracion_sql),
+            ):
+                lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+                for vista, h in sorted(datos.items()):
+                    for limite, n in zip(BUCKETS, h.buckets):
+                        lineas.append(f'{nombre}_bucket{{vista="{vista}",le="{limite}"}} {n}')
+                    lineas.append(f'{nombre}_bucket{{vista="{vista}",le="+Inf"}} {h.total}')
+                    lineas.append(f'{nombre}_sum{{vista="{vista}"}} {h.suma:.6f}')
+                    lineas.append(f'{nombre}_count{{vista="{vista}"}} {h.total}')
+
+            lineas += ['# HELP cbt_http_request_recent_seconds Percentiles de las últimas peticiones.',
+                       '# TYPE cbt_http_request_recent_seconds summary']
+            for vista, h in sorted(self.duracion.items()):
+                for q in (0.5, 0.95, 0.99):
+                    lineas.append(f'cbt_http_request_recent_seconds{{vista="{vista}",quantile="{q}"}} {h.percentil(q):.6f}')
+
+            lineas += ['# HELP cbt_sql_queries_total Consultas SQL ejecutadas por vista.',
+                       '# TYPE cbt_sql_queries_total counter']
+            for vista, n in sorted(self.consultas.items()):
+                lineas.append(f'cbt_sql_queries_total{{vista="{vista}"}} {n}')
+
+            lineas += ['# HELP cbt_template_render_seconds_total Tiempo de renderizado de plantillas.',
+                       '# TYPE cbt_template_render_seconds_total counter']
+            for vista, s in sorted(self.plantillas.items()):
+                lineas.append(f'cbt_template_render_seconds_total{{vista="{vista}"}} {s:.6f}')
+
+            lineas += ['# HELP cbt_cache_requests_total Lecturas de caché por resultado.',
+                       '# TYPE cbt_cache_requests_total counter']
+            for (vista, resultado), n in sorted(self.cache.items()):
+                lineas.append(f'cbt_cache_requests_total{{vista="{vista}",resultado="{resultado}"}} {n}')
+
+            lineas += ['# HELP cbt_cache_namespace_requests_total Lecturas de caché por espacio (core.cache) y resultado.',
+                       '# TYPE cbt_cache_namespace_requests_total counter']
+            for (espacio, resultado), n in sorted(self.cache_espacios.items()):
+                lineas.append(f'cbt_cache_namespace_requests_total{{espacio="{espacio}",resultado="{resultado}"}} {n}')
+
+            lineas += ['# HELP cbt_cache_hit_ratio Proporción de aciertos por espacio de caché.',
+                       '# TYPE cbt_cache_hit_ratio gauge']
+            for espacio in sorted({e for e, _ in self.cache_espacios}):
+                lineas.append(f'cbt_cache_hit_ratio{{espacio="{espacio}"}} {self.tasa_aciertos(espacio):.4f}')
+        return '\n'.join(lineas) + '\n'
+
+
+registro = RegistroMetricas()
+
+
+def registrar_cache(acierto):
+    """Anota un hit/miss de caché en la petición en curso (si se está midiendo)."""
+    medicion = medicion_actual.get()
+    if medicion is not None:
+        medicion['cache_hit' if acierto else 'cache_miss'] += 1
+
+
+# --- BACKEND DE PLANTILLAS CON CRONÓMETRO ---
+class TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        inicio = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion = medicion_actual.get()
+            if medicion is not None:
+                medicion['plantillas'] += perf_counter() - inicio
+
+
+class DjangoTemplatesMedido(DjangoTemplates):
+    """DjangoTemplates que suma el tiempo de render a la medición en curso."""
+
+    def from_string(self, template_code):
+        return TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TemplateMedido(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
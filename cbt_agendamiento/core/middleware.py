@@ -0,0 +1,73 @@
+import cProfile
+import os
+import random
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+from . import metricas
+
+
+class PerfilamientoMiddleware:
+    """
+    Mide cada petición (tiempo de pared, SQL, plantillas y caché) y lo acumula
+    por nombre de URL en `core.metricas.registro`.
+
+    Se activa con PERFILAMIENTO_ACTIVO=True. Una fracción de las peticiones
+    (PERFILAMIENTO_MUESTREO) se ejecuta bajo cProfile; si superan
+    PERFILAMIENTO_UMBRAL_MS, el volcado .prof se guarda en PERFILAMIENTO_DIRECTORIO.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.umbral = getattr(settings, 'PERFILAMIENTO_UMBRAL_MS', 1000) / 1000
+        self.muestreo = getattr(settings, 'PERFILAMIENTO_MUESTREO', 0.0)
+        self.directorio = getattr(settings, 'PERFILAMIENTO_DIRECTORIO', None)
+
+    def __call__(self, request):
+        medicion = {
+            'sql_consultas': 0, 'sql_duracion': 0.0, 'plantillas': 0.0,
+            'cache_hit': 0, 'cache_miss': 0,
+        }
+        token = metricas.medicion_actual.set(medicion)
+
+        def medir_sql(execute, sql, params, many, context):
+            inicio = perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                medicion['sql_consultas'] += 1
+                medicion['sql_duracion'] += perf_counter() - inicio
+
+        perfilador = cProfile.Profile() if self.directorio and random.random() < self.muestreo else None
+        inicio = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(medir_sql))
+                if perfilador:
+                    perfilador.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if perfilador:
+                        perfilador.disable()
+        finally:
+            metricas.medicion_actual.reset(token)
+
+        medicion['duracion'] = perf_counter() - inicio
+        medicion['estado'] = response.status_code
+        match = getattr(request, 'resolver_match', None)
+        vista = (match.url_name or match.view_name) if match else 'sin_ruta'
+        metricas.registro.registrar(vista, medicion)
+
+        if perfilador and medicion['duracion'] >= self.umbral:
+            self._guardar_perfil(perfilador, vista, medicion['duracion'])
+        return response
+
+    def _guardar_perfil(self, perfilador, vista, duracion):
+        os.makedirs(self.directorio, exist_ok=True)
+        nombre = f"{vista}-{int(duracion * 1000)}ms-{os.getpid()}-{random.randrange(10**6):06d}.prof"
+        perfilador.dump_stats(os.path.join(self.directorio, nombre))
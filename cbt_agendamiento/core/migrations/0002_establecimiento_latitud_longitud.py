@@ -0,0 +1,57 @@
+from django.db import migrations, models
+
+
+def crear_indices_geograficos(apps, schema_editor):
+    """
+    Índice GiST sobre el cast a geography (KNN `<->` y ST_DWithin en metros) y
+    verificación del GiST de la geometría. Solo PostGIS; SpatiaLite usa su R*Tree.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS core_establecimiento_ubicacion_geog_gist "
+            "ON core_establecimiento USING GIST ((ubicacion::geography))"
+        )
+        cursor.execute(
+            "SELECT count(*) FROM pg_indexes WHERE tablename = 'core_establecimiento' AND indexdef ILIKE %s",
+            ['%USING gist (ubicacion)%']
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                "CREATE INDEX core_establecimiento_ubicacion_gist "
+                "ON core_establecimiento USING GIST (ubicacion)"
+            )
+
+
+def eliminar_indices_geograficos(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP INDEX IF EXISTS core_establecimiento_ubicacion_geog_gist")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='establecimiento',
+            name='latitud',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='establecimiento',
+            name='longitud',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            "UPDATE core_establecimiento SET latitud = ST_Y(ubicacion), longitud = ST_X(ubicacion) "
+            "WHERE ubicacion IS NOT NULL",
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunPython(crear_indices_geograficos, eliminar_indices_geograficos),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_establecimiento_latitud_longitud'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroEnvio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('motivo', models.CharField(default='RECORDATORIO', max_length=30)),
+                ('canal', models.CharField(choices=[('EMAIL', 'Correo'), ('SMS', 'SMS')], max_length=5)),
+                ('destinatario', models.CharField(max_length=254)),
+                ('estado', models.CharField(choices=[('ENVIADO', 'Enviado'), ('FALLIDO', 'Fallido')], max_length=10)),
+                ('detalle', models.CharField(blank=True, default='', max_length=255)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('turno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios', to='core.turno')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='registroenvio',
+            constraint=models.UniqueConstraint(fields=('turno', 'motivo', 'canal', 'destinatario'), name='envio_unico_destinatario'),
+        ),
+    ]
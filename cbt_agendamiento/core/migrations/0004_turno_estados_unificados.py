@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:36
+
+from django.db import migrations, models
+
+
+def normalizar_estados(apps, schema_editor):
+    # Estados escritos fuera de ESTADOS por versiones anteriores de las vistas
+    Turno = apps.get_model('core', 'Turno')
+    Turno.objects.filter(estado='AUSENTE').update(estado='NO_REALIZADA')
+    Turno.objects.filter(estado='FINALIZADO').update(estado='TERMINADO')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_registroenvio'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_estados, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='turno',
+            name='bloque',
+            field=models.CharField(choices=[('MANANA', 'MAÑANA (09:00 - 12:30)'), ('TARDE', 'TARDE (14:45 - 16:30)')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='turno',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'PENDIENTE (En Revisión)'), ('CONFIRMADO', 'CONFIRMADO (Programado)'), ('EJECUTADA', 'EJECUTADA (Pendiente Informe)'), ('RECHAZADO', 'RECHAZADO (Por Inspector)'), ('TERMINADO', 'TERMINADO (Inspección Exitosa)'), ('CANCELADO', 'CANCELADO (Por Usuario/Staff)'), ('NO_REALIZADA', 'NO REALIZADA (Ausente/Incumplido)')], default='PENDIENTE', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='turno',
+            name='numero_formulario',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='N° Formulario Físico'),
+        ),
+        migrations.AlterField(
+            model_name='turno',
+            name='referencia_ubicacion',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Referencia de Ubicación'),
+        ),
+        migrations.AlterField(
+            model_name='turno',
+            name='telefono_contacto',
+            field=models.CharField(max_length=15, verbose_name='Teléfono de Contacto'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_turno_estados_unificados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agendadiaria',
+            name='sobrecupo_manana',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agendadiaria',
+            name='sobrecupo_tarde',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='configuracionsistema',
+            name='riesgo_sobrecupo',
+            field=models.FloatField(default=0.1, verbose_name='Riesgo Máx. de Exceder Capacidad'),
+        ),
+        migrations.AddField(
+            model_name='configuracionsistema',
+            name='sobrecupo_automatico',
+            field=models.BooleanField(default=False, verbose_name='Sobrecupo Automático'),
+        ),
+    ]
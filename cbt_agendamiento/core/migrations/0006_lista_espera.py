@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_sobrecupo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListaEspera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bloque', models.CharField(choices=[('MANANA', 'MAÑANA (09:00 - 12:30)'), ('TARDE', 'TARDE (14:45 - 16:30)')], max_length=10)),
+                ('telefono_contacto', models.CharField(max_length=15, verbose_name='Teléfono de Contacto')),
+                ('referencia_ubicacion', models.CharField(blank=True, max_length=255, null=True)),
+                ('estado', models.CharField(choices=[('ESPERANDO', 'En Espera'), ('PROMOVIDO', 'Promovido a Turno'), ('RETIRADO', 'Retirado')], default='ESPERANDO', max_length=10)),
+                ('fecha_registro', models.DateTimeField(default=django.utils.timezone.now)),
+                ('agenda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='core.agendadiaria')),
+                ('establecimiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='esperas', to='core.establecimiento')),
+                ('turno', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='origen_espera', to='core.turno')),
+            ],
+            options={
+                'ordering': ['fecha_registro', 'id'],
+                'indexes': [models.Index(condition=models.Q(('estado', 'ESPERANDO')), fields=['agenda', 'bloque', 'fecha_registro', 'id'], name='espera_fifo_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='listaespera',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'ESPERANDO')), fields=('agenda', 'bloque', 'establecimiento'), name='espera_unica_activa'),
+        ),
+    ]
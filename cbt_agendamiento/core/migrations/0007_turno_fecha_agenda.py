@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copiar_fecha_agenda(apps, schema_editor):
+    Turno = apps.get_model('core', 'Turno')
+    AgendaDiaria = apps.get_model('core', 'AgendaDiaria')
+    Turno.objects.update(
+        fecha_agenda=models.Subquery(AgendaDiaria.objects.filter(pk=models.OuterRef('agenda_id')).values('fecha')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_lista_espera'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='turno',
+            name='fecha_agenda',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(copiar_fecha_agenda, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='turno',
+            name='fecha_agenda',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='registroenvio',
+            name='turno',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='envios', to='core.turno'),
+        ),
+        migrations.AlterField(
+            model_name='listaespera',
+            name='turno',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='origen_espera', to='core.turno'),
+        ),
+    ]
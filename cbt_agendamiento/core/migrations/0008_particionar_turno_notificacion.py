@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:07
+
+from django.db import migrations
+
+
+def particionar(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from core import particiones
+    with schema_editor.connection.cursor() as cursor:
+        for tabla, columna in particiones.TABLAS.items():
+            particiones.particionar(cursor, tabla, columna)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_turno_fecha_agenda'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, migrations.RunPython.noop),
+    ]
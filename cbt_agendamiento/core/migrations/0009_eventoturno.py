@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:08
+
+from django.conf import settings
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def _indice_fecha(vendor):
+    """BRIN en PostgreSQL; en SQLite/SpatiaLite (pruebas) un índice btree normal."""
+    if vendor == 'postgresql':
+        return django.contrib.postgres.indexes.BrinIndex(fields=['fecha'], name='evento_fecha_brin', autosummarize=True)
+    return models.Index(fields=['fecha'], name='evento_fecha_brin')
+
+
+def crear_indice_fecha(apps, schema_editor):
+    modelo = apps.get_model('core', 'EventoTurno')
+    schema_editor.add_index(modelo, _indice_fecha(schema_editor.connection.vendor))
+
+
+def eliminar_indice_fecha(apps, schema_editor):
+    modelo = apps.get_model('core', 'EventoTurno')
+    schema_editor.remove_index(modelo, _indice_fecha(schema_editor.connection.vendor))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0008_particionar_turno_notificacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoTurno',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.CharField(blank=True, max_length=20)),
+                ('hacia', models.CharField(max_length=20)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('turno', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='eventos', to='core.turno')),
+            ],
+        ),
+        # BRIN solo existe en PostgreSQL: el estado guarda el BRIN del modelo y la
+        # base recibe el índice que admite su motor
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='eventoturno',
+                    index=django.contrib.postgres.indexes.BrinIndex(autosummarize=True, fields=['fecha'], name='evento_fecha_brin'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(crear_indice_fecha, eliminar_indice_fecha),
+            ],
+        ),
+    ]
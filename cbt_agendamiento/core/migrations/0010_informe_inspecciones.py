@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+CONSULTA = """
+SELECT t.id, t.fecha_agenda AS fecha, t.numero_formulario AS formulario,
+       e.nombre_comercial AS local, e.direccion, p.ruc,
+       u.first_name AS inspector_nombre, u.last_name AS inspector_apellido,
+       t.observaciones
+FROM core_turno t
+JOIN core_establecimiento e ON e.id = t.establecimiento_id
+LEFT JOIN core_perfilusuario p ON p.user_id = e.propietario_id
+LEFT JOIN auth_user u ON u.id = t.inspector_id
+WHERE t.estado = 'TERMINADO'
+"""
+
+
+def crear_vista(apps, schema_editor):
+    """
+    Vista materializada en PostgreSQL. En SQLite/SpatiaLite (pruebas) una vista
+    normal con la misma consulta: siempre al día, refrescar() no hace nada.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor != 'postgresql':
+            cursor.execute(f"CREATE VIEW core_informe_inspecciones AS {CONSULTA}")
+            return
+        cursor.execute(f"CREATE MATERIALIZED VIEW core_informe_inspecciones AS {CONSULTA}")
+        # El índice único permite REFRESH ... CONCURRENTLY
+        cursor.execute("CREATE UNIQUE INDEX informe_id_uniq ON core_informe_inspecciones (id)")
+        cursor.execute("CREATE INDEX informe_fecha_idx ON core_informe_inspecciones (fecha, id)")
+
+
+def eliminar_vista(apps, schema_editor):
+    tipo = 'MATERIALIZED VIEW' if schema_editor.connection.vendor == 'postgresql' else 'VIEW'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP {tipo} IF EXISTS core_informe_inspecciones")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_eventoturno'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_vista, eliminar_vista),
+        migrations.CreateModel(
+            name='FilaInforme',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('formulario', models.CharField(max_length=50, null=True)),
+                ('local', models.CharField(max_length=255)),
+                ('direccion', models.CharField(max_length=255)),
+                ('ruc', models.CharField(max_length=13, null=True)),
+                ('inspector_nombre', models.CharField(max_length=150, null=True)),
+                ('inspector_apellido', models.CharField(max_length=150, null=True)),
+                ('observaciones', models.TextField(null=True)),
+            ],
+            options={
+                'db_table': 'core_informe_inspecciones',
+                'ordering': ['fecha', 'id'],
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import BrinIndex
 from django.contrib.gis.db import models as gis_models
 from django.db.models import Max, F
+from django.utils import timezone
+from datetime import timedelta
 
 # ==============================================================================
 #                              USUARIOS Y PERFILES
@@ -42,6 +45,9 @@ class ConfiguracionSistema(models.Model):
     solo_id = models.IntegerField(default=1, unique=True, editable=False)
     def_capacidad_manana = models.PositiveIntegerField(default=6, verbose_name="Defecto Mañana")
     def_capacidad_tarde = models.PositiveIntegerField(default=4, verbose_name="Defecto Tarde")
+    # Sobrecupo calculado por core.capacidad a partir de las ausencias históricas
+    sobrecupo_automatico = models.BooleanField(default=False, verbose_name="Sobrecupo Automático")
+    riesgo_sobrecupo = models.FloatField(default=0.10, verbose_name="Riesgo Máx. de Exceder Capacidad")
     def save(self, *args, **kwargs):
         self.solo_id = 1 
         super().save(*args, **kwargs)
@@ -60,10 +66,15 @@ class Establecimiento(models.Model):
     parroquia = models.CharField(max_length=50, choices=OPCIONES_PARROQUIA)
     ubicacion = gis_models.PointField(srid=4326, null=True, blank=True) 
     ubicacion_verificada = models.BooleanField(default=False, verbose_name="Ubicación Confirmada por Usuario")
+    # Copia plana de `ubicacion` para leer coordenadas con values() sin hidratar GEOS
+    latitud = models.FloatField(null=True, blank=True, editable=False)
+    longitud = models.FloatField(null=True, blank=True, editable=False)
     def save(self, *args, **kwargs):
         self.razon_social = self.razon_social.upper().strip()
         self.nombre_comercial = self.nombre_comercial.upper().strip()
         self.direccion = self.direccion.upper().strip()
+        self.latitud = self.ubicacion.y if self.ubicacion else None
+        self.longitud = self.ubicacion.x if self.ubicacion else None
         super().save(*args, **kwargs)
     def __str__(self): return self.nombre_comercial
 
@@ -72,12 +83,52 @@ class AgendaDiaria(models.Model):
     parroquia_destino = models.CharField(max_length=50, choices=OPCIONES_PARROQUIA)
     capacidad_manana = models.PositiveIntegerField(default=6)
     capacidad_tarde = models.PositiveIntegerField(default=4)
+    # Reservas admitidas por encima de la capacidad física (ver core.capacidad)
+    sobrecupo_manana = models.PositiveIntegerField(default=0)
+    sobrecupo_tarde = models.PositiveIntegerField(default=0)
     cupos_habilitados = models.BooleanField(default=True)
     class Meta:
         unique_together = ('fecha', 'parroquia_destino')
         ordering = ['fecha']
     def __str__(self): return f"{self.fecha} | {self.parroquia_destino}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        agenda = super().from_db(db, field_names, values)
+        agenda._fecha_original = agenda.__dict__.get('fecha')
+        return agenda
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Turno.fecha_agenda es la clave de partición: mueve los turnos si cambia la fecha
+        original = getattr(self, '_fecha_original', None)
+        if original is not None and original != self.fecha:
+            self.turnos.update(fecha_agenda=self.fecha)
+        self._fecha_original = self.fecha
+    def cupo(self, bloque):
+        """Reservas admitidas en la jornada: capacidad física + sobrecupo."""
+        if bloque == 'MANANA':
+            return self.capacidad_manana + self.sobrecupo_manana
+        return self.capacidad_tarde + self.sobrecupo_tarde
+
+
+def _completar_fecha_agenda(turnos):
+    """Rellena `fecha_agenda` desde la agenda (una consulta para las que no están cargadas)."""
+    faltan = [t for t in turnos if t.fecha_agenda is None]
+    sin_cargar = {t.agenda_id for t in faltan if not Turno.agenda.is_cached(t)}
+    fechas = dict(AgendaDiaria.objects.filter(id__in=sin_cargar).values_list('id', 'fecha')) if sin_cargar else {}
+    for t in faltan:
+        t.fecha_agenda = t.agenda.fecha if Turno.agenda.is_cached(t) else fechas.get(t.agenda_id)
+
+
+class TurnoManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        _completar_fecha_agenda(objs)
+        creados = super().bulk_create(objs, *args, **kwargs)
+        EventoTurno.objects.bulk_create([EventoTurno.de_alta(t) for t in creados if t.pk])
+        return creados
+
 
 class Turno(models.Model):
     ESTADOS = [
@@ -94,8 +145,14 @@ class Turno(models.Model):
         ('MANANA', 'MAÑANA (09:00 - 12:30)'),
         ('TARDE', 'TARDE (14:45 - 16:30)'),
     ]
+
+    # Estados que ya no ocupan cupo en la agenda
+    ESTADOS_SIN_CUPO = ('CANCELADO', 'RECHAZADO')
     
     agenda = models.ForeignKey(AgendaDiaria, on_delete=models.CASCADE, related_name='turnos')
+    # Copia de agenda.fecha: clave de partición de la tabla (ver core.particiones).
+    # Filtrar por ella en lugar de agenda__fecha evita el JOIN y poda particiones.
+    fecha_agenda = models.DateField(editable=False)
     establecimiento = models.ForeignKey(Establecimiento, on_delete=models.CASCADE)
     inspector = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     
@@ -108,16 +165,101 @@ class Turno(models.Model):
     # Número de formulario físico (Obligatorio para pasar a TERMINADO)
     numero_formulario = models.CharField(max_length=50, verbose_name="N° Formulario Físico", null=True, blank=True)
     
+    motivo_cancelacion = models.TextField(verbose_name="Motivo Cancelación", null=True, blank=True)
+    
     hora_estimada = models.TimeField(null=True, blank=True) 
     observaciones = models.TextField(blank=True, null=True)
+
+    objects = TurnoManager()
     
     def __str__(self):
         return f"{self.establecimiento.nombre_comercial} - {self.estado}"
 
+    def save(self, *args, **kwargs):
+        if self.fecha_agenda is None:
+            _completar_fecha_agenda([self])
+        alta = self._state.adding
+        super().save(*args, **kwargs)
+        if alta:
+            EventoTurno.de_alta(self).save()
+
+    @property
+    def ventana_horaria(self):
+        # '09:30 - 10:00' (la asigna core.horarios al confirmar el turno)
+        from .horarios import ventana
+        return ventana(self.hora_estimada)
+
+# ==============================================================================
+#                         HISTORIAL DE ESTADOS (SOLO INSERCIÓN)
+# ==============================================================================
+
+class EventoTurno(models.Model):
+    """
+    Un cambio de estado de un turno (`desde` vacío = alta). Nunca se actualiza
+    ni se borra: las latencias se calculan en core.eventos. Sin FKs en la base
+    de datos: los eventos sobreviven al turno y al usuario, e insertar no
+    bloquea filas ajenas.
+    """
+    turno = models.ForeignKey(Turno, on_delete=models.DO_NOTHING, db_constraint=False, related_name='eventos')
+    desde = models.CharField(max_length=20, blank=True)
+    hacia = models.CharField(max_length=20)
+    actor = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+',
+    )
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Se inserta en orden de fecha: un BRIN ocupa unos KB aun con años de eventos
+        indexes = [BrinIndex(fields=['fecha'], name='evento_fecha_brin', autosummarize=True)]
+
+    def __str__(self): return f"Turno {self.turno_id}: {self.desde or 'ALTA'} -> {self.hacia}"
+
+    @classmethod
+    def de_alta(cls, turno):
+        # Ventanilla: el inspector que lo crea; web: el ciudadano (sin actor registrado)
+        return cls(turno_id=turno.pk, hacia=turno.estado, actor_id=turno.inspector_id)
+
+# ==============================================================================
+#                   INFORME DE INSPECCIONES (VISTA MATERIALIZADA)
+# ==============================================================================
+
+class FilaInforme(models.Model):
+    """
+    Una inspección TERMINADA ya aplanada para el informe y el Excel. Es la
+    vista materializada `core_informe_inspecciones` (ver core.informes): solo
+    lectura, se refresca tras cada cierre y con el comando `refrescar_informe`.
+    """
+    id = models.BigIntegerField(primary_key=True)  # = Turno.id
+    fecha = models.DateField()
+    formulario = models.CharField(max_length=50, null=True)
+    local = models.CharField(max_length=255)
+    direccion = models.CharField(max_length=255)
+    ruc = models.CharField(max_length=13, null=True)
+    inspector_nombre = models.CharField(max_length=150, null=True)
+    inspector_apellido = models.CharField(max_length=150, null=True)
+    observaciones = models.TextField(null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'core_informe_inspecciones'
+        ordering = ['fecha', 'id']
+
+    @property
+    def inspector(self):
+        return f"{self.inspector_nombre} {self.inspector_apellido}" if self.inspector_nombre is not None else None
+
 # ==============================================================================
 #                              NOTIFICACIONES (NUEVO)
 # ==============================================================================
 
+class NotificacionQuerySet(models.QuerySet):
+    VIGENCIA = timedelta(days=90)
+
+    def vigentes(self):
+        """Las de los últimos VIGENCIA días: el sondeo solo recorre las particiones recientes."""
+        return self.filter(fecha_creacion__gte=timezone.now() - self.VIGENCIA)
+
+
 class Notificacion(models.Model):
     TIPOS = [('INFO', 'Información'), ('SUCCESS', 'Éxito'), ('WARNING', 'Alerta'), ('ERROR', 'Error')]
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notificaciones')
@@ -125,40 +267,84 @@ class Notificacion(models.Model):
     mensaje = models.TextField()
     tipo = models.CharField(max_length=20, choices=TIPOS, default='INFO')
     leido = models.BooleanField(default=False)
-    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)  # Clave de partición (core.particiones)
     link = models.CharField(max_length=200, null=True, blank=True)
+
+    objects = NotificacionQuerySet.as_manager()
+
     class Meta: ordering = ['-fecha_creacion']
     def __str__(self): return f"{self.usuario.username} - {self.titulo}"
 
-class Turno(models.Model):
-    ESTADOS = [
-        ('PENDIENTE', 'PENDIENTE'),
-        ('CONFIRMADO', 'CONFIRMADO'),
-        ('RECHAZADO', 'RECHAZADO'),
-        ('TERMINADO', 'TERMINADO (Inspección Exitosa)'),
-        ('CANCELADO', 'CANCELADO (Por Usuario/Staff)'),
-        ('NO_REALIZADA', 'NO REALIZADA (Ausente/Incumplido)'),
-    ]
-    
-    # ... (campos agenda, establecimiento, inspector, bloque igual que antes) ...
-    agenda = models.ForeignKey(AgendaDiaria, on_delete=models.CASCADE, related_name='turnos')
-    establecimiento = models.ForeignKey(Establecimiento, on_delete=models.CASCADE)
-    inspector = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
-    bloque = models.CharField(max_length=10, choices=[('MANANA', 'MAÑANA'), ('TARDE', 'TARDE')])
-    estado = models.CharField(max_length=20, choices=ESTADOS, default='PENDIENTE')
-    telefono_contacto = models.CharField(max_length=15)
+# ==============================================================================
+#                        REGISTRO DE ENVÍOS (CORREO / SMS)
+# ==============================================================================
+
+class RegistroEnvio(models.Model):
+    """
+    Resultado de cada envío por turno, canal y destinatario. Permite que los
+    procesos de aviso se vuelvan a ejecutar sin repetir lo ya entregado.
+    """
+    CANALES = [('EMAIL', 'Correo'), ('SMS', 'SMS')]
+    ESTADOS = [('ENVIADO', 'Enviado'), ('FALLIDO', 'Fallido')]
+
+    # Sin FK en la base de datos: core_turno está particionada (su PK incluye
+    # fecha_agenda); el borrado en cascada lo hace el ORM.
+    turno = models.ForeignKey(Turno, on_delete=models.CASCADE, related_name='envios', db_constraint=False)
+    motivo = models.CharField(max_length=30, default='RECORDATORIO')
+    canal = models.CharField(max_length=5, choices=CANALES)
+    destinatario = models.CharField(max_length=254)
+    estado = models.CharField(max_length=10, choices=ESTADOS)
+    detalle = models.CharField(max_length=255, blank=True, default='')
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['turno', 'motivo', 'canal', 'destinatario'], name='envio_unico_destinatario'),
+        ]
+
+    def __str__(self):
+        return f"{self.motivo} {self.canal} -> {self.destinatario} ({self.estado})"
+
+# ==============================================================================
+#                              LISTA DE ESPERA
+# ==============================================================================
+
+class ListaEspera(models.Model):
+    """
+    Locales en espera de un cupo en una agenda/jornada llena. Se atienden por
+    orden de llegada cuando una transición libera cupo (core.lista_espera).
+    """
+    ESTADOS = [('ESPERANDO', 'En Espera'), ('PROMOVIDO', 'Promovido a Turno'), ('RETIRADO', 'Retirado')]
+
+    agenda = models.ForeignKey(AgendaDiaria, on_delete=models.CASCADE, related_name='lista_espera')
+    establecimiento = models.ForeignKey(Establecimiento, on_delete=models.CASCADE, related_name='esperas')
+    bloque = models.CharField(max_length=10, choices=Turno.BLOQUES)
+    telefono_contacto = models.CharField(max_length=15, verbose_name="Teléfono de Contacto")
     referencia_ubicacion = models.CharField(max_length=255, null=True, blank=True)
-    
-    numero_formulario = models.CharField(max_length=50, verbose_name="N° Formulario", null=True, blank=True)
-    
-    # NUEVO CAMPO
-    motivo_cancelacion = models.TextField(verbose_name="Motivo Cancelación", null=True, blank=True)
-    
-    hora_estimada = models.TimeField(null=True, blank=True) 
-    observaciones = models.TextField(blank=True, null=True)
-    
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='ESPERANDO')
+    turno = models.OneToOneField(
+        Turno, null=True, blank=True, on_delete=models.SET_NULL, related_name='origen_espera', db_constraint=False,
+    )
+    fecha_registro = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['fecha_registro', 'id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['agenda', 'bloque', 'establecimiento'], condition=models.Q(estado='ESPERANDO'),
+                name='espera_unica_activa',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['agenda', 'bloque', 'fecha_registro', 'id'], condition=models.Q(estado='ESPERANDO'),
+                name='espera_fifo_idx',
+            ),
+        ]
+
     def __str__(self):
-        return f"{self.establecimiento.nombre_comercial} - {self.estado}"
+        return f"{self.establecimiento} - {self.agenda} {self.bloque} ({self.estado})"
+
 # ==============================================================================
 #                        GESTIÓN DOCUMENTAL (NUEVO)
 # ==============================================================================
@@ -0,0 +1,104 @@
+"""
+Ciclo de vida de las notificaciones internas (campana del portal).
+
+- `marcar_leidas`: un UPDATE para una, varias o todas las de un usuario.
+- `crear_en_bloque` + `colapsar`: ningún usuario acumula más de TOPE_NO_LEIDAS
+  sin leer. Las más antiguas del exceso se marcan leídas y se resumen en un
+  único aviso ("N avisos anteriores..."); así un propietario rural que recibe
+  cada fecha de visita no llena la tabla ni la campana. Los avisos sueltos
+  (transiciones, lista de espera) se pliegan en la pasada de `purgar_notificaciones`.
+- `purgar`: borra por lotes (`DELETE ... WHERE id IN (SELECT ... LIMIT n)`)
+  las leídas con más de RETENCION_LEIDAS y cualquiera fuera de la vigencia
+  (RETENCION_MAXIMA). Cada lote es una transacción corta: no bloquea la tabla
+  ni infla el WAL de una vez. Lo ejecuta el comando `purgar_notificaciones`.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import Notificacion, NotificacionQuerySet
+
+TOPE_NO_LEIDAS = 20
+RETENCION_LEIDAS = timedelta(days=30)
+RETENCION_MAXIMA = NotificacionQuerySet.VIGENCIA    # Más antiguas ya no se muestran nunca
+LOTE_PURGA = 5000
+
+
+def marcar_leidas(usuario, ids=None):
+    """Marca leídas las notificaciones del usuario (todas, o solo `ids`). Devuelve cuántas cambiaron."""
+    pendientes = Notificacion.objects.filter(usuario=usuario, leido=False)
+    if ids is not None:
+        pendientes = pendientes.filter(id__in=ids)
+    return pendientes.update(leido=True)
+
+
+def crear_en_bloque(notificaciones):
+    """
+    bulk_create + tope de no leídas para los usuarios afectados. El tope se
+    aplica tras el commit: no alarga la transacción (ni el bloqueo de la
+    agenda) de quien crea los avisos.
+    """
+    creadas = Notificacion.objects.bulk_create(notificaciones)
+    usuarios = {n.usuario_id for n in creadas}
+    transaction.on_commit(lambda: colapsar(usuarios))
+    return creadas
+
+
+def colapsar(usuarios=None, tope=TOPE_NO_LEIDAS):
+    """
+    Deja a cada usuario (todos si `usuarios` es None) con como mucho `tope` no
+    leídas: las `tope - 1` más recientes más un resumen del resto.
+    Devuelve cuántas notificaciones se plegaron.
+    """
+    no_leidas = Notificacion.objects.filter(leido=False)
+    if usuarios is not None:
+        if not usuarios:
+            return 0
+        no_leidas = no_leidas.filter(usuario_id__in=usuarios)
+
+    # Django 4.2 filtra sobre la ventana con una subconsulta: una sola lectura
+    sobrantes = list(no_leidas.annotate(
+        posicion=Window(RowNumber(), partition_by=F('usuario_id'), order_by=[F('fecha_creacion').desc(), F('id').desc()]),
+    ).filter(posicion__gte=tope).order_by().values_list('id', 'usuario_id'))
+    if not sobrantes:
+        return 0
+
+    por_usuario = {}
+    for _, usuario_id in sobrantes:
+        por_usuario[usuario_id] = por_usuario.get(usuario_id, 0) + 1
+
+    with transaction.atomic():
+        Notificacion.objects.filter(id__in=[i for i, _ in sobrantes]).update(leido=True)
+        Notificacion.objects.bulk_create([
+            Notificacion(
+                usuario_id=usuario_id,
+                titulo="Avisos anteriores 📚",
+                mensaje=f"Tiene {total} avisos anteriores que se marcaron como leídos.",
+                tipo="INFO",
+                link="/portal/",
+            ) for usuario_id, total in por_usuario.items()
+        ])
+    return len(sobrantes)
+
+
+def purgar(lote=LOTE_PURGA, ahora=None):
+    """Borra por lotes las notificaciones caducadas. Devuelve el total borrado."""
+    ahora = ahora or timezone.now()
+    tabla = Notificacion._meta.db_table
+    sql = (
+        f"DELETE FROM {tabla} WHERE id IN ("
+        f"SELECT id FROM {tabla} WHERE (leido AND fecha_creacion < %s) OR fecha_creacion < %s LIMIT %s)"
+    )
+    parametros = [ahora - RETENCION_LEIDAS, ahora - RETENCION_MAXIMA, lote]
+
+    total = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, parametros)
+            borradas = cursor.rowcount
+        total += borradas
+        if borradas < lote:
+            return total
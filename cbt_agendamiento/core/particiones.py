@@ -0,0 +1,170 @@
+"""
+Particionado por rangos mensuales (PostgreSQL) de las tablas que solo crecen.
+
+    core_turno          PARTITION BY RANGE (fecha_agenda)      -> core_turno_p2025_03, ...
+    core_notificacion   PARTITION BY RANGE (fecha_creacion)    -> core_notificacion_p2025_03, ...
+
+Cada tabla tiene además una partición DEFAULT que recoge lo que caiga fuera de
+los meses creados (p. ej. agendas habilitadas más allá de MESES_ADELANTE).
+`asegurar_futuras` mantiene MESES_ADELANTE meses creados y, si la DEFAULT ya
+tiene filas del mes que se crea, `crear_particion` las traslada a la nueva
+partición (PostgreSQL no permite crearla mientras la DEFAULT las contenga).
+Las consultas que filtran por la clave (p. ej. `fecha_agenda__gte=hoy`) solo
+recorren las particiones del rango.
+
+`archivar` separa (DETACH) las particiones anteriores a una fecha y las mueve
+al esquema ESQUEMA_ARCHIVO: dejan de verse desde el ORM pero siguen
+consultables por SQL y se pueden volcar o borrar aparte.
+
+La PK física pasa a ser (id, clave) porque PostgreSQL exige que incluya la
+clave de partición; para Django `id` sigue siendo la PK (una secuencia única).
+"""
+from datetime import date
+
+TABLAS = {
+    'core_turno': 'fecha_agenda',
+    'core_notificacion': 'fecha_creacion',
+}
+MESES_ADELANTE = 3
+ESQUEMA_ARCHIVO = 'archivo'
+
+
+def sumar_meses(fecha, meses):
+    mes = fecha.year * 12 + fecha.month - 1 + meses
+    return date(mes // 12, mes % 12 + 1, 1)
+
+
+def nombre_particion(tabla, mes):
+    return f"{tabla}_p{mes:%Y_%m}"
+
+
+def es_particionada(cursor, tabla):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [tabla])
+    return cursor.fetchone() is not None
+
+
+def particiones(cursor, tabla):
+    """[(nombre, desde, hasta)] de las particiones mensuales (sin la DEFAULT), por fecha."""
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, [tabla])
+    resultado = []
+    for nombre, limites in cursor.fetchall():
+        if limites == 'DEFAULT':
+            continue
+        # "FOR VALUES FROM ('2025-03-01') TO ('2025-04-01')" (o con hora en timestamptz)
+        desde, hasta = (date.fromisoformat(v.split("'")[1][:10]) for v in limites.split(' TO '))
+        resultado.append((nombre, desde, hasta))
+    return sorted(resultado, key=lambda p: p[1])
+
+
+def crear_particion(cursor, tabla, mes):
+    """
+    Crea la partición del mes si no existe. Devuelve su nombre o None.
+
+    Si la DEFAULT ya tiene filas de ese mes se separa, se crea la partición, se
+    le trasladan esas filas y se vuelve a adjuntar (todo en la transacción del
+    llamador; la tabla queda bloqueada mientras tanto).
+    """
+    nombre = nombre_particion(tabla, mes)
+    cursor.execute("SELECT to_regclass(%s)", [nombre])
+    if cursor.fetchone()[0] is not None:
+        return None
+    columna = TABLAS[tabla]
+    default = f"{tabla}_default"
+    rango = [mes.isoformat(), sumar_meses(mes, 1).isoformat()]
+
+    cursor.execute(
+        f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE "{columna}" >= %s AND "{columna}" < %s)', rango
+    )
+    trasladar = cursor.fetchone()[0]
+    if trasladar:
+        cursor.execute(f'ALTER TABLE "{tabla}" DETACH PARTITION "{default}"')
+    cursor.execute(f'CREATE TABLE "{nombre}" PARTITION OF "{tabla}" FOR VALUES FROM (%s) TO (%s)', rango)
+    if trasladar:
+        # Las particiones comparten el orden de columnas de la tabla madre
+        cursor.execute(
+            f'WITH movidas AS (DELETE FROM "{default}" WHERE "{columna}" >= %s AND "{columna}" < %s RETURNING *) '
+            f'INSERT INTO "{nombre}" SELECT * FROM movidas', rango
+        )
+        cursor.execute(f'ALTER TABLE "{tabla}" ATTACH PARTITION "{default}" DEFAULT')
+    return nombre
+
+
+def asegurar_futuras(cursor, tabla, hoy=None, meses=MESES_ADELANTE):
+    """Particiones desde el mes actual hasta `meses` adelante. Devuelve las creadas."""
+    inicio = sumar_meses(hoy or date.today(), 0)
+    creadas = (crear_particion(cursor, tabla, sumar_meses(inicio, i)) for i in range(meses + 1))
+    return [nombre for nombre in creadas if nombre]
+
+
+def archivar(cursor, tabla, antes_de):
+    """
+    Separa las particiones que terminan en o antes de `antes_de` y las mueve a
+    ESQUEMA_ARCHIVO. Devuelve los nombres archivados.
+    """
+    cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{ESQUEMA_ARCHIVO}"')
+    archivadas = []
+    for nombre, _, hasta in particiones(cursor, tabla):
+        if hasta > antes_de:
+            break
+        cursor.execute(f'ALTER TABLE "{tabla}" DETACH PARTITION "{nombre}"')
+        cursor.execute(f'ALTER TABLE "{nombre}" SET SCHEMA "{ESQUEMA_ARCHIVO}"')
+        archivadas.append(nombre)
+    return archivadas
+
+
+def particionar(cursor, tabla, columna, hoy=None):
+    """
+    Convierte `tabla` en una tabla particionada por mes de `columna`
+    conservando datos, índices, FKs salientes e ids. Las FKs que apuntan a la
+    tabla deben haberse quitado antes (no pueden referenciar solo `id`).
+    """
+    if es_particionada(cursor, tabla):
+        return
+    legado = f"{tabla}_legado"
+
+    # Definiciones a recrear con los mismos nombres una vez borrada la tabla vieja
+    cursor.execute("""
+        SELECT indexdef FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s
+    """, [tabla, f"{tabla}_pkey"])
+    indices = [fila[0] for fila in cursor.fetchall()]
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype = 'f'
+    """, [tabla])
+    fks = cursor.fetchall()
+    cursor.execute(f'SELECT date_trunc(\'month\', MIN("{columna}"))::date FROM "{tabla}"')
+    primero = cursor.fetchone()[0]
+
+    cursor.execute(f'ALTER TABLE "{tabla}" RENAME TO "{legado}"')
+    cursor.execute(
+        f'CREATE TABLE "{tabla}" (LIKE "{legado}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ("{columna}")'
+    )
+    cursor.execute(f'ALTER TABLE "{tabla}" ADD CONSTRAINT "{tabla}_pkey" PRIMARY KEY (id, "{columna}")')
+    cursor.execute(f'CREATE TABLE "{tabla}_default" PARTITION OF "{tabla}" DEFAULT')
+
+    hoy = hoy or date.today()
+    mes = sumar_meses(primero or hoy, 0)
+    while mes <= hoy:
+        crear_particion(cursor, tabla, mes)
+        mes = sumar_meses(mes, 1)
+    asegurar_futuras(cursor, tabla, hoy)
+
+    cursor.execute(f'INSERT INTO "{tabla}" SELECT * FROM "{legado}"')
+    cursor.execute(f'DROP TABLE "{legado}"')
+
+    # La identidad de la tabla vieja se borra con ella: secuencia propia con el mismo nombre
+    secuencia = f"{tabla}_id_seq"
+    cursor.execute(f'CREATE SEQUENCE "{secuencia}" OWNED BY "{tabla}".id')
+    cursor.execute(f'SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) FROM "{tabla}"', [secuencia])
+    cursor.execute(f'ALTER TABLE "{tabla}" ALTER COLUMN id SET DEFAULT nextval(%s::regclass)', [secuencia])
+
+    for definicion in indices:
+        cursor.execute(definicion)
+    for nombre, definicion in fks:
+        cursor.execute(f'ALTER TABLE "{tabla}" ADD CONSTRAINT "{nombre}" {definicion}')
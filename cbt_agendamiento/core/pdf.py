@@ -0,0 +1,179 @@
+"""
+PDF generados en el servidor: hoja de ruta e informe de inspecciones.
+
+    trabajo = pdf.solicitar('hoja_ruta', {'fecha': '2025-06-02', 'zona': 'SUR', 'bloque': 'MANANA'})
+    trabajo.listo  -> el archivo está en trabajo.ruta
+    si no          -> se está generando; la misma petición lo servirá al terminar
+
+Cada PDF se identifica por (documento, parámetros, versión de los datos). La
+versión es la del espacio de caché del documento: MAPA para la hoja de ruta
+(cambia con cada transición o local editado) e INFORME para el informe
+(cambia al refrescar la vista materializada). Mientras los datos no cambien,
+una petición idéntica recibe el archivo ya generado al instante.
+
+La generación (consulta, plantilla y WeasyPrint) corre fuera de la petición
+en un pool de PDF_PROCESOS procesos `spawn` (cada uno con su django.setup() y
+sus conexiones). La marca "en curso" se guarda con add() en la caché
+compartida: aunque varios workers pidan el mismo PDF, se genera una vez.
+Los archivos viven en settings.PDF_DIRECTORIO, compartido entre workers.
+Con PDF_PROCESOS=0 se genera en la propia petición (desarrollo y pruebas).
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.db import close_old_connections
+from django.template.loader import render_to_string
+from django.utils.module_loading import import_string
+
+from . import cache
+
+try:
+    from weasyprint import HTML
+except (ImportError, OSError):  # pragma: no cover - depende del entorno (necesita pango)
+    HTML = None
+
+logger = logging.getLogger(__name__)
+
+TIEMPO_MAXIMO = 300       # Segundos que dura la marca "en curso" si un proceso muere
+PAUSA_ERROR = 30          # Segundos sin reintentar un PDF que falló
+RETENCION = 24 * 3600     # Los PDF de versiones viejas se borran pasado un día
+
+
+@dataclass(frozen=True)
+class Documento:
+    contexto: str           # Ruta a la función parametros -> contexto de plantilla
+    plantilla: str
+    espacio: cache.Espacio  # Su versión identifica los datos del documento
+
+
+DOCUMENTOS = {
+    'hoja_ruta': Documento('core.views.contexto_hoja_ruta', 'pdf/hoja_ruta.html', cache.MAPA),
+    'informe': Documento('core.views.contexto_informe', 'pdf/informe.html', cache.INFORME),
+}
+
+
+@dataclass
+class Trabajo:
+    clave: str
+    ruta: str
+    estado: str   # 'LISTO', 'EN_CURSO' o 'ERROR'
+
+    @property
+    def listo(self):
+        return self.estado == 'LISTO'
+
+
+def disponible():
+    return HTML is not None
+
+
+def clave(nombre, parametros, version):
+    texto = repr((nombre, sorted(parametros.items()), version)).encode()
+    return f"{nombre}-{hashlib.blake2b(texto, digest_size=16).hexdigest()}"
+
+
+def _ruta(clave_pdf):
+    return os.path.join(settings.PDF_DIRECTORIO, f"{clave_pdf}.pdf")
+
+
+# ==============================================================================
+#                          GENERACIÓN (PROCESO HIJO)
+# ==============================================================================
+
+def _iniciar_proceso():
+    import django
+    django.setup()
+
+
+def _podar(directorio, ahora):
+    for archivo in Path(directorio).glob('*.pdf'):
+        try:
+            if ahora - archivo.stat().st_mtime > RETENCION:
+                archivo.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def generar(nombre, parametros, destino):
+    """Consulta, renderiza y escribe el PDF (de forma atómica) en `destino`."""
+    close_old_connections()  # Proceso de larga vida: respeta CONN_MAX_AGE y los health checks
+    documento = DOCUMENTOS[nombre]
+    contexto = import_string(documento.contexto)(**parametros)
+    logo = finders.find('img/logo_cbt.png')
+    contexto['logo'] = Path(logo).as_uri() if logo else None
+    html = render_to_string(documento.plantilla, contexto)
+
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    HTML(string=html).write_pdf(temporal)
+    os.replace(temporal, destino)
+    _podar(os.path.dirname(destino), time.time())
+    return destino
+
+
+# ==============================================================================
+#                          SOLICITUDES (PROCESO WEB)
+# ==============================================================================
+
+_pool = None
+_cerrojo = threading.Lock()
+
+
+def _ejecutor(reiniciar=False):
+    global _pool
+    with _cerrojo:
+        if _pool is None or reiniciar:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_PROCESOS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_iniciar_proceso,
+            )
+        return _pool
+
+
+def _terminado(clave_pdf, futuro):
+    error = futuro.exception()
+    if error is None:
+        cache.PDF.delete(clave_pdf)
+    else:
+        logger.error("Error generando el PDF %s", clave_pdf, exc_info=error)
+        cache.PDF.set(clave_pdf, 'ERROR', PAUSA_ERROR)
+
+
+def solicitar(nombre, parametros):
+    """Trabajo del PDF pedido; lo encola si no existe ni se está generando."""
+    documento = DOCUMENTOS[nombre]
+    clave_pdf = clave(nombre, parametros, documento.espacio.version())
+    destino = _ruta(clave_pdf)
+    if os.path.exists(destino):
+        return Trabajo(clave_pdf, destino, 'LISTO')
+    if cache.PDF.get(clave_pdf) == 'ERROR':
+        return Trabajo(clave_pdf, destino, 'ERROR')
+    if not cache.PDF.add(clave_pdf, 'EN_CURSO', TIEMPO_MAXIMO):
+        return Trabajo(clave_pdf, destino, 'EN_CURSO')
+
+    if not settings.PDF_PROCESOS:
+        try:
+            generar(nombre, parametros, destino)
+        finally:
+            cache.PDF.delete(clave_pdf)
+        return Trabajo(clave_pdf, destino, 'LISTO')
+
+    try:
+        futuro = _ejecutor().submit(generar, nombre, parametros, destino)
+    except BrokenProcessPool:
+        # Un proceso murió (p. ej. por memoria): el pool no se recupera solo
+        futuro = _ejecutor(reiniciar=True).submit(generar, nombre, parametros, destino)
+    futuro.add_done_callback(partial(_terminado, clave_pdf))
+    return Trabajo(clave_pdf, destino, 'EN_CURSO')
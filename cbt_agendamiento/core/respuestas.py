@@ -0,0 +1,155 @@
+"""
+Respuestas JSON de la app: serialización rápida, validadores y compresión.
+
+- Serializa con orjson si está instalado (varias veces más rápido que el
+  encoder de la librería estándar) y, si no, con DjangoJSONEncoder.
+- ETag débil sobre el cuerpo sin comprimir: un sondeo con If-None-Match cuyo
+  contenido no cambió recibe 304 sin cuerpo. Por defecto se envía
+  `Cache-Control: private, no-cache` para que el navegador revalide siempre.
+- Cuerpos de UMBRAL_COMPRESION bytes o más se comprimen con brotli (si está
+  instalado y el cliente lo acepta) o gzip.
+
+`respuesta_html_por_partes` sirve páginas con miles de filas (informes para
+imprimir) en streaming: la cabecera sale de inmediato y las filas se
+renderizan por lotes a medida que llegan de la base de datos.
+"""
+import gzip
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.template import Context
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende del entorno
+    brotli = None
+
+UMBRAL_COMPRESION = 1024        # Bytes; por debajo la cabecera pesa más que el ahorro
+NIVEL_GZIP = 6
+NIVEL_BROTLI = 5
+MARCA_FILAS = mark_safe('<!--filas-->')
+LOTE_FILAS = 500
+_ENCODER = DjangoJSONEncoder()
+
+
+def dumps(datos):
+    """JSON en bytes (UTF-8). Decimal, lazy strings, etc. como DjangoJSONEncoder."""
+    if orjson is not None:
+        return orjson.dumps(datos, default=_ENCODER.default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def dumps_html(datos):
+    """JSON como texto para incrustar en una plantilla (`<` escapado, no cierra el <script>)."""
+    return dumps(datos).decode().replace('<', '\\u003c')
+
+
+def etag(cuerpo):
+    return f'W/"{hashlib.blake2b(cuerpo, digest_size=16).hexdigest()}"'
+
+
+def _coincide(request, valor):
+    cabecera = request.headers.get('If-None-Match', '')
+    if cabecera.strip() == '*':
+        return True
+    # Comparación débil: W/"x" y "x" son el mismo validador
+    return valor.removeprefix('W/') in {e.strip().removeprefix('W/') for e in cabecera.split(',')}
+
+
+def _aceptadas(cabecera):
+    """Codificaciones de Accept-Encoding con q > 0 (`gzip;q=0` las rechaza)."""
+    aceptadas = set()
+    for opcion in cabecera.split(','):
+        nombre, *parametros = (parte.strip() for parte in opcion.split(';'))
+        calidad = 1.0
+        for parametro in parametros:
+            clave, _, valor = parametro.partition('=')
+            if clave.strip().lower() == 'q':
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        if nombre and calidad > 0:
+            aceptadas.add(nombre.lower())
+    return aceptadas
+
+
+def _codificacion(request):
+    aceptadas = _aceptadas(request.headers.get('Accept-Encoding', ''))
+    if brotli is not None and 'br' in aceptadas:
+        return 'br'
+    return 'gzip' if 'gzip' in aceptadas else None
+
+
+def respuesta_json(request, datos, status=200, max_age=None):
+    """
+    HttpResponse JSON con ETag, 304 ante If-None-Match y compresión.
+    `max_age` (segundos) permite al navegador reutilizarla sin revalidar.
+    """
+    cuerpo = dumps(datos)
+    validador = etag(cuerpo) if status == 200 else None
+
+    if validador and request.method in ('GET', 'HEAD') and _coincide(request, validador):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content_type='application/json', status=status)
+        codificacion = _codificacion(request) if len(cuerpo) >= UMBRAL_COMPRESION else None
+        if codificacion == 'br':
+            cuerpo = brotli.compress(cuerpo, quality=NIVEL_BROTLI)
+        elif codificacion == 'gzip':
+            cuerpo = gzip.compress(cuerpo, compresslevel=NIVEL_GZIP, mtime=0)
+        if codificacion:
+            response['Content-Encoding'] = codificacion
+        response.content = cuerpo
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+    if validador:
+        response['ETag'] = validador
+    if max_age is None:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, private=True, max_age=max_age)
+    return response
+
+
+def respuesta_html_por_partes(request, plantilla, contexto, filas, plantilla_fila, lote=LOTE_FILAS):
+    """
+    StreamingHttpResponse de `plantilla` con las filas de `filas` (queryset)
+    renderizadas con `plantilla_fila` (contexto: `fila` y su número `n`) donde
+    la página muestra `{{ marca_filas }}`.
+
+    La página se renderiza una vez (cabecera y pie); la plantilla de fila se
+    compila una vez y se aplica sobre un único Context. El queryset se recorre
+    con iterator(): la memoria no crece con el número de filas.
+    """
+    pagina = render_to_string(plantilla, {**contexto, 'marca_filas': MARCA_FILAS}, request)
+    cabecera, pie = pagina.split(MARCA_FILAS, 1)
+    fila = get_template(plantilla_fila).template
+    # La base de datos se fija ahora: el generador corre fuera de la vista (y de leer_de_replica)
+    filas = filas.using(filas.db)
+
+    def generar():
+        yield cabecera
+        contexto_fila = Context(autoescape=True)
+        partes = []
+        for n, objeto in enumerate(filas.iterator(chunk_size=lote), 1):
+            with contexto_fila.push(fila=objeto, n=n):
+                partes.append(fila.render(contexto_fila))
+            if len(partes) == lote:
+                yield ''.join(partes)
+                partes.clear()
+        yield ''.join(partes) + pie
+
+    response = StreamingHttpResponse(generar(), content_type='text/html; charset=utf-8')
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
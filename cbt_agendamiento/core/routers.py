@@ -0,0 +1,49 @@
+"""
+Enrutado de lecturas a la réplica (alias 'replica', ver DATABASE_REPLICA_URL).
+
+Por defecto todo va al primario: solo las lecturas hechas dentro de
+`leer_de_replica()` (informes, estadísticas, simulaciones) van a la réplica.
+Reservas y transiciones nunca la usan: las escrituras y `select_for_update`
+siempre van al primario, y dentro de una transacción abierta en el primario
+también las lecturas (para ver lo que la propia transacción escribió).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+
+_en_replica = ContextVar('en_replica', default=False)
+
+
+@contextmanager
+def leer_de_replica():
+    """Contexto (o decorador: `@leer_de_replica()`) para consultas analíticas de solo lectura."""
+    token = _en_replica.set(True)
+    try:
+        yield
+    finally:
+        _en_replica.reset(token)
+
+
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        if not _en_replica.get() or REPLICA not in settings.DATABASES:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Misma base de datos replicada: los objetos leídos de la réplica se
+        # pueden relacionar con los del primario.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación
+        return db != REPLICA
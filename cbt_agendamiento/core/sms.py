@@ -0,0 +1,240 @@
+"""
+Subsistema de SMS con backend intercambiable (como EMAIL_BACKEND).
+
+    SMS_BACKEND = 'core.sms.SNSBackend'      # Producción (AWS SNS)
+    SMS_BACKEND = 'core.sms.ConsolaBackend'  # Desarrollo (imprime en consola)
+    SMS_BACKEND = 'core.sms.MemoriaBackend'  # Pruebas (acumula en core.sms.bandeja)
+
+Los números se normalizan a E.164 (+593...) una sola vez por lote, los envíos
+en lote comparten un límite de mensajes por segundo y las vistas pueden
+despachar en segundo plano sin bloquear la respuesta.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('core.sms')
+
+# Mensajes enviados con MemoriaBackend (equivalente a mail.outbox)
+bandeja = []
+
+
+# ==============================================================================
+#                         NORMALIZACIÓN DE NÚMEROS (ECUADOR)
+# ==============================================================================
+
+_NO_DIGITOS = re.compile(r'\D')
+
+
+def normalizar_telefono(numero):
+    """
+    Devuelve el número en formato E.164 o None si no es un número ecuatoriano
+    válido. Acepta celulares (09XXXXXXXX, 9XXXXXXXX), fijos (0[2-7]XXXXXXX) y
+    números con prefijo 593 / +593 / 00593.
+    """
+    if not numero:
+        return None
+    digitos = _NO_DIGITOS.sub('', str(numero))
+    if digitos.startswith('00593'):
+        digitos = digitos[2:]
+    if digitos.startswith('593'):
+        digitos = digitos[3:]
+    digitos = digitos.lstrip('0')
+
+    if len(digitos) == 9 and digitos[0] == '9':        # Celular
+        return f"+593{digitos}"
+    if len(digitos) == 8 and digitos[0] in '234567':   # Fijo con código de provincia
+        return f"+593{digitos}"
+    return None
+
+
+def normalizar_lote(numeros):
+    """{original: E.164 o None}, normalizando cada número distinto una sola vez."""
+    return {n: normalizar_telefono(n) for n in set(numeros)}
+
+
+# ==============================================================================
+#                                   BACKENDS
+# ==============================================================================
+
+class BaseSMSBackend:
+    """Interfaz de los backends: `enviar` recibe un número ya normalizado."""
+
+    def __init__(self, remitente=None):
+        self.remitente = remitente or getattr(settings, 'SMS_REMITENTE', '')
+
+    def enviar(self, numero, mensaje):
+        raise NotImplementedError
+
+
+class ConsolaBackend(BaseSMSBackend):
+    def enviar(self, numero, mensaje):
+        print(f"📱 [SMS] {numero}: {mensaje}")
+
+
+class MemoriaBackend(BaseSMSBackend):
+    def enviar(self, numero, mensaje):
+        bandeja.append({'numero': numero, 'mensaje': mensaje})
+
+
+class SNSBackend(BaseSMSBackend):
+    """SMS transaccional vía AWS SNS. Los errores de boto3 se propagan."""
+
+    def enviar(self, numero, mensaje):
+        atributos = {'AWS.SNS.SMS.SMSType': {'DataType': 'String', 'StringValue': 'Transactional'}}
+        if self.remitente:
+            atributos['AWS.SNS.SMS.SenderID'] = {'DataType': 'String', 'StringValue': self.remitente}
+        _cliente_sns().publish(PhoneNumber=numero, Message=mensaje, MessageAttributes=atributos)
+
+
+@lru_cache(maxsize=1)
+def _cliente_sns():
+    # Los clientes de boto3 son thread-safe: uno por proceso
+    import boto3
+    return boto3.client(
+        'sns',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_REGION,
+    )
+
+
+def get_backend():
+    return import_string(getattr(settings, 'SMS_BACKEND', 'core.sms.ConsolaBackend'))()
+
+
+# ==============================================================================
+#                           ENVÍO EN LOTE Y LÍMITE DE TASA
+# ==============================================================================
+
+class LimitadorTasa:
+    """Espacia las llamadas para no superar `por_segundo` entre todos los hilos."""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self._siguiente = 0.0
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            ahora = monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            sleep(turno - ahora)
+
+
+@lru_cache(maxsize=1)
+def _limitador():
+    # Compartido por el proceso: lotes y envíos en segundo plano suman a la misma cuota
+    return LimitadorTasa(getattr(settings, 'SMS_POR_SEGUNDO', 10))
+
+
+@dataclass
+class MensajeSMS:
+    telefono: str
+    texto: str
+    turnos: list = field(default_factory=list)  # ids de Turno, para el registro de envíos
+    numero: str = None  # E.164, se completa al normalizar
+    error: str = ''
+
+
+def enviar_lote(mensajes, hilos=None, backend=None):
+    """
+    Normaliza, agrupa por número y envía en paralelo respetando SMS_POR_SEGUNDO.
+    Devuelve los mismos `MensajeSMS` con `numero` y `error` completados; los
+    mensajes repetidos para un número se envían una sola vez.
+    """
+    backend = backend or get_backend()
+    limitador = _limitador()
+    normalizados = normalizar_lote(m.telefono for m in mensajes)
+
+    unicos = {}
+    for m in mensajes:
+        m.numero = normalizados[m.telefono]
+        if m.numero is None:
+            m.error = f"Número inválido: {m.telefono}"
+        else:
+            unicos.setdefault((m.numero, m.texto), []).append(m)
+
+    def enviar(clave):
+        numero, texto = clave
+        limitador.esperar()
+        try:
+            backend.enviar(numero, texto)
+        except Exception as e:
+            logger.warning("SMS fallido a %s: %s", numero, e)
+            for m in unicos[clave]:
+                m.error = str(e)[:255] or e.__class__.__name__
+
+    with ThreadPoolExecutor(max_workers=hilos or getattr(settings, 'SMS_HILOS', 4)) as pool:
+        list(pool.map(enviar, unicos))
+    return mensajes
+
+
+def registrar_envios(registros, lote=500):
+    """Upsert de RegistroEnvio: un envío fallido se sobrescribe al reintentar."""
+    from .models import RegistroEnvio
+    RegistroEnvio.objects.bulk_create(
+        registros, batch_size=lote,
+        update_conflicts=True,
+        unique_fields=['turno', 'motivo', 'canal', 'destinatario'],
+        update_fields=['estado', 'detalle', 'fecha'],
+    )
+
+
+def registros_sms(mensajes, motivo):
+    """Filas de RegistroEnvio para los mensajes ya procesados por `enviar_lote`."""
+    from .models import RegistroEnvio
+    ahora = timezone.now()
+    return [
+        RegistroEnvio(
+            turno_id=turno_id, motivo=motivo, canal='SMS',
+            destinatario=m.numero or m.telefono,
+            estado='FALLIDO' if m.error else 'ENVIADO', detalle=m.error, fecha=ahora,
+        )
+        for m in mensajes for turno_id in m.turnos
+    ]
+
+
+# ==============================================================================
+#                         ENVÍO EN SEGUNDO PLANO (VISTAS)
+# ==============================================================================
+
+_pool_fondo = ThreadPoolExecutor(max_workers=2, thread_name_prefix='sms')
+
+
+def _enviar_y_registrar(mensajes, motivo):
+    try:
+        enviar_lote(mensajes, hilos=1)
+        registrar_envios(registros_sms(mensajes, motivo))
+    except Exception:
+        logger.exception("Error en el envío de SMS en segundo plano (%s)", motivo)
+    finally:
+        # Cada hilo abre su propia conexión: se cierra al terminar
+        connections.close_all()
+
+
+def programar_lote(mensajes, motivo='AVISO'):
+    """
+    Programa los SMS para después del commit de la transacción en curso y los
+    envía desde un hilo de fondo: la petición no espera a la pasarela.
+    """
+    mensajes = [m for m in mensajes if m.telefono]
+    if mensajes:
+        transaction.on_commit(lambda: _pool_fondo.submit(_enviar_y_registrar, mensajes, motivo))
+
+
+def enviar_en_segundo_plano(telefono, texto, turno_id=None, motivo='AVISO'):
+    programar_lote([MensajeSMS(telefono, texto, [turno_id] if turno_id else [])], motivo)
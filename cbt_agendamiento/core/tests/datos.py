@@ -0,0 +1,142 @@
+"""
+Dataset determinista para las pruebas de rendimiento.
+
+Siempre genera los mismos registros para una escala y semilla dadas, de modo
+que el número de consultas por vista sea reproducible entre ejecuciones.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+
+from core import informes
+from core.models import (
+    AgendaDiaria, ConfiguracionSistema, Establecimiento, Notificacion,
+    PerfilUsuario, RequisitoLegal, TasaPago, TipoEstablecimiento, Turno,
+)
+
+# Número de establecimientos por escala
+ESCALAS = {
+    'pequena': 12,
+    'mediana': 48,
+}
+
+PARROQUIAS_URBANAS = ['TULCAN_CENTRO', 'GONZALEZ_SUAREZ']
+ESTADOS_HISTORICOS = ['TERMINADO', 'TERMINADO', 'CANCELADO', 'NO_REALIZADA', 'RECHAZADO']
+DIAS_AGENDA = 7  # Agendas desde hoy-7 hasta hoy+7
+
+
+def _crear_usuario(username, first_name, email, telefono, **extra):
+    user = User.objects.create_user(
+        username=username, password=username, first_name=first_name,
+        last_name='PRUEBA', email=email, **extra
+    )
+    PerfilUsuario.objects.create(user=user, ruc=f"{username}001", telefono=telefono)
+    return user
+
+
+def sembrar(escala='pequena', semilla=2025):
+    """
+    Crea el dataset de la escala indicada y devuelve un diccionario con los
+    objetos de referencia que usan las pruebas (ids para las URLs).
+    """
+    rng = random.Random(semilla)
+    n = ESCALAS[escala]
+    hoy = date.today()
+
+    # 1. CATÁLOGOS
+    ConfiguracionSistema.objects.get_or_create(solo_id=1)
+    tipos = [TipoEstablecimiento.objects.create(nombre=nombre) for nombre in ('FARMACIA', 'RESTAURANTE', 'FERRETERIA')]
+    tasas = [TasaPago.objects.create(tipo=t, valor=10 + i * 5) for i, t in enumerate(tipos)]
+    requisitos = [
+        RequisitoLegal.objects.create(seccion=sec, titulo=f"Requisito {sec}", contenido="Detalle")
+        for sec in ('DOC', 'PQS', 'SEN')
+    ]
+
+    # 2. USUARIOS
+    staff = _crear_usuario('0400000001', 'INSPECTOR', 'inspector@cbt.test', '0990000001',
+                           is_staff=True, is_superuser=True)
+    ciudadano = _crear_usuario('0400000002', 'CIUDADANO', 'ciudadano@cbt.test', '0990000002')
+    propietarios = [
+        _crear_usuario(f"04{i:08d}", f"PROPIETARIO {i}", f"p{i}@cbt.test", f"09{i:08d}")
+        for i in range(3, 3 + max(1, n // 4))
+    ]
+
+    # 3. AGENDA (Zonas urbanas, hoy +/- DIAS_AGENDA)
+    agendas = {}
+    for offset in range(-DIAS_AGENDA, DIAS_AGENDA + 1):
+        for zona in PARROQUIAS_URBANAS:
+            agendas[(offset, zona)] = AgendaDiaria(
+                fecha=hoy + timedelta(days=offset), parroquia_destino=zona,
+                capacidad_manana=6, capacidad_tarde=4, cupos_habilitados=True
+            )
+    AgendaDiaria.objects.bulk_create(agendas.values())
+
+    # 4. ESTABLECIMIENTOS (El ciudadano de prueba crece con la escala para exponer N+1)
+    locales_ciudadano = max(2, n // 6)
+    locales = []
+    for i in range(n):
+        dueno = ciudadano if i < locales_ciudadano else propietarios[i % len(propietarios)]
+        lng, lat = -77.7173 + rng.uniform(-0.03, 0.03), 0.8119 + rng.uniform(-0.03, 0.03)
+        locales.append(Establecimiento(
+            propietario=dueno,
+            razon_social=f"EMPRESA {i}",
+            nombre_comercial=f"LOCAL {i}",
+            tipo=tipos[i % len(tipos)],
+            direccion=f"CALLE {i}",
+            parroquia=PARROQUIAS_URBANAS[i % 2],
+            ubicacion=Point(lng, lat, srid=4326),
+            latitud=lat, longitud=lng,
+            ubicacion_verificada=True,
+        ))
+    Establecimiento.objects.bulk_create(locales)
+
+    # 5. TURNOS (Uno histórico y uno activo por local)
+    turnos = []
+    for i, local in enumerate(locales):
+        zona = local.parroquia
+        estado = ESTADOS_HISTORICOS[i % len(ESTADOS_HISTORICOS)]
+        turnos.append(Turno(
+            agenda=agendas[(-(i % DIAS_AGENDA) - 1, zona)], establecimiento=local,
+            bloque='MANANA' if i % 2 == 0 else 'TARDE', estado=estado,
+            inspector=staff, telefono_contacto='0990000000',
+            numero_formulario=f"F-{10000 + i}" if estado == 'TERMINADO' else None,
+        ))
+        if i % 3 == 0:
+            offset, estado = 0, 'CONFIRMADO'
+        elif i % 3 == 1:
+            offset, estado = (i % DIAS_AGENDA) + 1, 'PENDIENTE'
+        else:
+            offset, estado = (i % DIAS_AGENDA) + 1, 'CONFIRMADO'
+        turnos.append(Turno(
+            agenda=agendas[(offset, zona)], establecimiento=local,
+            bloque='MANANA' if i % 2 == 0 else 'TARDE', estado=estado,
+            inspector=staff if estado == 'CONFIRMADO' else None,
+            telefono_contacto='0990000000',
+        ))
+    Turno.objects.bulk_create(turnos)
+    informes.refrescar()  # El informe mensual lee la vista materializada
+
+    # 6. NOTIFICACIONES
+    notificaciones = Notificacion.objects.bulk_create(
+        [Notificacion(usuario=ciudadano, titulo=f"Aviso {i}", mensaje="Mensaje de prueba") for i in range(3)]
+        + [Notificacion(usuario=staff, titulo="Nueva Solicitud", mensaje="Mensaje de prueba")]
+    )
+
+    # Índices según el orden de creación: turnos[2*i] histórico, turnos[2*i + 1] activo
+    return {
+        'staff': staff,
+        'ciudadano': ciudadano,
+        'otro_usuario': propietarios[0],
+        'local_ciudadano': locales[0],
+        'tipo': tipos[0],
+        'tasa': tasas[0],
+        'requisito': requisitos[0],
+        'agenda_futura': agendas[(1, PARROQUIAS_URBANAS[0])],
+        'turno_hoy': turnos[1],
+        'turno_pendiente': turnos[3],
+        'turno_confirmado': turnos[5],
+        'turno_terminado': turnos[0],
+        'notificacion': notificaciones[0],
+    }
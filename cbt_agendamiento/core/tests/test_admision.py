@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import admision, cache as cache_app
+
+
+class LimitePeticionesTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bloquea_al_superar_el_limite(self):
+        self.assertEqual([admision.consumir('prueba', 2) for _ in range(2)], [0, 0])
+        self.assertGreater(admision.consumir('prueba', 2), 0)
+        self.assertEqual(admision.consumir('otra', 2), 0)
+
+    def test_sin_limite(self):
+        self.assertEqual(admision.consumir('prueba', 0), 0)
+
+
+@override_settings(ADMISION_ESPERA_COLA=0.05)
+class ColaReservaTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_una_reserva_por_agenda(self):
+        with admision.cola_reserva(1):
+            with self.assertRaises(admision.ColaLlena):
+                with admision.cola_reserva(1):
+                    pass
+            with admision.cola_reserva(2):
+                pass
+        with admision.cola_reserva(1):
+            pass
+
+    @override_settings(ADMISION_ESPERA_COLA=0)
+    def test_sin_espera_rechaza_sin_dormir(self):
+        with admision.cola_reserva(1), mock.patch.object(admision.time, 'sleep') as dormir:
+            with self.assertRaises(admision.ColaLlena):
+                with admision.cola_reserva(1):
+                    pass
+        dormir.assert_not_called()
+
+    def test_no_libera_la_ficha_de_otra_peticion(self):
+        with admision.cola_reserva(1):
+            # La ficha propia caducó y otra petición tomó la agenda
+            cache_app.COLAS.set(('agenda', 1), 123)
+        self.assertEqual(cache_app.COLAS.get(('agenda', 1)), 123)
+
+    def test_en_redis_libera_con_un_script_atomico(self):
+        redis = RedisCache('redis://cache:6379/0', {'KEY_PREFIX': 'cbt'})
+        cliente = mock.Mock(**{'eval.return_value': 1})
+        redis._cache = mock.Mock(**{'get_client.return_value': cliente})  # Sin servidor: solo el cliente
+        self.assertTrue(cache_app._borrar_si_igual(redis, 'cola:agenda:1', 42))
+        script, n, clave, valor = cliente.eval.call_args[0]
+        self.assertIn("redis.call('get', KEYS[1]) == ARGV[1]", script)
+        self.assertEqual((n, clave, valor), (1, 'cbt:1:cola:agenda:1', 42))
+
+    def test_agenda_pedida(self):
+        pedir = lambda **datos: admision.agenda_pedida(RequestFactory().post('/', datos))
+        self.assertEqual(pedir(agenda_id='12'), 12)
+        self.assertIsNone(pedir())
+        self.assertIsNone(pedir(agenda_id='x'))
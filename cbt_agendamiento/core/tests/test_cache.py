@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from core import cache
+
+
+class EspacioTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        caches['local'].clear()
+        self.espacio = cache.Espacio('prueba', ttl=60)
+
+    def test_invalidar_cambia_las_claves(self):
+        clave = self.espacio.clave(('a', 1))
+        self.assertTrue(clave.startswith('prueba:'))
+        self.assertTrue(clave.endswith(':a:1'))
+        self.espacio.set(('a', 1), 'x')
+        self.espacio.invalidar()
+        self.assertNotEqual(self.espacio.clave(('a', 1)), clave)
+        self.assertIsNone(self.espacio.get(('a', 1)))
+
+    def test_sin_version(self):
+        self.assertEqual(cache.Espacio('fichas', versionado=False).clave(('agenda', 3)), 'fichas:agenda:3')
+
+    def test_cuenta_aciertos(self):
+        espacio = cache.Espacio('prueba_aciertos', ttl=60)
+        for _ in range(4):
+            espacio.obtener('k', lambda: 1)
+        self.assertEqual(espacio.tasa_aciertos(), 0.75)
+
+    def test_guarda_valores_nulos(self):
+        calcular = mock.Mock(return_value=None)
+        self.espacio.obtener('nulo', calcular)
+        self.espacio.obtener('nulo', calcular)
+        self.assertEqual(calcular.call_count, 1)
+
+
+class EstampidaTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.espacio = cache.Espacio('estampida', ttl=60)
+
+    def test_lecturas_simultaneas_calculan_una_vez(self):
+        llamadas = []
+        inicio = threading.Event()
+
+        def calcular():
+            llamadas.append(1)
+            inicio.wait(0.2)
+            return {'ok': True}
+
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(self.espacio.obtener('k', calcular))) for _ in range(5)]
+        for h in hilos:
+            h.start()
+        inicio.set()
+        for h in hilos:
+            h.join()
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(resultados, [{'ok': True}] * 5)
+
+    def test_lecturas_async_calculan_una_vez(self):
+        llamadas = []
+
+        async def calcular():
+            llamadas.append(1)
+            await asyncio.sleep(0.05)
+            return 42
+
+        async def sondear():
+            return await asyncio.gather(*(self.espacio.aobtener('a', calcular) for _ in range(20)))
+
+        self.assertEqual(asyncio.run(sondear()), [42] * 20)
+        self.assertEqual(len(llamadas), 1)
+
+    def test_recalculo_anticipado(self):
+        # Un cálculo lento (delta grande) que caduca ahora siempre se recalcula
+        key = self.espacio.clave('k')
+        caches['default'].set(key, ('viejo', 10.0, time.time()), 60)
+        self.assertEqual(self.espacio.obtener('k', lambda: 'nuevo'), 'nuevo')
+
+    def test_recalculo_anticipado_en_curso_sirve_el_vigente(self):
+        key = self.espacio.clave('k')
+        caches['default'].set(key, ('viejo', 10.0, time.time()), 60)
+        caches['default'].add(f"{key}:calculando", 1, 5)
+        self.assertEqual(self.espacio.obtener('k', lambda: 'nuevo'), 'viejo')
+
+
+class RespaldoLocalTests(SimpleTestCase):
+    def tearDown(self):
+        cache._respaldo_hasta = 0.0
+
+    def test_usa_la_local_si_la_compartida_falla(self):
+        espacio = cache.Espacio('respaldo', ttl=60)
+        with mock.patch.object(caches['default'], 'get_or_set', side_effect=ConnectionError), \
+                mock.patch.object(caches['default'], 'get', side_effect=ConnectionError), \
+                self.assertLogs('core.cache', 'WARNING'):
+            self.assertEqual(espacio.obtener('k', lambda: 7), 7)
+        # Durante la pausa no se vuelve a intentar la compartida
+        self.assertEqual(espacio.obtener('k', lambda: 8), 7)
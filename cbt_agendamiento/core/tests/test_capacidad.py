@@ -0,0 +1,50 @@
+from django.test import SimpleTestCase
+
+from core import capacidad
+
+
+class SobrecupoTests(SimpleTestCase):
+    def test_sin_ausencias_no_hay_sobrecupo(self):
+        self.assertEqual(capacidad.sobrecupo(6, 1.0), 0)
+        self.assertEqual(capacidad.sobrecupo(0, 0.5), 0)
+
+    def test_respeta_el_riesgo_y_el_maximo(self):
+        extra = capacidad.sobrecupo(6, 0.7, riesgo=0.10)
+        self.assertGreater(extra, 0)
+        self.assertLessEqual(capacidad.prob_exceso(6 + extra, 0.7, 6), 0.10)
+        self.assertGreater(capacidad.prob_exceso(6 + extra + 1, 0.7, 6), 0.10)
+        self.assertEqual(capacidad.sobrecupo(6, 0.1, riesgo=0.10), int(6 * capacidad.MAX_SOBRECUPO))
+
+
+class ModeloTasasTests(SimpleTestCase):
+    def setUp(self):
+        self.modelo = capacidad.ModeloTasas([
+            {'parroquia': 'CHICAL', 'dia': 1, 'tipo': 1, 'total': 100, 'ausencias': 30, 'cancelaciones': 10},
+            {'parroquia': 'CHICAL', 'dia': 1, 'tipo': 2, 'total': 2, 'ausencias': 2, 'cancelaciones': 0},
+            {'parroquia': 'TULCAN_CENTRO', 'dia': 3, 'tipo': 1, 'total': 98, 'ausencias': 2, 'cancelaciones': 8},
+        ])
+
+    def test_tasa_global(self):
+        # Ausencia sobre las reservas que conservaron el cupo; cancelación sobre el total
+        self.assertAlmostEqual(self.modelo.global_.ausencia, 34 / 182)
+        self.assertAlmostEqual(self.modelo.global_.cancelacion, 18 / 200)
+
+    def test_las_cancelaciones_no_reducen_la_asistencia(self):
+        sin_cancelar = capacidad.Tasas().suavizar(capacidad.Conteo(90, 9, 0), peso=0)
+        con_cancelaciones = capacidad.Tasas().suavizar(capacidad.Conteo(100, 9, 10), peso=0)
+        self.assertAlmostEqual(sin_cancelar.asistencia, con_cancelaciones.asistencia)
+        self.assertAlmostEqual(con_cancelaciones.asistencia, 0.9)
+
+    def test_grupo_solo_con_cancelaciones_conserva_la_previa(self):
+        previa = capacidad.Tasas(ausencia=0.2)
+        self.assertEqual(previa.suavizar(capacidad.Conteo(3, 0, 3), peso=0).ausencia, 0.2)
+
+    def test_grupos_pequenos_se_suavizan_hacia_el_nivel_superior(self):
+        previa = self.modelo.dia('CHICAL', 1)
+        tasas = self.modelo.tasas('CHICAL', 1, 2)
+        self.assertLess(tasas.ausencia, 0.5)
+        self.assertGreater(tasas.ausencia, previa.ausencia)
+
+    def test_grupos_desconocidos_usan_el_nivel_superior(self):
+        self.assertEqual(self.modelo.tasas('URBINA', 5, 9), self.modelo.global_)
+        self.assertEqual(self.modelo.tasas('CHICAL', 5), self.modelo.parroquia('CHICAL'))
@@ -0,0 +1,47 @@
+from contextlib import nullcontext
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core import eventos, transiciones
+from core.models import EventoTurno, Turno
+
+
+class RegistroTests(SimpleTestCase):
+    def test_un_evento_por_turno_con_la_misma_hora(self):
+        with mock.patch.object(EventoTurno.objects, 'bulk_create') as bulk_create:
+            eventos.registrar({1: 'PENDIENTE', 2: 'PENDIENTE'}, 'CONFIRMADO', actor=7)
+        creados = bulk_create.call_args[0][0]
+        self.assertEqual([(e.turno_id, e.desde, e.hacia, e.actor_id) for e in creados],
+                         [(1, 'PENDIENTE', 'CONFIRMADO', 7), (2, 'PENDIENTE', 'CONFIRMADO', 7)])
+        self.assertEqual(creados[0].fecha, creados[1].fecha)
+
+    def test_alta(self):
+        evento = EventoTurno.de_alta(Turno(id=3, estado='CONFIRMADO', inspector_id=5))
+        self.assertEqual((evento.turno_id, evento.desde, evento.hacia, evento.actor_id), (3, '', 'CONFIRMADO', 5))
+
+
+class TransicionRegistraOrigenTests(SimpleTestCase):
+    def test_el_update_que_aplica_indica_el_origen(self):
+        # TERMINADO admite CONFIRMADO y EJECUTADA: el primer UPDATE no aplica, el segundo sí
+        consulta = mock.Mock()
+        consulta.filter.return_value.update.side_effect = [0, 1]
+        with mock.patch.object(Turno.objects, 'filter', return_value=consulta), \
+                mock.patch.object(transiciones.transaction, 'atomic', nullcontext), \
+                mock.patch.object(transiciones, '_ejecutar_ganchos'), \
+                mock.patch.object(eventos, 'registrar') as registrar:
+            resultado = transiciones.transicionar(9, 'TERMINADO', actor=4)
+        self.assertTrue(resultado.ok)
+        self.assertEqual([c.kwargs for c in consulta.filter.call_args_list], [{'estado': 'CONFIRMADO'}, {'estado': 'EJECUTADA'}])
+        registrar.assert_called_once_with({9: 'EJECUTADA'}, 'TERMINADO', 4)
+
+
+class LatenciasSQLTests(SimpleTestCase):
+    def test_solo_la_parroquia_une_con_el_turno(self):
+        self.assertIn('JOIN core_agendadiaria', eventos._sql_latencias('parroquia'))
+        self.assertNotIn('JOIN', eventos._sql_latencias('inspector'))
+        self.assertIn('percentile_cont', eventos._sql_latencias(None))
+
+    def test_agrupacion_invalida(self):
+        with self.assertRaises(ValueError):
+            eventos.latencias('PENDIENTE', 'CONFIRMADO', agrupar='provincia')
@@ -0,0 +1,132 @@
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.test import SimpleTestCase, TestCase
+
+from core import geo
+from core.models import AgendaDiaria, Establecimiento, TipoEstablecimiento, Turno
+
+TULCAN = (0.8115, -77.7172)
+
+
+@mock.patch.object(geo, '_es_postgis', return_value=True)
+class ProximidadPostGISTests(SimpleTestCase):
+    """El SQL que llega a PostGIS: cast a geography, apto para el índice GiST."""
+
+    def test_mas_cercanos_ordena_por_knn(self, _):
+        sql = str(geo.mas_cercanos(*TULCAN, limite=5).query)
+        self.assertIn('"core_establecimiento"."ubicacion"::geography <-> ST_GeogFromText(POINT (-77.7172 0.8115))', sql)
+        self.assertIn('"core_establecimiento"."ubicacion" IS NOT NULL', sql)
+        self.assertRegex(sql, r'ORDER BY \d+ ASC LIMIT 5$')
+
+    def test_dentro_de_radio_en_metros(self, _):
+        sql = str(geo.dentro_de_radio(*TULCAN, 500).query)
+        self.assertIn(
+            'ST_DWithin("core_establecimiento"."ubicacion"::geography, ST_GeogFromText(POINT (-77.7172 0.8115)), 500)', sql,
+        )
+
+    def test_vecinos_de_una_parada_en_una_consulta(self, _):
+        vecinos = geo.dentro_de_radio(*TULCAN, 500, queryset=Establecimiento.objects.exclude(id=3))
+        sql = str(geo.mas_cercanos(*TULCAN, queryset=vecinos, limite=10).values('id', 'distancia_m').query)
+        self.assertEqual(sql.count('SELECT'), 1)
+        self.assertIn('ST_DWithin(', sql)
+        self.assertIn('<->', sql)
+        self.assertIn('NOT ("core_establecimiento"."id" = 3)', sql)
+        self.assertTrue(sql.endswith('LIMIT 10'))
+
+
+class LimitesTeselaTests(SimpleTestCase):
+    def test_tesela_raiz_cubre_el_mundo_web_mercator(self):
+        oeste, sur, este, norte = geo.limites_tesela(0, 0, 0)
+        self.assertEqual((oeste, este), (-180, 180))
+        self.assertAlmostEqual(norte, 85.0511287798, places=9)
+        self.assertAlmostEqual(sur, -85.0511287798, places=9)
+
+    def test_cuadrantes_del_zoom_uno(self):
+        oeste, sur, este, norte = geo.limites_tesela(1, 1, 1)  # Sureste
+        self.assertEqual((oeste, este), (0, 180))
+        self.assertAlmostEqual(norte, 0)
+        self.assertAlmostEqual(sur, -85.0511287798, places=9)
+
+    def test_teselas_vecinas_comparten_borde(self):
+        _, sur, este, _ = geo.limites_tesela(12, 1163, 2038)
+        oeste_derecha = geo.limites_tesela(12, 1164, 2038)[0]
+        norte_abajo = geo.limites_tesela(12, 1163, 2039)[3]
+        self.assertAlmostEqual(este, oeste_derecha)
+        self.assertAlmostEqual(sur, norte_abajo)
+        self.assertLess(abs(este - (-77.7)), 0.1)  # Tulcán cae en esta tesela
+
+
+class TeselaGeojsonTests(SimpleTestCase):
+    """Cambio de clústeres a puntos según el zoom (sin base: el queryset es un doble)."""
+
+    def setUp(self):
+        self.queryset = mock.MagicMock()
+        self.filtrado = self.queryset.filter.return_value.order_by.return_value
+
+    def test_bajo_zoom_detalle_agrupa_en_la_base(self):
+        self.filtrado.annotate.return_value.values.return_value.annotate.return_value = [
+            {'lat_media': 0.81, 'lng_media': -77.71, 'total': 7, 'confirmados': 5},
+        ]
+        datos = geo.tesela_geojson(self.queryset, geo.ZOOM_DETALLE - 1, 37238, 32639)
+        self.filtrado.values.assert_not_called()
+        [feature] = datos['features']
+        self.assertEqual(feature['geometry']['coordinates'], [-77.71, 0.81])
+        self.assertEqual(feature['properties'], {'total': 7, 'confirmados': 5})
+        celdas = self.filtrado.annotate.call_args.kwargs
+        self.assertEqual(sorted(celdas), ['celda_x', 'celda_y'])
+
+    def test_desde_zoom_detalle_puntos_individuales_con_tope(self):
+        puntos = self.filtrado.values.return_value
+        puntos.__getitem__.return_value = [
+            {'id': 3, 'estado': 'CONFIRMADO', 'nombre': 'LOCAL', 'lat': 0.81, 'lng': -77.71},
+        ]
+        datos = geo.tesela_geojson(self.queryset, geo.ZOOM_DETALLE, 74477, 65278)
+        self.filtrado.annotate.assert_not_called()
+        puntos.__getitem__.assert_called_once_with(slice(None, geo.MAX_PUNTOS_TESELA))
+        [feature] = datos['features']
+        self.assertEqual(feature['properties'], {'id': 3, 'nombre': 'LOCAL', 'estado': 'CONFIRMADO', 'total': 1})
+
+    def test_filtra_por_los_limites_de_la_tesela(self):
+        self.filtrado.annotate.return_value.values.return_value.annotate.return_value = []
+        geo.tesela_geojson(self.queryset, 12, 1163, 2038)
+        oeste, sur, este, norte = geo.limites_tesela(12, 1163, 2038)
+        self.queryset.filter.assert_called_once_with(**{
+            'establecimiento__latitud__gte': sur, 'establecimiento__latitud__lt': norte,
+            'establecimiento__longitud__gte': oeste, 'establecimiento__longitud__lt': este,
+        })
+
+
+class AgrupacionTeselaTests(TestCase):
+    """La rejilla de CELDAS_POR_TESELA² se resuelve con GROUP BY en la base."""
+    TESELA = (12, 1163, 2038)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tipo = TipoEstablecimiento.objects.create(nombre='FARMACIA')
+        cls.dueno = User.objects.create_user('0400000301', password='x')
+        cls.agenda = AgendaDiaria.objects.create(fecha=date.today(), parroquia_destino='TULCAN_CENTRO')
+        oeste, sur, este, _ = geo.limites_tesela(*cls.TESELA)
+        celda = (este - oeste) / geo.CELDAS_POR_TESELA
+        # Dos locales en la primera celda y uno en la quinta celda de la diagonal
+        for i, (dy, dx) in enumerate([(0.1, 0.1), (0.5, 0.6), (4.5, 4.5)]):
+            cls._turno(i, sur + dy * celda, oeste + dx * celda)
+
+    @classmethod
+    def _turno(cls, i, lat, lng):
+        local = Establecimiento.objects.create(
+            propietario=cls.dueno, razon_social=f'LOCAL {i} S.A.', nombre_comercial=f'LOCAL {i}', tipo=cls.tipo,
+            direccion='SUCRE', parroquia='TULCAN_CENTRO', ubicacion=Point(lng, lat, srid=4326),
+        )
+        Turno.objects.create(agenda=cls.agenda, establecimiento=local, bloque='MANANA', estado='CONFIRMADO')
+
+    def test_agrupa_por_celda(self):
+        datos = geo.tesela_geojson(Turno.objects.all(), *self.TESELA)
+        totales = sorted(f['properties']['total'] for f in datos['features'])
+        self.assertEqual(totales, [1, 2])
+
+    def test_otra_tesela_no_incluye_los_puntos(self):
+        z, x, y = self.TESELA
+        self.assertEqual(geo.tesela_geojson(Turno.objects.all(), z, x + 1, y)['features'], [])
@@ -0,0 +1,53 @@
+from datetime import date, time
+
+from django.test import SimpleTestCase
+
+from core import horarios
+
+
+class TablasHorariosTests(SimpleTestCase):
+    def test_semana_y_viernes(self):
+        lunes, viernes = date(2025, 6, 2), date(2025, 6, 6)
+        self.assertEqual(horarios.slots(lunes, 'MANANA')[0], time(9, 0))
+        self.assertEqual(horarios.slots(lunes, 'MANANA')[-1], time(12, 0))
+        self.assertEqual(horarios.slots(lunes, 'TARDE'), (time(14, 45), time(15, 15), time(15, 45), time(16, 15)))
+        self.assertEqual(horarios.slots(viernes, 'MANANA')[0], time(10, 0))
+        self.assertEqual(horarios.slots(viernes, 'TARDE'), (time(14, 45), time(15, 15)))
+
+    def test_reparto_con_y_sin_cupo(self):
+        horas = (time(9, 0), time(9, 30), time(10, 0))
+        self.assertEqual(horarios.repartir(2, horas), [time(9, 0), time(9, 30)])
+        self.assertEqual(
+            horarios.repartir(6, horas),
+            [time(9, 0), time(9, 0), time(9, 30), time(9, 30), time(10, 0), time(10, 0)],
+        )
+        self.assertEqual(horarios.repartir(2, ()), [None, None])
+
+    def test_completar_respeta_las_horas_ya_asignadas(self):
+        horas = (time(9, 0), time(9, 30), time(10, 0), time(10, 30))
+        # Ruta: 1, 2 (nuevo), 3; el slot de las 9:30 quedó libre por una cancelación
+        orden = [
+            {'id': 1, 'hora_estimada': time(9, 0)},
+            {'id': 2, 'hora_estimada': None},
+            {'id': 3, 'hora_estimada': time(10, 0)},
+        ]
+        self.assertEqual(horarios.completar(orden, horas), {2: time(9, 30)})
+
+    def test_completar_busca_el_slot_libre_mas_cercano(self):
+        horas = (time(9, 0), time(9, 30), time(10, 0))
+        orden = [
+            {'id': 1, 'hora_estimada': None},
+            {'id': 2, 'hora_estimada': time(9, 0)},
+            {'id': 3, 'hora_estimada': None},
+        ]
+        self.assertEqual(horarios.completar(orden, horas), {1: time(9, 30), 3: time(10, 0)})
+
+    def test_completar_sin_slots_libres_comparte(self):
+        horas = (time(9, 0),)
+        orden = [{'id': 1, 'hora_estimada': time(9, 0)}, {'id': 2, 'hora_estimada': None}]
+        self.assertEqual(horarios.completar(orden, horas), {2: time(9, 0)})
+        self.assertEqual(horarios.completar(orden, ()), {2: None})
+
+    def test_ventana(self):
+        self.assertEqual(horarios.ventana(time(14, 45)), "14:45 - 15:15")
+        self.assertEqual(horarios.ventana(None), '')
@@ -0,0 +1,84 @@
+import asyncio
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.db import connection
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import asincrono, cache, identidad
+from core.models import Establecimiento, PerfilUsuario, TipoEstablecimiento
+
+
+class BackendCacheadoTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        usuario = User(id=7, username='ana', is_active=True)
+        usuario.ids_establecimientos = [3, 4]
+        cache.IDENTIDAD.obtener(('usuario', 7), lambda: usuario)
+
+    def test_usuario_desde_la_cache_sin_consultas(self):
+        # SimpleTestCase falla ante cualquier consulta a la base de datos
+        usuario = identidad.BackendCacheado().get_user(7)
+        self.assertEqual(usuario.username, 'ana')
+        self.assertEqual(identidad.ids_establecimientos(usuario), [3, 4])
+
+    def test_inactivo_no_se_autentica(self):
+        inactivo = User(id=8, username='luis', is_active=False)
+        cache.IDENTIDAD.obtener(('usuario', 8), lambda: inactivo)
+        self.assertIsNone(identidad.BackendCacheado().get_user(8))
+
+    def test_guardar_invalida(self):
+        identidad.al_guardar_usuario(User, User(id=7))
+        self.assertIsNone(cache.IDENTIDAD.get(('usuario', 7)))
+
+
+class LoginAsyncTests(SimpleTestCase):
+    def test_anonimo_va_al_login(self):
+        @asincrono.login_requerido_async
+        async def vista(request):
+            return JsonResponse({'ok': True})
+
+        request = RequestFactory().get('/api/notificaciones/')
+        request.user = AnonymousUser()
+        respuesta = asyncio.run(vista(request))
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertIn('next=/api/notificaciones/', respuesta.url)
+
+        request.user = User(id=1, username='ana')
+        self.assertEqual(asyncio.run(vista(request)).status_code, 200)
+
+
+class VisitaSinConsultasDeIdentidadTests(TestCase):
+    """Con la identidad en caché, una página autenticada no consulta usuario, perfil ni locales."""
+    TABLAS = ('"auth_user"', '"core_perfilusuario"', '"core_establecimiento"')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('0400000009', password='x', first_name='ANA')
+        cls.perfil = PerfilUsuario.objects.create(user=cls.usuario, ruc='0400000009001')
+        Establecimiento.objects.create(
+            propietario=cls.usuario, razon_social='LOCAL S.A.', nombre_comercial='LOCAL',
+            tipo=TipoEstablecimiento.objects.create(nombre='FARMACIA'), direccion='SUCRE', parroquia='TULCAN_CENTRO',
+        )
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(self.usuario)
+
+    def consultas_de_identidad(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(reverse('ver_tasas_impuestos')).status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if any(t in q['sql'] for t in self.TABLAS)]
+
+    def test_solo_la_primera_visita_carga_la_identidad(self):
+        self.assertTrue(self.consultas_de_identidad())
+        self.assertEqual(self.consultas_de_identidad(), [])
+
+    def test_editar_el_perfil_la_vuelve_a_cargar(self):
+        self.consultas_de_identidad()
+        self.perfil.save()
+        self.assertTrue(self.consultas_de_identidad())
+        self.assertEqual(self.consultas_de_identidad(), [])
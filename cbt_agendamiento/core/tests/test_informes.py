@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core import informes, transiciones
+from core.models import FilaInforme
+
+
+class RefrescoTests(SimpleTestCase):
+    def setUp(self):
+        informes._pendiente = False
+        parche = mock.patch.object(informes._pool_refresco, 'submit')
+        self.submit = parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_agrupa_los_cierres_mientras_hay_uno_pendiente(self):
+        informes._encolar()
+        informes._encolar()
+        self.assertEqual(self.submit.call_count, 1)
+
+        # Al empezar el refresco, los cierres siguientes programan otro
+        with mock.patch.object(informes, 'refrescar') as refrescar, mock.patch.object(informes, 'connections'):
+            informes._refrescar_en_fondo()
+        refrescar.assert_called_once()
+        informes._encolar()
+        self.assertEqual(self.submit.call_count, 2)
+
+    def test_un_error_no_deja_el_refresco_bloqueado(self):
+        informes._encolar()
+        with mock.patch.object(informes, 'refrescar', side_effect=RuntimeError), \
+                mock.patch.object(informes, 'connections'), self.assertLogs('core.informes', 'ERROR'):
+            informes._refrescar_en_fondo()
+        self.assertFalse(informes._pendiente)
+
+    def test_los_cierres_refrescan_el_informe(self):
+        self.assertIn(transiciones._refrescar_informe, transiciones._ganchos['TERMINADO'])
+
+    def test_fuera_de_postgresql_solo_cambia_la_version(self):
+        with mock.patch.object(informes, 'connection', vendor='sqlite') as conexion, \
+                mock.patch.object(informes.cache.INFORME, 'invalidar') as invalidar:
+            informes.refrescar()
+        conexion.cursor.assert_not_called()
+        invalidar.assert_called_once()
+
+
+class FilaInformeTests(SimpleTestCase):
+    def test_inspector(self):
+        self.assertEqual(FilaInforme(inspector_nombre='Ana', inspector_apellido='Paz').inspector, 'Ana Paz')
+        self.assertIsNone(FilaInforme().inspector)
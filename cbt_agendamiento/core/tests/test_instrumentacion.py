@@ -0,0 +1,54 @@
+from django.test import SimpleTestCase
+
+from core.instrumentacion import MonitorConsultas, huella_sql
+
+
+def ejecutar(sql, params, many, context):
+    return None
+
+
+class HuellaSqlTests(SimpleTestCase):
+    def test_literales_y_numeros(self):
+        self.assertEqual(
+            huella_sql("SELECT * FROM t WHERE nombre = 'O''Brien 12' AND id = 42 AND x > 1.5"),
+            "SELECT * FROM t WHERE nombre = ? AND id = ? AND x > ?",
+        )
+
+    def test_parametros_y_espacios(self):
+        self.assertEqual(huella_sql("SELECT  *\n FROM t\tWHERE id = %s"), "SELECT * FROM t WHERE id = ?")
+
+    def test_listas_in_de_cualquier_largo_comparten_huella(self):
+        corta = huella_sql("SELECT * FROM t WHERE id IN (1, 2)")
+        self.assertEqual(corta, "SELECT * FROM t WHERE id IN (?...)")
+        self.assertEqual(huella_sql("SELECT * FROM t WHERE id IN (%s,%s, %s)"), corta)
+        self.assertEqual(huella_sql("SELECT * FROM t WHERE c IN ('a', 'b,c', 3)"), corta.replace('id', 'c'))
+
+    def test_nombres_con_digitos_no_se_tocan(self):
+        self.assertEqual(huella_sql('SELECT "t2"."col_1" FROM t2'), 'SELECT "t2"."col_1" FROM t2')
+
+
+class MonitorConsultasTests(SimpleTestCase):
+    def test_repetidas_solo_sobre_el_limite(self):
+        monitor = MonitorConsultas('prueba', umbral_ms=10_000, repeticiones_max=3)
+        for i in range(3):
+            monitor(ejecutar, f"SELECT * FROM a WHERE id = {i}", None, False, {})
+        self.assertEqual(monitor.repetidas(), [])
+
+        monitor(ejecutar, "SELECT * FROM a WHERE id = 9", None, False, {})
+        monitor(ejecutar, "SELECT * FROM b", None, False, {})
+        [(huella, veces, _)] = monitor.repetidas()
+        self.assertEqual((huella, veces), ("SELECT * FROM a WHERE id = ?", 4))
+        self.assertEqual(monitor.total, 5)
+        self.assertIn("x4", monitor.resumen())
+
+    def test_registra_las_consultas_lentas(self):
+        monitor = MonitorConsultas('vista:prueba', umbral_ms=0)
+        with self.assertLogs('core.sql', 'WARNING') as registro:
+            monitor(ejecutar, "SELECT * FROM a WHERE id = 7", None, False, {})
+        self.assertIn("SQL lenta", registro.output[0])
+        self.assertIn("vista:prueba: SELECT * FROM a WHERE id = ?", registro.output[0])
+
+    def test_rapidas_no_se_registran(self):
+        monitor = MonitorConsultas('vista:prueba', umbral_ms=10_000)
+        with self.assertNoLogs('core.sql', 'WARNING'):
+            monitor(ejecutar, "SELECT 1", None, False, {})
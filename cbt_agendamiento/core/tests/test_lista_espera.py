@@ -0,0 +1,161 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core import lista_espera, sms, transiciones
+from core.models import (
+    AgendaDiaria, ConfiguracionSistema, Establecimiento, ListaEspera, Notificacion, TipoEstablecimiento, Turno,
+)
+
+
+class ListaEsperaBase(TestCase):
+    """Agenda futura con un cupo de mañana, ya ocupado por `self.ocupante`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ConfiguracionSistema.objects.get_or_create(solo_id=1)
+        cls.tipo = TipoEstablecimiento.objects.create(nombre='FARMACIA')
+        cls.staff = User.objects.create_user('0400000001', password='x', first_name='INSPECTOR', is_staff=True)
+        cls.agenda = AgendaDiaria.objects.create(
+            fecha=date.today() + timedelta(days=3), parroquia_destino='TULCAN_CENTRO',
+            capacidad_manana=1, capacidad_tarde=0,
+        )
+        cls.locales = [cls._local(i) for i in range(3)]
+
+    @classmethod
+    def _local(cls, i):
+        dueno = User.objects.create_user(f'04000001{i:02d}', password='x', first_name=f'DUEÑO {i}')
+        return Establecimiento.objects.create(
+            propietario=dueno, razon_social=f'LOCAL {i} S.A.', nombre_comercial=f'LOCAL {i}', tipo=cls.tipo,
+            direccion='SUCRE', parroquia='TULCAN_CENTRO',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.ocupante = Turno.objects.create(
+            agenda=self.agenda, establecimiento=self.locales[0], bloque='MANANA', estado='CONFIRMADO',
+            telefono_contacto='0990000000',
+        )
+        parche = mock.patch.object(sms, 'programar_lote')
+        self.programar_sms = parche.start()
+        self.addCleanup(parche.stop)
+
+    def esperar(self, local, minutos):
+        """Entrada en la fila registrada hace `minutos` (fija el orden de llegada)."""
+        return ListaEspera.objects.create(
+            agenda=self.agenda, establecimiento=local, bloque='MANANA', telefono_contacto='0991111111',
+            fecha_registro=timezone.now() - timedelta(minutes=minutos),
+        )
+
+
+class RellenarTests(ListaEsperaBase):
+    def test_sin_cupo_libre_no_promueve(self):
+        self.esperar(self.locales[1], 5)
+        self.assertEqual(lista_espera.rellenar(self.agenda.id, 'MANANA'), [])
+        self.assertFalse(Turno.objects.filter(establecimiento=self.locales[1]).exists())
+
+    def test_cancelar_promueve_al_primero_de_la_fila(self):
+        segundo = self.esperar(self.locales[2], 5)
+        primero = self.esperar(self.locales[1], 10)
+
+        resultado = transiciones.transicionar(self.ocupante.id, 'CANCELADO', aviso=False)
+        self.assertTrue(resultado.ok)
+
+        primero.refresh_from_db()
+        segundo.refresh_from_db()
+        self.assertEqual((primero.estado, segundo.estado), ('PROMOVIDO', 'ESPERANDO'))
+        self.assertEqual(primero.turno.estado, 'PENDIENTE')
+        self.assertEqual((primero.turno.agenda_id, primero.turno.bloque), (self.agenda.id, 'MANANA'))
+        self.assertTrue(Notificacion.objects.filter(usuario=self.locales[1].propietario).exists())
+        mensajes = self.programar_sms.call_args[0][0]
+        self.assertEqual([m.turnos for m in mensajes], [[primero.turno_id]])
+
+    def test_rechazado_tambien_libera_el_cupo(self):
+        pendiente = Turno.objects.create(
+            agenda=self.agenda, establecimiento=self.locales[2], bloque='TARDE', telefono_contacto='0992222222',
+        )
+        self.agenda.capacidad_tarde = 1
+        self.agenda.save()
+        entrada = ListaEspera.objects.create(
+            agenda=self.agenda, establecimiento=self.locales[1], bloque='TARDE', telefono_contacto='0991111111',
+        )
+
+        self.assertTrue(transiciones.transicionar(pendiente.id, 'RECHAZADO', aviso=False).ok)
+        entrada.refresh_from_db()
+        self.assertEqual(entrada.estado, 'PROMOVIDO')
+
+    def test_retira_a_los_locales_que_ya_tienen_turno_activo(self):
+        otra_agenda = AgendaDiaria.objects.create(fecha=date.today() + timedelta(days=5), parroquia_destino='TULCAN_CENTRO')
+        Turno.objects.create(
+            agenda=otra_agenda, establecimiento=self.locales[1], bloque='MANANA', telefono_contacto='0991111111',
+        )
+        con_turno = self.esperar(self.locales[1], 10)
+        siguiente = self.esperar(self.locales[2], 5)
+
+        Turno.objects.filter(id=self.ocupante.id).update(estado='CANCELADO')  # Sin ganchos: relleno explícito
+        promovidos = lista_espera.rellenar_para([self.ocupante.id])
+
+        con_turno.refresh_from_db()
+        siguiente.refresh_from_db()
+        self.assertEqual(con_turno.estado, 'RETIRADO')
+        self.assertEqual(siguiente.estado, 'PROMOVIDO')
+        self.assertEqual([t.establecimiento_id for t in promovidos], [self.locales[2].id])
+
+    def test_agendas_de_hoy_no_se_rellenan(self):
+        self.agenda.fecha = date.today()
+        self.agenda.save()
+        self.esperar(self.locales[1], 5)
+        Turno.objects.filter(id=self.ocupante.id).update(estado='CANCELADO')
+        self.assertEqual(lista_espera.rellenar_para([self.ocupante.id]), [])
+
+    def test_posiciones(self):
+        self.esperar(self.locales[1], 10)
+        self.esperar(self.locales[2], 5)
+        self.assertEqual(lista_espera.posiciones(self.locales[2]), {(self.agenda.id, 'MANANA'): 2})
+        self.assertEqual(lista_espera.posiciones(self.locales[0]), {})
+
+
+class ReservaConListaEsperaTests(ListaEsperaBase):
+    def reservar(self, local, **datos):
+        self.client.force_login(local.propietario)
+        return self.client.post(f"{reverse('agendar_turno')}?local_id={local.id}", {
+            'agenda_id': self.agenda.id, 'bloque': 'MANANA', 'telefono': '0991111111', **datos,
+        })
+
+    def test_jornada_llena_inscribe_en_la_fila_una_sola_vez(self):
+        self.reservar(self.locales[1], lista_espera='1')
+        self.reservar(self.locales[1], lista_espera='1')
+        self.assertEqual(ListaEspera.objects.filter(establecimiento=self.locales[1], estado='ESPERANDO').count(), 1)
+        self.assertFalse(Turno.objects.filter(establecimiento=self.locales[1]).exists())
+
+    def test_jornada_llena_sin_pedir_fila_no_inscribe(self):
+        self.reservar(self.locales[1])
+        self.assertFalse(ListaEspera.objects.filter(establecimiento=self.locales[1]).exists())
+
+    def test_reservar_retira_al_local_de_sus_filas(self):
+        entrada = self.esperar(self.locales[1], 5)
+        self.agenda.capacidad_manana = 2
+        self.agenda.save()
+
+        self.reservar(self.locales[1])
+        entrada.refresh_from_db()
+        self.assertEqual(entrada.estado, 'RETIRADO')
+        self.assertTrue(Turno.objects.filter(establecimiento=self.locales[1], estado='PENDIENTE').exists())
+
+    def test_reserva_en_ventanilla_retira_al_local_de_sus_filas(self):
+        entrada = self.esperar(self.locales[1], 5)
+        self.agenda.capacidad_manana = 2
+        self.agenda.save()
+
+        self.client.force_login(self.staff)
+        self.client.post(reverse('agendar_presencial_detalle', kwargs={'local_id': self.locales[1].id}), {
+            'agenda_id': self.agenda.id, 'bloque': 'MANANA', 'telefono': '0991111111',
+        })
+        entrada.refresh_from_db()
+        self.assertEqual(entrada.estado, 'RETIRADO')
+        self.assertTrue(Turno.objects.filter(establecimiento=self.locales[1], estado='CONFIRMADO').exists())
@@ -0,0 +1,93 @@
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, modify_settings, override_settings
+from django.urls import reverse
+
+from core import metricas
+
+
+class HistogramaTests(SimpleTestCase):
+    def test_buckets_acumulativos(self):
+        h = metricas.Histograma()
+        for valor in (0.001, 0.005, 0.02, 0.3, 20):
+            h.observar(valor)
+        buckets = dict(zip(metricas.BUCKETS, h.buckets))
+        self.assertEqual((buckets[0.005], buckets[0.01], buckets[0.025], buckets[0.25], buckets[0.5]), (2, 2, 3, 3, 4))
+        self.assertEqual(buckets[10.0], 4)  # 20 s solo cuenta en +Inf (el total)
+        self.assertEqual(h.total, 5)
+        self.assertAlmostEqual(h.suma, 20.326)
+
+    def test_percentiles_por_rango_mas_cercano(self):
+        h = metricas.Histograma()
+        for valor in range(100, 0, -1):
+            h.observar(valor)
+        self.assertEqual([h.percentil(q) for q in (0.5, 0.95, 0.99, 1.0)], [50, 95, 99, 100])
+        self.assertEqual(h.percentil(0.001), 1)
+
+    def test_percentil_con_pocas_muestras(self):
+        h = metricas.Histograma()
+        self.assertEqual(h.percentil(0.5), 0.0)
+        h.observar(0.2)
+        self.assertEqual(h.percentil(0.99), 0.2)
+
+    def test_ventana_de_muestras_recientes(self):
+        h = metricas.Histograma()
+        for valor in range(metricas.VENTANA_MUESTRAS + 10):
+            h.observar(valor)
+        self.assertEqual(h.percentil(0.001), 10)
+        self.assertEqual(h.total, metricas.VENTANA_MUESTRAS + 10)
+
+
+class ExportarTests(SimpleTestCase):
+    def setUp(self):
+        self.registro = metricas.RegistroMetricas()
+        for duracion, estado in ((0.02, 200), (0.7, 200), (3.0, 500)):
+            self.registro.registrar('hoja_ruta', {
+                'estado': estado, 'duracion': duracion, 'sql_duracion': 0.004, 'sql_consultas': 3,
+                'plantillas': 0.01, 'cache_hit': 1, 'cache_miss': 0,
+            })
+        self.lineas = self.registro.exportar().splitlines()
+
+    def test_contadores(self):
+        self.assertIn('cbt_http_requests_total{vista="hoja_ruta",estado="200"} 2', self.lineas)
+        self.assertIn('cbt_http_requests_total{vista="hoja_ruta",estado="500"} 1', self.lineas)
+        self.assertIn('cbt_sql_queries_total{vista="hoja_ruta"} 9', self.lineas)
+        self.assertIn('cbt_cache_requests_total{vista="hoja_ruta",resultado="hit"} 3', self.lineas)
+
+    def test_histograma_acumulativo_con_inf_igual_al_total(self):
+        nombre = 'cbt_http_request_duration_seconds'
+        buckets = [
+            int(linea.rsplit(' ', 1)[1]) for linea in self.lineas if linea.startswith(f'{nombre}_bucket{{vista="hoja_ruta"')
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(len(buckets), len(metricas.BUCKETS) + 1)
+        self.assertIn(f'{nombre}_bucket{{vista="hoja_ruta",le="0.025"}} 1', self.lineas)
+        self.assertIn(f'{nombre}_bucket{{vista="hoja_ruta",le="1.0"}} 2', self.lineas)
+        self.assertIn(f'{nombre}_bucket{{vista="hoja_ruta",le="+Inf"}} 3', self.lineas)
+        self.assertIn(f'{nombre}_count{{vista="hoja_ruta"}} 3', self.lineas)
+        self.assertIn(f'{nombre}_sum{{vista="hoja_ruta"}} 3.720000', self.lineas)
+
+    def test_cada_metrica_declara_help_y_type(self):
+        nombres = {linea.split()[2] for linea in self.lineas if linea.startswith('# TYPE')}
+        ayudas = {linea.split()[2] for linea in self.lineas if linea.startswith('# HELP')}
+        self.assertEqual(nombres, ayudas)
+        self.assertIn('# TYPE cbt_http_request_duration_seconds histogram', self.lineas)
+        self.assertIn('cbt_http_request_recent_seconds{vista="hoja_ruta",quantile="0.5"} 0.700000', self.lineas)
+
+
+@override_settings(PERFILAMIENTO_MUESTREO=0)
+@modify_settings(MIDDLEWARE={'prepend': 'core.middleware.PerfilamientoMiddleware'})
+class PerfilamientoMiddlewareTests(TestCase):
+    def setUp(self):
+        metricas.registro.reset()
+        self.addCleanup(metricas.registro.reset)
+        self.client.force_login(User.objects.create_user('0400000003', password='x'))
+
+    def test_registra_estado_y_consultas_por_nombre_de_url(self):
+        self.assertEqual(self.client.get(reverse('ver_tasas_impuestos')).status_code, 200)
+        self.assertEqual(metricas.registro.peticiones[('ver_tasas_impuestos', 200)], 1)
+        self.assertGreater(metricas.registro.consultas['ver_tasas_impuestos'], 0)
+        self.assertEqual(metricas.registro.duracion['ver_tasas_impuestos'].total, 1)
+
+    def test_sin_ruta(self):
+        self.assertEqual(self.client.get('/no-existe/').status_code, 404)
+        self.assertEqual(metricas.registro.peticiones[('sin_ruta', 404)], 1)
@@ -0,0 +1,46 @@
+from datetime import datetime, timezone as tz
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core import notificaciones
+from core.models import Notificacion
+
+
+class PurgaTests(SimpleTestCase):
+    def purgar(self, filas_por_lote, lote):
+        cursor = mock.MagicMock()
+        type(cursor).rowcount = mock.PropertyMock(side_effect=filas_por_lote)
+        with mock.patch.object(notificaciones, 'connection') as conexion, \
+                mock.patch.object(notificaciones.transaction, 'atomic'):
+            conexion.cursor.return_value.__enter__.return_value = cursor
+            total = notificaciones.purgar(lote=lote, ahora=datetime(2025, 6, 1, tzinfo=tz.utc))
+        return total, cursor
+
+    def test_borra_por_lotes_hasta_uno_incompleto(self):
+        total, cursor = self.purgar([100, 100, 37], lote=100)
+        self.assertEqual(total, 237)
+        self.assertEqual(cursor.execute.call_count, 3)
+        sql, parametros = cursor.execute.call_args[0]
+        self.assertIn('WHERE id IN (SELECT id FROM core_notificacion', sql)
+        self.assertIn('LIMIT %s', sql)
+        self.assertEqual(parametros[-1], 100)
+
+    def test_sin_nada_que_borrar(self):
+        total, cursor = self.purgar([0], lote=100)
+        self.assertEqual((total, cursor.execute.call_count), (0, 1))
+
+
+class CreacionTests(SimpleTestCase):
+    def test_el_tope_se_aplica_tras_el_commit(self):
+        avisos = [Notificacion(usuario_id=1), Notificacion(usuario_id=2), Notificacion(usuario_id=1)]
+        with mock.patch.object(Notificacion.objects, 'bulk_create', side_effect=lambda objs: objs), \
+                mock.patch.object(notificaciones.transaction, 'on_commit') as on_commit, \
+                mock.patch.object(notificaciones, 'colapsar') as colapsar:
+            notificaciones.crear_en_bloque(avisos)
+            colapsar.assert_not_called()
+            on_commit.call_args[0][0]()
+        colapsar.assert_called_once_with({1, 2})
+
+    def test_colapsar_sin_usuarios_no_consulta(self):
+        self.assertEqual(notificaciones.colapsar(set()), 0)
@@ -0,0 +1,154 @@
+from datetime import date
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from core import particiones
+from core.models import (
+    AgendaDiaria, Establecimiento, Notificacion, TipoEstablecimiento, Turno, _completar_fecha_agenda,
+)
+
+
+class CursorFalso:
+    """Registra el SQL y responde con filas preparadas, en orden."""
+
+    def __init__(self, *respuestas):
+        self.respuestas = list(respuestas)
+        self.sql = []
+
+    def execute(self, sql, params=None):
+        self.sql.append(sql)
+
+    def fetchone(self):
+        return self.respuestas.pop(0)
+
+    def fetchall(self):
+        return self.respuestas.pop(0)
+
+
+class MesesTests(SimpleTestCase):
+    def test_sumar_meses(self):
+        self.assertEqual(particiones.sumar_meses(date(2025, 11, 17), 0), date(2025, 11, 1))
+        self.assertEqual(particiones.sumar_meses(date(2025, 11, 17), 2), date(2026, 1, 1))
+        self.assertEqual(particiones.sumar_meses(date(2025, 1, 31), -1), date(2024, 12, 1))
+
+    def test_nombre_particion(self):
+        self.assertEqual(particiones.nombre_particion('core_turno', date(2025, 3, 1)), 'core_turno_p2025_03')
+
+
+class ParticionesTests(SimpleTestCase):
+    def test_lee_limites_y_omite_default(self):
+        cursor = CursorFalso([
+            ('core_notificacion_p2025_02', "FOR VALUES FROM ('2025-02-01 00:00:00+00') TO ('2025-03-01 00:00:00+00')"),
+            ('core_notificacion_default', 'DEFAULT'),
+            ('core_notificacion_p2025_01', "FOR VALUES FROM ('2025-01-01 00:00:00+00') TO ('2025-02-01 00:00:00+00')"),
+        ])
+        self.assertEqual(particiones.particiones(cursor, 'core_notificacion'), [
+            ('core_notificacion_p2025_01', date(2025, 1, 1), date(2025, 2, 1)),
+            ('core_notificacion_p2025_02', date(2025, 2, 1), date(2025, 3, 1)),
+        ])
+
+    def test_asegurar_futuras_no_repite_las_existentes(self):
+        # Existe la del mes actual; faltan las dos siguientes (DEFAULT sin filas de esos meses)
+        cursor = CursorFalso(('core_turno_p2025_11',), (None,), (False,), (None,), (False,))
+        creadas = particiones.asegurar_futuras(cursor, 'core_turno', date(2025, 11, 17), meses=2)
+        self.assertEqual(creadas, ['core_turno_p2025_12', 'core_turno_p2026_01'])
+        self.assertEqual(sum('PARTITION OF' in sql for sql in cursor.sql), 2)
+        self.assertFalse(any('DETACH' in sql for sql in cursor.sql))
+
+    def test_traslada_las_filas_del_mes_que_estaban_en_default(self):
+        cursor = CursorFalso((None,), (True,))
+        self.assertEqual(particiones.crear_particion(cursor, 'core_turno', date(2026, 5, 1)), 'core_turno_p2026_05')
+        ordenes = [sql.split(' (')[0] for sql in cursor.sql[2:]]
+        self.assertEqual(ordenes, [
+            'ALTER TABLE "core_turno" DETACH PARTITION "core_turno_default"',
+            'CREATE TABLE "core_turno_p2026_05" PARTITION OF "core_turno" FOR VALUES FROM',
+            'WITH movidas AS',
+            'ALTER TABLE "core_turno" ATTACH PARTITION "core_turno_default" DEFAULT',
+        ])
+
+    def test_archivar_hasta_el_limite(self):
+        cursor = CursorFalso([
+            ('core_turno_p2025_01', "FOR VALUES FROM ('2025-01-01') TO ('2025-02-01')"),
+            ('core_turno_p2025_02', "FOR VALUES FROM ('2025-02-01') TO ('2025-03-01')"),
+            ('core_turno_p2025_03', "FOR VALUES FROM ('2025-03-01') TO ('2025-04-01')"),
+        ])
+        archivadas = particiones.archivar(cursor, 'core_turno', date(2025, 3, 1))
+        self.assertEqual(archivadas, ['core_turno_p2025_01', 'core_turno_p2025_02'])
+        self.assertIn('ALTER TABLE "core_turno" DETACH PARTITION "core_turno_p2025_02"', cursor.sql)
+        self.assertFalse(any('core_turno_p2025_03' in sql for sql in cursor.sql))
+
+    def test_particionar_es_idempotente(self):
+        cursor = CursorFalso((1,))
+        particiones.particionar(cursor, 'core_turno', 'fecha_agenda')
+        self.assertEqual(len(cursor.sql), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', "El particionado solo existe en PostgreSQL")
+class ParticionadoPostgreSQLTests(TestCase):
+    """Sobre las tablas que dejó la migración 0008 (core_turno y core_notificacion ya particionadas)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('0400000009', first_name='DUEÑO')
+        cls.local = Establecimiento.objects.create(
+            propietario=cls.usuario, razon_social='LOCAL S.A.', nombre_comercial='LOCAL',
+            tipo=TipoEstablecimiento.objects.create(nombre='FARMACIA'),
+            direccion='SUCRE Y BOLÍVAR', parroquia='TULCAN_CENTRO',
+        )
+
+    def _turno(self, fecha):
+        agenda = AgendaDiaria.objects.create(fecha=fecha, parroquia_destino='TULCAN_CENTRO')
+        return Turno.objects.create(agenda=agenda, establecimiento=self.local, bloque='MANANA', telefono_contacto='0990000009')
+
+    def _particion_de(self, tabla, id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM "{tabla}" WHERE id = %s', [id])
+            return cursor.fetchone()[0]
+
+    def test_las_tablas_quedan_particionadas(self):
+        with connection.cursor() as cursor:
+            for tabla in particiones.TABLAS:
+                self.assertTrue(particiones.es_particionada(cursor, tabla))
+                meses = [desde for _, desde, _ in particiones.particiones(cursor, tabla)]
+                self.assertIn(particiones.sumar_meses(date.today(), particiones.MESES_ADELANTE), meses)
+
+    def test_el_orm_escribe_y_lee_en_la_particion_del_mes(self):
+        hoy = date.today()
+        primero, segundo = self._turno(hoy), self._turno(hoy)
+        self.assertGreater(segundo.id, primero.id)  # La secuencia recreada sigue numerando
+
+        turno = Turno.objects.select_related('agenda', 'establecimiento').get(id=primero.id)
+        self.assertEqual((turno.fecha_agenda, turno.establecimiento.nombre_comercial), (hoy, 'LOCAL'))
+        self.assertEqual(self._particion_de('core_turno', turno.id), particiones.nombre_particion('core_turno', hoy))
+
+        turno.estado = 'CONFIRMADO'
+        turno.save()
+        self.assertEqual(Turno.objects.get(id=turno.id).estado, 'CONFIRMADO')
+        self.assertEqual(Turno.objects.filter(fecha_agenda__gte=hoy).count(), 2)
+
+        aviso = Notificacion.objects.create(usuario=self.usuario, titulo='Turno', mensaje='Confirmado')
+        self.assertEqual(list(Notificacion.objects.vigentes().filter(usuario=self.usuario)), [aviso])
+        self.assertEqual(
+            self._particion_de('core_notificacion', aviso.id), particiones.nombre_particion('core_notificacion', hoy)
+        )
+
+    def test_la_particion_nueva_recoge_las_filas_de_default(self):
+        lejano = particiones.sumar_meses(date.today(), particiones.MESES_ADELANTE + 2)
+        turno = self._turno(lejano)
+        self.assertEqual(self._particion_de('core_turno', turno.id), 'core_turno_default')
+
+        with connection.cursor() as cursor:
+            nombre = particiones.crear_particion(cursor, 'core_turno', lejano)
+        self.assertEqual(self._particion_de('core_turno', turno.id), nombre)
+        self.assertEqual(Turno.objects.get(id=turno.id).fecha_agenda, lejano)
+
+
+class FechaAgendaTests(SimpleTestCase):
+    def test_copia_la_fecha_de_la_agenda_cargada(self):
+        agenda = AgendaDiaria(id=1, fecha=date(2025, 6, 2))
+        turnos = [Turno(agenda=agenda), Turno(agenda=agenda, fecha_agenda=date(2025, 6, 3))]
+        _completar_fecha_agenda(turnos)  # SimpleTestCase: fallaría si consultara la base
+        self.assertEqual([t.fecha_agenda for t in turnos], [date(2025, 6, 2), date(2025, 6, 3)])
@@ -0,0 +1,100 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import cache, pdf, views
+
+PARAMETROS = {'fecha': '2025-06-02', 'zona': 'SUR', 'bloque': 'MANANA'}
+
+
+class ClaveTests(SimpleTestCase):
+    def test_no_depende_del_orden_de_los_parametros(self):
+        invertidos = dict(reversed(PARAMETROS.items()))
+        self.assertEqual(pdf.clave('hoja_ruta', PARAMETROS, 1), pdf.clave('hoja_ruta', invertidos, 1))
+
+    def test_cambia_con_la_version_de_los_datos(self):
+        self.assertNotEqual(pdf.clave('hoja_ruta', PARAMETROS, 1), pdf.clave('hoja_ruta', PARAMETROS, 2))
+        self.assertTrue(pdf.clave('informe', PARAMETROS, 1).startswith('informe-'))
+
+
+class SolicitarTests(SimpleTestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(PDF_DIRECTORIO=directorio.name, PDF_PROCESOS=2)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        # Versión propia por prueba: las marcas de una no afectan a la siguiente
+        version = mock.patch.object(cache.MAPA, 'version', return_value=id(self))
+        version.start()
+        self.addCleanup(version.stop)
+        self.ejecutor = mock.Mock()
+        parche = mock.patch.object(pdf, '_ejecutor', return_value=self.ejecutor)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_un_archivo_generado_se_sirve_sin_encolar(self):
+        trabajo = pdf.solicitar('hoja_ruta', PARAMETROS)
+        open(trabajo.ruta, 'wb').close()
+        self.ejecutor.submit.reset_mock()
+
+        trabajo = pdf.solicitar('hoja_ruta', PARAMETROS)
+        self.assertTrue(trabajo.listo)
+        self.ejecutor.submit.assert_not_called()
+
+    def test_peticiones_identicas_generan_una_vez(self):
+        primero = pdf.solicitar('hoja_ruta', PARAMETROS)
+        segundo = pdf.solicitar('hoja_ruta', PARAMETROS)
+        self.assertEqual((primero.estado, segundo.estado), ('EN_CURSO', 'EN_CURSO'))
+        self.ejecutor.submit.assert_called_once_with(pdf.generar, 'hoja_ruta', PARAMETROS, primero.ruta)
+
+    def test_un_fallo_se_informa_y_no_se_reintenta_enseguida(self):
+        trabajo = pdf.solicitar('hoja_ruta', PARAMETROS)
+        futuro = mock.Mock(**{'exception.return_value': RuntimeError('pango')})
+        with self.assertLogs('core.pdf', 'ERROR'):
+            pdf._terminado(trabajo.clave, futuro)
+
+        self.assertEqual(pdf.solicitar('hoja_ruta', PARAMETROS).estado, 'ERROR')
+        self.assertEqual(self.ejecutor.submit.call_count, 1)
+
+    def test_al_terminar_se_libera_la_marca(self):
+        trabajo = pdf.solicitar('hoja_ruta', PARAMETROS)
+        pdf._terminado(trabajo.clave, mock.Mock(**{'exception.return_value': None}))
+        self.assertIsNone(cache.PDF.get(trabajo.clave))
+
+    def test_sin_procesos_se_genera_en_la_peticion(self):
+        with override_settings(PDF_PROCESOS=0), mock.patch.object(pdf, 'generar') as generar:
+            trabajo = pdf.solicitar('hoja_ruta', PARAMETROS)
+        self.assertTrue(trabajo.listo)
+        generar.assert_called_once_with('hoja_ruta', PARAMETROS, trabajo.ruta)
+        self.ejecutor.submit.assert_not_called()
+        self.assertIsNone(cache.PDF.get(trabajo.clave))
+
+
+class ParametrosHojaRutaTests(SimpleTestCase):
+    def parametros(self, **query):
+        return views.parametros_hoja_ruta(RequestFactory().get('/hoja-ruta/', {'fecha': '2025-06-02', **query}))
+
+    def test_zona_y_bloque_desconocidos_comparten_la_clave_por_defecto(self):
+        self.assertEqual(self.parametros(zona='FOO', bloque='NOCHE'), PARAMETROS)
+        self.assertEqual(self.parametros(), PARAMETROS)
+
+    def test_respeta_los_valores_validos(self):
+        self.assertEqual(
+            self.parametros(zona='NORTE', bloque='TARDE'),
+            {'fecha': '2025-06-02', 'zona': 'NORTE', 'bloque': 'TARDE'},
+        )
+
+
+class PodaTests(SimpleTestCase):
+    def test_borra_solo_los_pdf_viejos(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            viejo, nuevo = os.path.join(directorio, 'viejo.pdf'), os.path.join(directorio, 'nuevo.pdf')
+            for ruta in (viejo, nuevo):
+                open(ruta, 'wb').close()
+            os.utime(viejo, (0, 0))
+            pdf._podar(directorio, os.path.getmtime(nuevo))
+            self.assertEqual(sorted(os.listdir(directorio)), ['nuevo.pdf'])
@@ -0,0 +1,234 @@
+"""
+Arnés de presupuestos de rendimiento por vista.
+
+Cada URL con nombre de `core.urls` se visita como INSPECTOR (staff) y como
+CIUDADANO sobre un dataset determinista a varias escalas. Por cada visita se
+mide el número de consultas SQL, el tiempo total en SQL y el tiempo de pared,
+y se compara con los presupuestos versionados en `presupuestos.json`.
+
+Ejecución (requiere PostGIS o SpatiaLite):
+    python manage.py test core.tests.test_rendimiento
+    DATABASE_URL=spatialite:////tmp/cbt.sqlite3 python manage.py test core.tests
+
+Para regenerar el archivo tras una optimización intencional:
+    PRESUPUESTOS_ACTUALIZAR=1 python manage.py test core.tests.test_rendimiento
+
+PRESUPUESTO_TOLERANCIA multiplica los límites de tiempo (máquinas lentas / CI).
+"""
+import json
+import math
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import identidad, urls as core_urls
+from .datos import ESCALAS, sembrar
+
+ARCHIVO_PRESUPUESTOS = Path(__file__).with_name('presupuestos.json')
+ACTUALIZAR = os.environ.get('PRESUPUESTOS_ACTUALIZAR') == '1'
+TOLERANCIA_TIEMPO = float(os.environ.get('PRESUPUESTO_TOLERANCIA', '1.0'))
+ROLES = ('staff', 'ciudadano')
+
+# ==============================================================================
+#                        CASOS POR URL (Uno por nombre de ruta)
+# ==============================================================================
+# kwargs/query/data reciben el diccionario devuelto por `sembrar()`.
+# metodo='post' se usa en las vistas que solo actúan ante un POST.
+# ajustes: settings a sobrescribir durante la visita.
+
+CASOS = {
+    # --- PANEL DE COMANDO ---
+    'dashboard_staff': {},
+    'gestionar_turno': {'kwargs': lambda d: {'turno_id': d['turno_pendiente'].id, 'accion': 'confirmar'}},
+    'finalizar_turno': {
+        'kwargs': lambda d: {'turno_id': d['turno_hoy'].id},
+        'metodo': 'post', 'data': lambda d: {'numero_formulario': 'F-99999'},
+    },
+    'cancelar_turno': {'kwargs': lambda d: {'turno_id': d['turno_pendiente'].id}},
+    'hoja_ruta': {'query': lambda d: {'bloque': 'MANANA', 'zona': 'SUR'}},
+    'api_locales_cercanos': {'kwargs': lambda d: {'turno_id': d['turno_hoy'].id}},
+    # PDF generado dentro de la petición: mide el peor caso (primera descarga)
+    'descargar_pdf': {
+        'kwargs': lambda d: {'documento': 'hoja_ruta'}, 'query': lambda d: {'bloque': 'MANANA', 'zona': 'SUR'},
+        'ajustes': {'PDF_PROCESOS': 0, 'PDF_DIRECTORIO': os.path.join(tempfile.gettempdir(), 'cbt-pdf-pruebas')},
+    },
+    'api_mapa_turnos': {'kwargs': lambda d: {'z': 12, 'x': 1163, 'y': 2038}},
+
+    # --- HERRAMIENTAS OPERATIVAS ---
+    'alta_contribuyente': {},
+    'habilitar_agenda': {},
+    'editar_agenda': {'kwargs': lambda d: {'agenda_id': d['agenda_futura'].id}},
+    'buscar_local_presencial': {'query': lambda d: {'q': 'LOCAL'}},
+    'agendar_presencial_detalle': {'kwargs': lambda d: {'local_id': d['local_ciudadano'].id}},
+
+    # --- BASE DE DATOS Y CONFIGURACIÓN ---
+    'directorio_establecimientos': {},
+    'detalle_establecimiento': {'kwargs': lambda d: {'local_id': d['local_ciudadano'].id}},
+    'generar_informe_mensual': {'query': lambda d: {'tipo_reporte': 'anual'}},
+    'exportar_excel_mensual': {'query': lambda d: {'mes': 0}},
+    'gestion_tipos': {},
+    'editar_tipo': {'kwargs': lambda d: {'tipo_id': d['tipo'].id}},
+    'eliminar_tipo': {'kwargs': lambda d: {'tipo_id': d['tipo'].id}},
+    'gestion_usuarios': {},
+    'crear_inspector': {},
+    'detalle_usuario': {'kwargs': lambda d: {'user_id': d['otro_usuario'].id}},
+    'editar_usuario': {'kwargs': lambda d: {'user_id': d['otro_usuario'].id}},
+    'eliminar_usuario': {'kwargs': lambda d: {'user_id': d['otro_usuario'].id}},
+    'cambiar_rol': {'kwargs': lambda d: {'user_id': d['otro_usuario'].id}},
+    'gestion_documentacion': {},
+    'eliminar_documento': {'kwargs': lambda d: {'tipo': 'tasa', 'id_obj': d['tasa'].id}},
+
+    # --- API INTERNA ---
+    'api_buscar_propietario': {'query': lambda d: {'cedula': d['ciudadano'].username}},
+    'api_mis_notificaciones': {},
+    'api_marcar_leida': {'kwargs': lambda d: {'notificacion_id': d['notificacion'].id}},
+    'api_marcar_todas_leidas': {'metodo': 'post'},
+    'api_estadisticas': {},
+
+    # --- MÓDULOS STAFF ---
+    'solicitudes_pendientes': {},
+    'triaje_solicitudes': {
+        'metodo': 'post', 'data': lambda d: {'ids': [d['turno_pendiente'].id], 'accion': 'confirmar'},
+    },
+    'gestion_inspecciones': {},
+    'cancelar_inspeccion_staff': {
+        'metodo': 'post', 'data': lambda d: {'turno_id': d['turno_confirmado'].id, 'motivo': 'PRUEBA'},
+    },
+    'cierre_inspecciones': {},
+    'estadisticas_globales': {},
+    'metricas_prometheus': {},
+    'reportar_ausencia': {'kwargs': lambda d: {'turno_id': d['turno_hoy'].id}, 'metodo': 'post'},
+    'marcar_ejecutada': {'kwargs': lambda d: {'turno_id': d['turno_hoy'].id}, 'metodo': 'post'},
+
+    # --- PORTAL CIUDADANO ---
+    'home_ciudadano': {},
+    'registrar_email': {},
+    'verificar_ubicacion': {'kwargs': lambda d: {'local_id': d['local_ciudadano'].id}},
+    'detalle_local_ciudadano': {'kwargs': lambda d: {'local_id': d['local_ciudadano'].id}},
+    'agendar_turno': {'query': lambda d: {'local_id': d['local_ciudadano'].id}},
+    'mi_perfil': {},
+    'ver_tasas_impuestos': {},
+    'ver_guia_requisitos': {},
+}
+
+
+def cargar_presupuestos():
+    with open(ARCHIVO_PRESUPUESTOS, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def guardar_presupuestos(presupuestos):
+    with open(ARCHIVO_PRESUPUESTOS, 'w', encoding='utf-8') as f:
+        json.dump(presupuestos, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+
+
+class CoberturaRutasTests(SimpleTestCase):
+    """Toda ruta nueva debe declarar su caso y su presupuesto."""
+
+    def test_todas_las_rutas_tienen_caso(self):
+        nombres = {p.name for p in core_urls.urlpatterns if p.name}
+        self.assertEqual(sorted(nombres - set(CASOS)), [], "Rutas sin caso en CASOS")
+        self.assertEqual(sorted(set(CASOS) - nombres), [], "Casos de rutas que ya no existen")
+
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        presupuestos = cargar_presupuestos()
+        faltantes = [
+            f"{nombre}/{rol}" for nombre in CASOS for rol in ROLES
+            if rol not in presupuestos.get(nombre, {})
+        ]
+        self.assertEqual(faltantes, [], "Rutas sin presupuesto en presupuestos.json")
+
+
+class PresupuestoRendimientoMixin:
+    """Mide todas las rutas a la escala `escala` y compara contra presupuesto."""
+    escala = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.datos = sembrar(cls.escala)
+
+    def medir(self, nombre, caso, rol):
+        d = self.datos
+        url = reverse(nombre, kwargs=caso['kwargs'](d) if 'kwargs' in caso else None)
+        query = caso['query'](d) if 'query' in caso else {}
+        data = caso['data'](d) if 'data' in caso else {}
+
+        usuario = d['staff'] if rol == 'staff' else d['ciudadano']
+        self.client.force_login(usuario)
+        cache.clear()
+        # Identidad ya en caché, como en toda visita que no es la primera:
+        # test_identidad comprueba que así no cuesta consultas
+        identidad.BackendCacheado().get_user(usuario.pk)
+
+        # Cada visita corre en un savepoint que se revierte: las vistas que
+        # eliminan o cambian estados no contaminan la medición siguiente.
+        with transaction.atomic(), override_settings(**caso.get('ajustes', {})):
+            with CaptureQueriesContext(connection) as ctx:
+                inicio = time.perf_counter()
+                if caso.get('metodo') == 'post':
+                    response = self.client.post(url, data)
+                else:
+                    response = self.client.get(url, query)
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+                total_ms = (time.perf_counter() - inicio) * 1000
+            transaction.set_rollback(True)
+
+        self.assertLess(response.status_code, 500, f"{nombre}/{rol} respondió {response.status_code}")
+        return {
+            'consultas': len(ctx.captured_queries),
+            'sql_ms': sum(float(q['time']) for q in ctx.captured_queries) * 1000,
+            'total_ms': total_ms,
+        }
+
+    def test_presupuestos(self):
+        presupuestos = cargar_presupuestos()
+        fallos = []
+
+        for nombre, caso in CASOS.items():
+            for rol in ROLES:
+                medicion = self.medir(nombre, caso, rol)
+                presupuesto = presupuestos.setdefault(nombre, {}).setdefault(rol, {})
+
+                if ACTUALIZAR:
+                    presupuesto.setdefault('consultas', {})[self.escala] = medicion['consultas']
+                    # Tiempos con holgura: la máquina que regenera no es la de CI
+                    for clave in ('sql_ms', 'total_ms'):
+                        nuevo = int(math.ceil(max(medicion[clave] * 3, 50)))
+                        presupuesto[clave] = max(presupuesto.get(clave, 0), nuevo)
+                    continue
+
+                limite = presupuesto.get('consultas', {}).get(self.escala)
+                if limite is None:
+                    fallos.append(f"{nombre}/{rol}@{self.escala}: sin presupuesto de consultas")
+                elif medicion['consultas'] > limite:
+                    fallos.append(
+                        f"{nombre}/{rol}@{self.escala}: {medicion['consultas']} consultas (presupuesto {limite})"
+                    )
+                for clave in ('sql_ms', 'total_ms'):
+                    limite_ms = presupuesto.get(clave)
+                    if limite_ms is not None and medicion[clave] > limite_ms * TOLERANCIA_TIEMPO:
+                        fallos.append(
+                            f"{nombre}/{rol}@{self.escala}: {clave}={medicion[clave]:.1f} (presupuesto {limite_ms})"
+                        )
+
+        if ACTUALIZAR:
+            guardar_presupuestos(presupuestos)
+            return
+
+        self.assertFalse(fallos, "Regresiones de rendimiento:\n" + "\n".join(fallos))
+
+
+# Una clase por escala para que el runner las reporte por separado
+for _escala in ESCALAS:
+    _nombre = f"Presupuesto{_escala.capitalize()}Tests"
+    globals()[_nombre] = type(_nombre, (PresupuestoRendimientoMixin, TestCase), {'escala': _escala})
+del _escala, _nombre
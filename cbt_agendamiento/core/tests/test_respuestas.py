@@ -0,0 +1,87 @@
+import gzip
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import respuestas
+
+
+class RespuestaJsonTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_serializa_como_django(self):
+        datos = json.loads(respuestas.dumps({'monto': Decimal('12.50'), 1: 'ñ'}))
+        self.assertEqual(datos, {'monto': '12.50', '1': 'ñ'})
+        with mock.patch.object(respuestas, 'orjson', None):
+            self.assertEqual(json.loads(respuestas.dumps({'monto': Decimal('12.50'), 1: 'ñ'})), datos)
+
+    def test_html_no_cierra_el_script(self):
+        self.assertNotIn('<', respuestas.dumps_html({'x': '</script>'}))
+
+    def test_304_si_no_cambio(self):
+        primera = respuestas.respuesta_json(self.factory.get('/api/'), {'count': 0})
+        self.assertTrue(primera['ETag'].startswith('W/"'))
+        self.assertIn('no-cache', primera['Cache-Control'])
+
+        repetida = respuestas.respuesta_json(self.factory.get('/api/', HTTP_IF_NONE_MATCH=primera['ETag']), {'count': 0})
+        self.assertEqual(repetida.status_code, 304)
+        self.assertEqual(repetida.content, b'')
+
+        cambiada = respuestas.respuesta_json(self.factory.get('/api/', HTTP_IF_NONE_MATCH=primera['ETag']), {'count': 1})
+        self.assertEqual(cambiada.status_code, 200)
+
+    def test_errores_sin_etag(self):
+        response = respuestas.respuesta_json(self.factory.get('/api/'), {'error': 'x'}, status=400)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_comprime_sobre_el_umbral(self):
+        datos = {'items': ['x' * 50] * 100}
+        request = self.factory.get('/api/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        response = respuestas.respuesta_json(request, datos)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), datos)
+
+        pequena = respuestas.respuesta_json(request, {'ok': True})
+        self.assertFalse(pequena.has_header('Content-Encoding'))
+
+        sin_gzip = self.factory.get('/api/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(respuestas.respuesta_json(sin_gzip, datos).has_header('Content-Encoding'))
+        for cabecera in ('gzip;q=0.5', 'gzip; q=0.8, br;q=0.1', 'GZIP;Q=1.0'):
+            con_calidad = self.factory.get('/api/', HTTP_ACCEPT_ENCODING=cabecera)
+            self.assertIn(respuestas.respuesta_json(con_calidad, datos)['Content-Encoding'], ('gzip', 'br'), cabecera)
+        for cabecera in ('gzip;q=0.0, br;q=0', 'identity', 'gzip;q=x'):
+            sin_compresion = self.factory.get('/api/', HTTP_ACCEPT_ENCODING=cabecera)
+            self.assertFalse(respuestas.respuesta_json(sin_compresion, datos).has_header('Content-Encoding'), cabecera)
+
+
+class FilasFalsas(list):
+    db = 'default'
+
+    def using(self, alias):
+        return self
+
+    def iterator(self, chunk_size):
+        return iter(self)
+
+
+@override_settings(TEMPLATES=[{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {'loaders': [('django.template.loaders.locmem.Loader', {
+        'pagina.html': '<h1>{{ titulo }}</h1><table>{{ marca_filas }}</table><p>{{ total }}</p>',
+        'fila.html': '<tr><td>{{ n }}</td><td>{{ fila }}</td></tr>',
+    })]},
+}])
+class RespuestaPorPartesTests(SimpleTestCase):
+    def test_cabecera_filas_por_lotes_y_pie(self):
+        request = RequestFactory().get('/informe/')
+        response = respuestas.respuesta_html_por_partes(
+            request, 'pagina.html', {'titulo': 'Año', 'total': 3}, FilasFalsas(['a', '<b>', 'c']), 'fila.html', lote=2,
+        )
+        partes = list(response.streaming_content)
+        self.assertEqual(partes[0], b'<h1>A\xc3\xb1o</h1><table>')
+        self.assertEqual(partes[1], b'<tr><td>1</td><td>a</td></tr><tr><td>2</td><td>&lt;b&gt;</td></tr>')
+        self.assertEqual(partes[2], b'<tr><td>3</td><td>c</td></tr></table><p>3</p>')
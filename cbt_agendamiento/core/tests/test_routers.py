@@ -0,0 +1,37 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from core.models import Turno
+from core.routers import RouterReplica, leer_de_replica
+
+
+@mock.patch.dict(settings.DATABASES, {'replica': {}})
+class RouterReplicaTests(SimpleTestCase):
+    def setUp(self):
+        self.router = RouterReplica()
+
+    def test_lecturas_al_primario_por_defecto(self):
+        self.assertIsNone(self.router.db_for_read(Turno))
+
+    def test_lecturas_analiticas_a_la_replica(self):
+        with leer_de_replica():
+            self.assertEqual(self.router.db_for_read(Turno), 'replica')
+            self.assertEqual(self.router.db_for_write(Turno), 'default')
+        self.assertIsNone(self.router.db_for_read(Turno))
+
+    def test_como_decorador(self):
+        @leer_de_replica()
+        def informe():
+            return self.router.db_for_read(Turno)
+        self.assertEqual(informe(), 'replica')
+
+    def test_sin_replica_configurada(self):
+        del settings.DATABASES['replica']
+        with leer_de_replica():
+            self.assertIsNone(self.router.db_for_read(Turno))
+
+    def test_no_migra_la_replica(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
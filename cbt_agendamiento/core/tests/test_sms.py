@@ -0,0 +1,98 @@
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import sms
+from core.models import AgendaDiaria, Establecimiento, RegistroEnvio, TipoEstablecimiento, Turno
+
+
+class NormalizacionTelefonoTests(SimpleTestCase):
+    def test_formatos_validos(self):
+        for entrada in ('0991234567', '991234567', '+593991234567', '593 99 123 4567', '00593-99-123-4567'):
+            with self.subTest(entrada=entrada):
+                self.assertEqual(sms.normalizar_telefono(entrada), '+593991234567')
+        self.assertEqual(sms.normalizar_telefono('062980123'), '+59362980123')
+
+    def test_formatos_invalidos(self):
+        for entrada in ('', None, '12345', '0891234567', '+1 555 123 4567'):
+            with self.subTest(entrada=entrada):
+                self.assertIsNone(sms.normalizar_telefono(entrada))
+
+
+@override_settings(SMS_BACKEND='core.sms.MemoriaBackend', SMS_POR_SEGUNDO=0)
+class EnvioLoteTests(SimpleTestCase):
+    def setUp(self):
+        sms.bandeja.clear()
+        sms._limitador.cache_clear()
+
+    def test_agrupa_numeros_equivalentes_y_marca_invalidos(self):
+        mensajes = [
+            sms.MensajeSMS('0991234567', 'Hola', [1]),
+            sms.MensajeSMS('+593991234567', 'Hola', [2]),
+            sms.MensajeSMS('12345', 'Hola', [3]),
+        ]
+        sms.enviar_lote(mensajes, hilos=2)
+
+        self.assertEqual(sms.bandeja, [{'numero': '+593991234567', 'mensaje': 'Hola'}])
+        self.assertEqual([m.error for m in mensajes[:2]], ['', ''])
+        self.assertIn('inválido', mensajes[2].error)
+
+        registros = sms.registros_sms(mensajes, 'PRUEBA')
+        self.assertEqual([(r.turno_id, r.estado) for r in registros], [(1, 'ENVIADO'), (2, 'ENVIADO'), (3, 'FALLIDO')])
+
+    def test_error_del_backend_queda_en_el_mensaje(self):
+        class BackendCaido(sms.BaseSMSBackend):
+            def enviar(self, numero, mensaje):
+                raise ConnectionError("pasarela caída")
+
+        mensajes = [sms.MensajeSMS('0991234567', 'Hola', [1])]
+        with self.assertLogs('core.sms', 'WARNING'):
+            sms.enviar_lote(mensajes, backend=BackendCaido())
+        self.assertEqual(mensajes[0].error, "pasarela caída")
+
+
+class RecordatoriosTests(TestCase):
+    """enviar_recordatorios registra cada lote al terminarlo: una caída no provoca reenvíos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tipo = TipoEstablecimiento.objects.create(nombre='FARMACIA')
+        agenda = AgendaDiaria.objects.create(fecha=date.today(), parroquia_destino='TULCAN_CENTRO')
+        for i in range(2):
+            dueno = User.objects.create_user(f'04000002{i:02d}', password='x', email=f'dueno{i}@cbt.test')
+            local = Establecimiento.objects.create(
+                propietario=dueno, razon_social=f'LOCAL {i} S.A.', nombre_comercial=f'LOCAL {i}', tipo=tipo,
+                direccion='SUCRE', parroquia='TULCAN_CENTRO',
+            )
+            Turno.objects.create(agenda=agenda, establecimiento=local, bloque='MANANA', estado='CONFIRMADO')
+
+    def enviar(self, **opciones):
+        call_command('enviar_recordatorios', stdout=StringIO(), **opciones)
+
+    def test_una_caida_conserva_lo_ya_registrado(self):
+        registrar = sms.registrar_envios
+        llamadas = []
+
+        def registrar_y_caer(registros, lote=500):
+            llamadas.append(len(registros))
+            if len(llamadas) > 1:
+                raise RuntimeError('caída del proceso')
+            registrar(registros, lote=lote)
+
+        with mock.patch.object(sms, 'registrar_envios', side_effect=registrar_y_caer), \
+                self.assertRaises(RuntimeError):
+            self.enviar(lote=1, hilos=1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(RegistroEnvio.objects.filter(canal='EMAIL', estado='ENVIADO').count(), 1)
+
+        # La re-ejecución solo envía el recordatorio que no llegó a registrarse
+        self.enviar()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(
+            sorted(RegistroEnvio.objects.values_list('destinatario', flat=True)), ['dueno0@cbt.test', 'dueno1@cbt.test'],
+        )
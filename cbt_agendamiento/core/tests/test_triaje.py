@@ -0,0 +1,35 @@
+import json
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+
+from core import views
+
+
+class ValidacionTriajeTests(SimpleTestCase):
+    """Cuerpos mal formados se rechazan con 400 antes de tocar la base."""
+
+    def enviar(self, cuerpo, content_type='application/json'):
+        request = RequestFactory().post('/triaje/', cuerpo, content_type=content_type)
+        request.user = mock.Mock(is_authenticated=True, is_staff=True)
+        with mock.patch.object(views.transiciones, 'transicionar_lote') as lote:
+            response = views.triaje_solicitudes(request)
+        lote.assert_not_called()
+        return response.status_code, json.loads(response.content)['error']
+
+    def test_json_que_no_es_un_objeto(self):
+        for cuerpo in ('[]', '"x"', '12', 'null'):
+            with self.subTest(cuerpo=cuerpo):
+                self.assertEqual(self.enviar(cuerpo), (400, 'Se esperaba un objeto JSON'))
+
+    def test_ids_que_no_son_una_lista_de_enteros(self):
+        for ids in ('12', 12, None, {'1': 1}, ['1'], [1.5], [True]):
+            with self.subTest(ids=ids):
+                cuerpo = json.dumps({'ids': ids, 'accion': 'confirmar'})
+                self.assertEqual(self.enviar(cuerpo), (400, 'Ids inválidos'))
+
+    def test_formulario_con_ids_no_numericos(self):
+        cuerpo = 'accion=confirmar&ids=1&ids=x'
+        self.assertEqual(
+            self.enviar(cuerpo, 'application/x-www-form-urlencoded'), (400, 'Ids inválidos'),
+        )
@@ -0,0 +1,277 @@
+"""
+Motor de transiciones de estado de Turno.
+
+Cada cambio es un compare-and-set: `UPDATE ... WHERE id IN (...) AND estado IN
+(orígenes permitidos)`. Si dos inspectores (o un doble clic) intentan la misma
+transición, solo una escritura afecta la fila; la otra recibe un resultado
+`repetida` sin tocar el estado.
+
+Los efectos secundarios (notificaciones, caché del mapa, contadores) se
+registran como ganchos con `@al_entrar(...)` y reciben todos los ids que
+cambiaron de una sola vez. Cada cambio deja además un EventoTurno (origen,
+destino, `actor=` y hora; ver core.eventos) en la misma transacción.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from . import cache, eventos, informes
+from .models import Notificacion, Turno
+
+# Transiciones permitidas: origen -> destinos
+TRANSICIONES = {
+    'PENDIENTE': ('CONFIRMADO', 'RECHAZADO', 'CANCELADO'),
+    'CONFIRMADO': ('EJECUTADA', 'TERMINADO', 'NO_REALIZADA', 'CANCELADO'),
+    'EJECUTADA': ('TERMINADO',),
+}
+ORIGENES = defaultdict(tuple)
+for _origen, _destinos in TRANSICIONES.items():
+    for _destino in _destinos:
+        ORIGENES[_destino] += (_origen,)
+
+# Aviso al ciudadano por defecto al entrar en cada estado ({local}, {fecha}, {jornada}, {hora} y {formulario} disponibles)
+AVISOS = {
+    'CONFIRMADO': ("¡Turno Aprobado! ✅", "Su inspección para {local} ha sido confirmada. Hora estimada: {hora}.", 'SUCCESS'),
+    'RECHAZADO': ("Solicitud Rechazada ⚠️", "No pudimos procesar su turno para {local}.", 'WARNING'),
+    'EJECUTADA': ("Visita Realizada 🚒", "El inspector ha registrado la visita. Procesando informe final.", 'INFO'),
+    'TERMINADO': ("Trámite Finalizado ✅", "Proceso completado exitosamente. Formulario N° {formulario}.", 'SUCCESS'),
+    'NO_REALIZADA': ("Visita Fallida 🏠", "Nuestro inspector visitó su local pero no fue atendido.", 'WARNING'),
+    'CANCELADO': ("Turno Cancelado", "Su turno para {local} ha sido cancelado.", 'WARNING'),
+}
+
+# SMS por defecto (solo si la transición se pide con sms=True)
+SMS = {
+    'CONFIRMADO': "CBT: Su inspeccion en {local} fue CONFIRMADA para el {fecha:%d/%m/%Y}, hora estimada {hora}.",
+    'RECHAZADO': "CBT: Su solicitud de inspeccion para {local} no pudo ser procesada. Ingrese al portal para elegir otra fecha.",
+    'CANCELADO': "CBT: Su turno para {local} ha sido CANCELADO.",
+}
+JORNADAS = dict(Turno.BLOQUES)
+
+
+class TransicionInvalida(ValueError):
+    pass
+
+
+def literal(texto):
+    """Escapa llaves de un texto libre (p. ej. un motivo) antes de incluirlo en un aviso."""
+    return (texto or '').replace('{', '{{').replace('}', '}}')
+
+
+@dataclass
+class Resultado:
+    id: int
+    ok: bool
+    estado: str = None   # Estado actual tras la operación (None si el turno no existe)
+    motivo: str = ''     # '', 'no_existe', 'repetida', 'estado', 'condicion' o 'bloqueado'
+
+    @property
+    def repetida(self):
+        return self.motivo == 'repetida'
+
+
+# ==============================================================================
+#                                   GANCHOS
+# ==============================================================================
+
+_ganchos = defaultdict(list)
+
+
+def al_entrar(*estados):
+    """
+    Registra `funcion(ids, destino, contexto)` para los estados indicados (todos
+    si no se indica ninguno). Se ejecuta dentro de la transacción del cambio.
+    """
+    def registrar(funcion):
+        for estado in estados or (None,):
+            _ganchos[estado].append(funcion)
+        return funcion
+    return registrar
+
+
+@al_entrar()
+def _invalidar_caches(ids, destino, contexto):
+    # .update() no emite post_save: el mapa y los KPIs se invalidan aquí
+    for espacio in (cache.MAPA, cache.DISPONIBILIDAD, cache.ESTADISTICAS):
+        transaction.on_commit(espacio.invalidar)
+
+
+@al_entrar('CONFIRMADO', 'CANCELADO')
+def _asignar_horarios(ids, destino, contexto):
+    # Solo se tocan las agendas/jornadas afectadas; un cancelado libera su slot y
+    # las horas ya comunicadas a los demás no cambian
+    from . import horarios
+    if destino == 'CANCELADO':
+        Turno.objects.filter(id__in=ids, hora_estimada__isnull=False).update(hora_estimada=None)
+    horarios.asignar_para(ids)
+
+
+@al_entrar('TERMINADO')
+def _refrescar_informe(ids, destino, contexto):
+    # El informe de inspecciones es una vista materializada: se pone al día tras el commit
+    informes.programar_refresco()
+
+
+@al_entrar(*Turno.ESTADOS_SIN_CUPO)
+def _rellenar_cupos(ids, destino, contexto):
+    # El cupo liberado pasa al siguiente de la lista de espera en la misma transacción
+    from . import lista_espera
+    lista_espera.rellenar_para(ids)
+
+
+def _datos_aviso(ids):
+    return Turno.objects.filter(id__in=ids).values(
+        'id', 'telefono_contacto', 'numero_formulario', 'bloque', 'hora_estimada',
+        propietario_id=F('establecimiento__propietario_id'),
+        local=F('establecimiento__nombre_comercial'),
+        fecha=F('fecha_agenda'),
+    )
+
+
+def _formatear(plantilla, fila):
+    from .horarios import ventana
+    jornada = JORNADAS.get(fila['bloque'], fila['bloque'])
+    return plantilla.format(
+        local=fila['local'], fecha=fila['fecha'], formulario=fila['numero_formulario'],
+        jornada=jornada, hora=ventana(fila['hora_estimada']) or jornada,
+    )
+
+
+@al_entrar(*AVISOS)
+def _notificar(ids, destino, contexto):
+    """
+    Una consulta para todo el lote: Notificacion con bulk_create (aviso=False la
+    desactiva) y, si se pide con sms=True o sms=plantilla, un lote de SMS tras el commit.
+    """
+    aviso = contexto.get('aviso')
+    plantilla_sms = contexto.get('sms')
+    if plantilla_sms is True:
+        plantilla_sms = SMS.get(destino)
+    if aviso is False and not plantilla_sms:
+        return
+
+    filas = list(_datos_aviso(ids))
+    if aviso is not False:
+        titulo, mensaje, tipo = aviso or AVISOS[destino]
+        Notificacion.objects.bulk_create([
+            Notificacion(
+                usuario_id=f['propietario_id'], titulo=titulo, tipo=tipo, link="/portal/",
+                mensaje=_formatear(mensaje, f),
+            ) for f in filas
+        ])
+    if plantilla_sms:
+        from . import sms
+        sms.programar_lote(
+            [sms.MensajeSMS(f['telefono_contacto'], _formatear(plantilla_sms, f), [f['id']]) for f in filas],
+            motivo=destino,
+        )
+
+
+# ==============================================================================
+#                                 TRANSICIONES
+# ==============================================================================
+
+def _origenes(destino, desde):
+    permitidos = ORIGENES.get(destino)
+    if not permitidos:
+        raise TransicionInvalida(f"No hay transiciones hacia {destino}")
+    if desde is None:
+        return permitidos
+    desde = (desde,) if isinstance(desde, str) else tuple(desde)
+    invalidos = set(desde) - set(permitidos)
+    if invalidos:
+        raise TransicionInvalida(f"Transición no permitida: {', '.join(sorted(invalidos))} -> {destino}")
+    return desde
+
+
+def _clasificar(ids, destino, origenes):
+    """Lee el estado actual de los ids que no cambiaron (solo en el camino de fallo)."""
+    actuales = dict(Turno.objects.filter(id__in=ids).values_list('id', 'estado'))
+    resultados = []
+    for turno_id in ids:
+        estado = actuales.get(turno_id)
+        if estado is None:
+            motivo = 'no_existe'
+        elif estado == destino:
+            motivo = 'repetida'
+        elif estado in origenes:
+            motivo = 'condicion'
+        else:
+            motivo = 'estado'
+        resultados.append(Resultado(turno_id, False, estado, motivo))
+    return resultados
+
+
+def _ejecutar_ganchos(ids, destino, contexto):
+    for gancho in _ganchos[None] + _ganchos[destino]:
+        gancho(ids, destino, contexto)
+
+
+def transicionar(turno_id, destino, desde=None, condicion=None, campos=None, **contexto):
+    """
+    Transición de un turno con una sola escritura condicional.
+
+    `condicion` (Q) añade requisitos al WHERE (p. ej. la fecha de la agenda),
+    `campos` se escriben en el mismo UPDATE y `contexto` llega a los ganchos
+    (p. ej. aviso=(titulo, mensaje, tipo) o aviso=False; actor=usuario para el historial).
+    """
+    origenes = _origenes(destino, desde)
+    qs = Turno.objects.filter(id=turno_id)
+    if condicion is not None:
+        qs = qs.filter(condicion)
+
+    with transaction.atomic():
+        # Un UPDATE condicional por origen posible (casi siempre uno): el que
+        # aplica indica desde qué estado se llegó, sin leer la fila antes
+        for origen in origenes:
+            if qs.filter(estado=origen).update(estado=destino, **(campos or {})):
+                eventos.registrar({turno_id: origen}, destino, contexto.get('actor'))
+                _ejecutar_ganchos([turno_id], destino, contexto)
+                return Resultado(turno_id, True, destino)
+    return _clasificar([turno_id], destino, origenes)[0]
+
+
+def transicionar_lote(ids, destino, desde=None, condicion=None, campos=None, saltar_bloqueados=False, **contexto):
+    """
+    Transición masiva. Bloquea las filas elegibles (con SKIP LOCKED si se pide,
+    para no esperar a otro inspector), las actualiza en un UPDATE y devuelve un
+    Resultado por id en el orden recibido.
+    """
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    if not ids:
+        return []
+    origenes = _origenes(destino, desde)
+    qs = Turno.objects.filter(id__in=ids, estado__in=origenes)
+    if condicion is not None:
+        qs = qs.filter(condicion)
+
+    with transaction.atomic():
+        bloqueo = {'skip_locked': True} if saltar_bloqueados and connection.features.has_select_for_update_skip_locked else {}
+        previos = dict(qs.select_for_update(of=('self',), **bloqueo).values_list('id', 'estado'))
+        elegibles = list(previos)
+        if elegibles:
+            Turno.objects.filter(id__in=elegibles).update(estado=destino, **(campos or {}))
+            eventos.registrar(previos, destino, contexto.get('actor'))
+            _ejecutar_ganchos(elegibles, destino, contexto)
+
+    cambiados = set(elegibles)
+    fallidos = {r.id: r for r in _clasificar([i for i in ids if i not in cambiados], destino, origenes)}
+    if saltar_bloqueados:
+        # Los que seguían elegibles pero estaban bloqueados por otra transacción
+        for r in fallidos.values():
+            if r.motivo == 'condicion' and condicion is None:
+                r.motivo = 'bloqueado'
+    return [Resultado(i, True, destino) if i in cambiados else fallidos[i] for i in ids]
+
+
+def transicionar_consulta(queryset, destino, lote=1000, **opciones):
+    """
+    Aplica `transicionar_lote` a todos los turnos de `queryset` en bloques de
+    `lote` ids (una transacción por bloque). Devuelve cuántos cambiaron.
+    """
+    ids = list(queryset.order_by().values_list('id', flat=True))
+    cambiados = 0
+    for inicio in range(0, len(ids), lote):
+        cambiados += sum(r.ok for r in transicionar_lote(ids[inicio:inicio + lote], destino, **opciones))
+    return cambiados
@@ -18,6 +18,9 @@ urlpatterns = [
 
     # Inteligencia Geoespacial
     path('panel-operativo/hoja-ruta/', views.hoja_ruta, name='hoja_ruta'),
+    path('panel-operativo/hoja-ruta/cercanos/<int:turno_id>/', views.api_locales_cercanos, name='api_locales_cercanos'),
+    path('panel-operativo/pdf/<str:documento>/', views.descargar_pdf, name='descargar_pdf'),
+    path('panel-operativo/mapa/<int:z>/<int:x>/<int:y>/', views.api_mapa_turnos, name='api_mapa_turnos'),
 
     # ==========================================================================
     #                            HERRAMIENTAS OPERATIVAS
@@ -69,13 +72,16 @@ urlpatterns = [
     path('api/buscar-propietario/', views.api_buscar_propietario, name='api_buscar_propietario'),
     path('api/notificaciones/', views.api_mis_notificaciones, name='api_mis_notificaciones'),
     path('api/notificaciones/leer/<int:notificacion_id>/', views.api_marcar_leida, name='api_marcar_leida'),
+    path('api/notificaciones/leer-todas/', views.api_marcar_todas_leidas, name='api_marcar_todas_leidas'),
 
     # NUEVAS RUTAS MODULARES (STAFF)
     path('panel-operativo/solicitudes/', views.solicitudes_pendientes, name='solicitudes_pendientes'),
+    path('panel-operativo/solicitudes/triaje/', views.triaje_solicitudes, name='triaje_solicitudes'),
     path('panel-operativo/inspecciones/', views.gestion_inspecciones, name='gestion_inspecciones'),
     path('panel-operativo/inspecciones/cancelar/', views.cancelar_inspeccion_staff, name='cancelar_inspeccion_staff'),
     path('panel-operativo/cierre/', views.cierre_inspecciones, name='cierre_inspecciones'),
     path('panel-operativo/estadisticas/', views.estadisticas_globales, name='estadisticas_globales'),
+    path('panel-operativo/metricas/', views.metricas_prometheus, name='metricas_prometheus'),
 
     # ==========================================================================
     #                                PORTAL CIUDADANO
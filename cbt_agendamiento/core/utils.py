@@ -1,6 +1,7 @@
-from datetime import time, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 
@@ -8,43 +9,14 @@ from django.utils.html import strip_tags
 def generar_slots_horarios(fecha_obj):
     """
     Genera los bloques de horarios disponibles para una fecha dada.
-    Útil si en el futuro se requiere agendamiento por hora específica.
+    Las tablas (Viernes vs Semana) se precalculan en core.horarios.
     """
-    dia_semana = fecha_obj.weekday() # 0=Lunes, 6=Domingo
-    slots = []
-
-    # Horarios diferenciados (Viernes vs Semana)
-    if dia_semana == 4: # VIERNES
-        inicio_manana = time(10, 0); fin_manana = time(12, 30)
-        inicio_tarde = time(14, 45); fin_tarde = time(15, 30)
-    else: # LUNES A JUEVES
-        inicio_manana = time(9, 0); fin_manana = time(12, 30)
-        inicio_tarde = time(14, 45); fin_tarde = time(16, 30)
-
-    def crear_bloque(inicio, fin):
-        actual = datetime.combine(fecha_obj, inicio)
-        limite = datetime.combine(fecha_obj, fin)
-        bloque = []
-        while actual < limite:
-            bloque.append(actual.time())
-            actual += timedelta(minutes=30)
-        return bloque
-
-    slots.extend(crear_bloque(inicio_manana, fin_manana))
-    slots.extend(crear_bloque(inicio_tarde, fin_tarde))
-    return slots
+    from .horarios import slots
+    return list(slots(fecha_obj, 'MANANA') + slots(fecha_obj, 'TARDE'))
 
 # --- ENVIAR CORREO HTML (INSTITUCIONAL) ---
-def enviar_correo_html(destinatario, asunto, template_data):
-    """
-    Construye y envía un correo electrónico con diseño HTML.
-    Dependiendo de settings.EMAIL_BACKEND:
-    - Desarrollo: Imprime en consola.
-    - Producción: Envía vía AWS SES.
-    """
-    if not destinatario:
-        return False
-
+def construir_correo_html(destinatario, asunto, template_data):
+    """Arma el EmailMultiAlternatives institucional (sin enviarlo)."""
     # Plantilla HTML embebida para asegurar portabilidad
     html_content = f"""
     <!DOCTYPE html>
@@ -100,16 +72,27 @@ def enviar_correo_html(destinatario, asunto, template_data):
     </html>
     """
 
+    msg = EmailMultiAlternatives(
+        subject=f"[CBT] {asunto}",
+        body=strip_tags(html_content), # Versión texto plano automática
+        from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'sistema@cbt.gob.ec'),
+        to=[destinatario]
+    )
+    msg.attach_alternative(html_content, "text/html")
+    return msg
+
+def enviar_correo_html(destinatario, asunto, template_data):
+    """
+    Construye y envía un correo electrónico con diseño HTML.
+    Dependiendo de settings.EMAIL_BACKEND:
+    - Desarrollo: Imprime en consola.
+    - Producción: Envía vía AWS SES.
+    """
+    if not destinatario:
+        return False
+
     try:
-        # Construir el mensaje
-        msg = EmailMultiAlternatives(
-            subject=f"[CBT] {asunto}",
-            body=strip_tags(html_content), # Versión texto plano automática
-            from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'sistema@cbt.gob.ec'),
-            to=[destinatario]
-        )
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        construir_correo_html(destinatario, asunto, template_data).send()
         
         # Feedback en consola para depuración
         print(f"✅ [EMAIL] Enviado correctamente a {destinatario}")
@@ -117,4 +100,25 @@ def enviar_correo_html(destinatario, asunto, template_data):
     
     except Exception as e:
         print(f"❌ [EMAIL ERROR] No se pudo enviar a {destinatario}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+# --- ENVÍO DE CORREOS EN LOTE (SEGUNDO PLANO) ---
+_pool_correo = ThreadPoolExecutor(max_workers=1, thread_name_prefix='correo')
+
+def _enviar_lote_correos(mensajes):
+    try:
+        # Una sola conexión (SMTP/SES) para todo el lote
+        enviados = get_connection(fail_silently=True).send_messages(mensajes) or 0
+        print(f"✅ [EMAIL] Lote enviado: {enviados}/{len(mensajes)}")
+    except Exception as e:
+        print(f"❌ [EMAIL ERROR] Lote de {len(mensajes)} correos: {e}")
+
+def encolar_correos_html(correos):
+    """
+    Programa un lote de correos [(destinatario, asunto, template_data), ...]
+    para después del commit y lo envía en segundo plano con una sola conexión.
+    """
+    mensajes = [construir_correo_html(d, a, datos) for d, a, datos in correos if d]
+    if mensajes:
+        transaction.on_commit(lambda: _pool_correo.submit(_enviar_lote_correos, mensajes))
+    return len(mensajes)
\ No newline at end of file
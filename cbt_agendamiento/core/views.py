@@ -5,10 +5,10 @@ from django.contrib.auth.models import User
 from django.contrib.gis.geos import Point
 from datetime import date, datetime, timedelta
 from django.db import IntegrityError, transaction
-from django.db.models import Count, Q, ProtectedError
-from django.http import JsonResponse, HttpResponse
+from django.db.models import Count, F, Q, ProtectedError
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import reverse
 import json
-from django.core.serializers.json import DjangoJSONEncoder
 from django.core.paginator import Paginator
 
 # Imports Excel
@@ -16,7 +16,12 @@ import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 
-from .utils import enviar_correo_html
+from .routers import leer_de_replica
+from .utils import enviar_correo_html, encolar_correos_html
+from . import (
+    admision, asincrono, cache, capacidad, geo, identidad, lista_espera, metricas, notificaciones, pdf,
+    respuestas, transiciones,
+)
 from .forms import (
     AltaContribuyenteForm, TipoEstablecimientoForm, EdicionAgendaForm, 
     EditarUsuarioForm, NuevoInspectorForm, ConfiguracionGlobalForm, 
@@ -25,16 +30,34 @@ from .forms import (
 from .models import (
     Turno, Establecimiento, AgendaDiaria, TipoEstablecimiento, 
     OPCIONES_PARROQUIA, ConfiguracionSistema, PerfilUsuario, Notificacion, TasaPago,
-    RequisitoLegal
+    RequisitoLegal, FilaInforme
 )
 
 def es_staff(user): return user.is_staff
 def es_superuser(user): return user.is_superuser
 
+def avisar_transicion_fallida(request, resultado, condicion="La operación no es posible en esta fecha."):
+    """Mensaje para el usuario cuando el compare-and-set de transiciones no aplicó."""
+    if resultado.motivo == 'no_existe':
+        messages.error(request, "El turno no existe.")
+    elif resultado.repetida:
+        messages.info(request, "El turno ya estaba actualizado.")
+    elif resultado.motivo == 'condicion':
+        messages.error(request, condicion)
+    else:
+        messages.warning(request, "Este turno ya fue procesado por otro inspector.")
+
 # ==============================================================================
 #                            PANEL DE CONTROL (STAFF)
 # ==============================================================================
 
+def turnos_en_mapa():
+    """Turnos que se ven en el mapa y en la agenda lista: confirmados vigentes y en trámite."""
+    return Turno.objects.filter(
+        Q(estado='CONFIRMADO', fecha_agenda__gte=date.today()) |
+        Q(estado='EJECUTADA')
+    )
+
 # 1. DASHBOARD PRINCIPAL (Solo Resumen)
 @login_required
 @user_passes_test(es_staff)
@@ -50,17 +73,14 @@ def dashboard_staff(request):
     # 2. LISTA DE PENDIENTES
     pendientes_list = Turno.objects.filter(estado='PENDIENTE')\
         .select_related('establecimiento__propietario', 'agenda')\
-        .order_by('agenda__fecha', 'bloque', 'id')
+        .order_by('fecha_agenda', 'bloque', 'id')
 
     paginator = Paginator(pendientes_list, 6) 
     page_number = request.GET.get('page')
     pendientes_page = paginator.get_page(page_number)
 
     # 3. PRÓXIMOS (Agenda Lista - Incluye Confirmados Futuros/Hoy y Ejecutados)
-    lista_cierre = Turno.objects.filter(
-        Q(estado='CONFIRMADO', agenda__fecha__gte=date.today()) | 
-        Q(estado='EJECUTADA')
-    ).select_related('establecimiento__propietario', 'agenda').order_by('agenda__fecha')
+    lista_cierre = turnos_en_mapa().select_related('establecimiento__propietario', 'agenda').order_by('fecha_agenda')
 
     # 4. DATOS PARA VISUALIZACIÓN (JSON)
     agendas_futuras = AgendaDiaria.objects.filter(fecha__gte=date.today())
@@ -79,25 +99,14 @@ def dashboard_staff(request):
             'url': f"/panel-operativo/agenda/editar/{ag.id}/"
         })
         
-    puntos_mapa = []
-    for turno in lista_cierre:
-        if turno.establecimiento.ubicacion:
-            puntos_mapa.append({
-                'lat': turno.establecimiento.ubicacion.y,
-                'lng': turno.establecimiento.ubicacion.x,
-                'nombre': turno.establecimiento.nombre_comercial,
-                'tipo': 'CONFIRMADO' if turno.estado == 'CONFIRMADO' else 'EJECUTADA'
-            })
-
     context = {
         'kpi_locales': Establecimiento.objects.count(),
-        'kpi_hoy': Turno.objects.filter(agenda__fecha=date.today()).count(),
+        'kpi_hoy': Turno.objects.filter(fecha_agenda=date.today()).count(),
         'stats': stats, 
         'lista_pendientes': pendientes_page,
         'lista_proximos': lista_cierre,
         'hoy': date.today(),
-        'calendar_events_json': json.dumps(eventos_calendario, cls=DjangoJSONEncoder),
-        'map_points_json': json.dumps(puntos_mapa, cls=DjangoJSONEncoder),
+        'calendar_events_json': respuestas.dumps_html(eventos_calendario),
     }
     return render(request, 'staff/dashboard.html', context)
 
@@ -105,24 +114,15 @@ def dashboard_staff(request):
 @user_passes_test(es_staff)
 def marcar_ejecutada(request, turno_id):
     if request.method == 'POST':
-        turno = get_object_or_404(Turno, id=turno_id)
-        
-        # Solo si es hoy o antes (no se puede ejecutar futuro)
-        if turno.agenda.fecha > date.today():
-            messages.error(request, "No puede ejecutar inspecciones futuras.")
-            return redirect('dashboard_staff')
-
-        turno.estado = 'EJECUTADA'
-        turno.save()
-        
-        # Notificar al ciudadano que la visita ocurrió
-        Notificacion.objects.create(
-            usuario=turno.establecimiento.propietario,
-            titulo="Visita Realizada 🚒",
-            mensaje="El inspector ha registrado la visita. Procesando informe final.",
-            tipo="INFO", link="/portal/"
+        # Solo si es hoy o antes (no se puede ejecutar futuro). El aviso al ciudadano lo crea el motor.
+        resultado = transiciones.transicionar(
+            turno_id, 'EJECUTADA', desde='CONFIRMADO', condicion=Q(fecha_agenda__lte=date.today()), actor=request.user,
         )
-        messages.success(request, f"Visita a {turno.establecimiento.nombre_comercial} registrada. Pendiente N° Formulario.")
+        if resultado.ok:
+            local = Turno.objects.filter(id=turno_id).values_list('establecimiento__nombre_comercial', flat=True).first()
+            messages.success(request, f"Visita a {local} registrada. Pendiente N° Formulario.")
+        else:
+            avisar_transicion_fallida(request, resultado, "No puede ejecutar inspecciones futuras.")
             
     return redirect('dashboard_staff')
 
@@ -133,10 +133,14 @@ def solicitudes_pendientes(request):
     # Orden: Fecha -> Bloque -> ID (Orden de llegada)
     pendientes_list = Turno.objects.filter(estado='PENDIENTE')\
         .select_related('establecimiento__propietario', 'agenda')\
-        .order_by('agenda__fecha', 'bloque', 'id')
+        .order_by('fecha_agenda', 'bloque', 'id')
         
-    # Paginación: 9 tarjetas por página (Grid de 3x3)
-    paginator = Paginator(pendientes_list, 9)
+    # Paginación: 9 tarjetas por página (Grid de 3x3); ?por_pagina= para triaje masivo
+    try:
+        por_pagina = min(max(int(request.GET.get('por_pagina', 9)), 1), 100)
+    except ValueError:
+        por_pagina = 9
+    paginator = Paginator(pendientes_list, por_pagina)
     page_number = request.GET.get('page')
     pendientes_page = paginator.get_page(page_number)
         
@@ -150,8 +154,8 @@ def gestion_inspecciones(request):
     # Estas no se paginan porque son la carga de trabajo activa (pocas)
     programadas = Turno.objects.filter(
         estado='CONFIRMADO',
-        agenda__fecha__gte=date.today()
-    ).select_related('establecimiento', 'agenda').order_by('agenda__fecha')
+        fecha_agenda__gte=date.today()
+    ).select_related('establecimiento', 'agenda').order_by('fecha_agenda')
 
     # PESTAÑA 2: HISTORIAL (FILTROS + PAGINACIÓN)
     q_search = request.GET.get('q', '')
@@ -170,7 +174,7 @@ def gestion_inspecciones(request):
         historial_list = historial_list.filter(estado=q_estado)
 
     # Ordenar por fecha descendente (lo más nuevo primero)
-    historial_list = historial_list.select_related('establecimiento', 'agenda').order_by('-agenda__fecha')
+    historial_list = historial_list.select_related('establecimiento', 'agenda').order_by('-fecha_agenda')
     
     # Paginación: 20 registros por página
     paginator = Paginator(historial_list, 20)
@@ -189,24 +193,22 @@ def cancelar_inspeccion_staff(request):
     if request.method == 'POST':
         turno_id = request.POST.get('turno_id')
         motivo = request.POST.get('motivo')
-        turno = get_object_or_404(Turno, id=turno_id)
-        
-        if turno.estado != 'CONFIRMADO':
-            messages.error(request, "Solo se pueden cancelar turnos confirmados.")
+        if not str(turno_id).isdigit():
+            messages.error(request, "El turno no existe.")
             return redirect('gestion_inspecciones')
 
-        turno.estado = 'CANCELADO'
-        turno.motivo_cancelacion = motivo
-        turno.save()
-        
-        # Notificar
-        Notificacion.objects.create(
-            usuario=turno.establecimiento.propietario,
-            titulo="Inspección Cancelada ❌",
-            mensaje=f"Su turno ha sido cancelado. Motivo: {motivo}",
-            tipo="ERROR", link="/portal/"
+        resultado = transiciones.transicionar(
+            int(turno_id), 'CANCELADO', desde='CONFIRMADO', actor=request.user,
+            campos={'motivo_cancelacion': motivo},
+            aviso=("Inspección Cancelada ❌", f"Su turno ha sido cancelado. Motivo: {transiciones.literal(motivo)}", 'ERROR'),
+            sms=f"CBT: Su inspeccion en {{local}} fue CANCELADA. Motivo: {transiciones.literal(motivo)}",
         )
-        messages.success(request, "Inspección cancelada correctamente.")
+        if resultado.ok:
+            messages.success(request, "Inspección cancelada correctamente.")
+        elif resultado.motivo == 'estado':
+            messages.error(request, "Solo se pueden cancelar turnos confirmados.")
+        else:
+            avisar_transicion_fallida(request, resultado)
         
     return redirect('gestion_inspecciones')
 
@@ -225,7 +227,7 @@ def cierre_inspecciones(request):
         'establecimiento__propietario__perfil', 
         'agenda', 
         'inspector'
-    ).order_by('agenda__fecha', 'bloque') # Prioridad por fecha
+    ).order_by('fecha_agenda', 'bloque') # Prioridad por fecha
     
     # 3. Aplicar Filtros
     if q:
@@ -254,6 +256,7 @@ def cierre_inspecciones(request):
 # 5. ESTADÍSTICAS
 @login_required
 @user_passes_test(es_staff)
+@leer_de_replica()
 def estadisticas_globales(request):
     # 1. Calcular datos inmediatamente (Server Side Rendering)
     # Esto asegura que el usuario vea los datos apenas carga la página
@@ -284,98 +287,147 @@ def estadisticas_globales(request):
     
     return render(request, 'staff/estadisticas.html', {
         'stats': stats,
-        'chart_data_json': json.dumps(chart_data) # Enviamos JSON listo para usar
+        'chart_data_json': respuestas.dumps_html(chart_data) # Enviamos JSON listo para usar
     })
 
 @login_required
 @user_passes_test(es_staff)
 def gestionar_turno(request, turno_id, accion):
-    with transaction.atomic():
-        try:
-            turno = Turno.objects.select_for_update().get(id=turno_id)
-        except Turno.DoesNotExist:
+    destino = {'confirmar': 'CONFIRMADO', 'rechazar': 'RECHAZADO'}.get(accion)
+    if not destino:
+        messages.error(request, "Acción no válida.")
+        return redirect('solicitudes_pendientes')
+
+    # Compare-and-set: si otro inspector (o un doble clic) ya lo procesó, no se escribe nada.
+    # La notificación interna y el SMS los emite el motor de transiciones.
+    campos = {'inspector': request.user} if destino == 'CONFIRMADO' else {}
+    resultado = transiciones.transicionar(
+        turno_id, destino, desde='PENDIENTE', campos=campos, sms=True, actor=request.user,
+    )
+    if not resultado.ok:
+        if resultado.motivo == 'no_existe':
             messages.error(request, "El turno no existe.")
-            return redirect('dashboard_staff')
-
-        if turno.estado != 'PENDIENTE':
+        else:
             messages.warning(request, "Este turno ya fue procesado por otro inspector.")
-            return redirect('dashboard_staff')
+        return redirect('dashboard_staff')
 
-        email_usuario = turno.establecimiento.propietario.email 
-        propietario = turno.establecimiento.propietario
-        
-        datos_email = {
-            'nombre': propietario.first_name,
-            'local': turno.establecimiento.nombre_comercial,
-            'fecha': turno.agenda.fecha.strftime("%d/%m/%Y"),
-            'jornada': turno.get_bloque_display(),
-        }
-        
-        subject = ""
-        
-        if accion == 'confirmar':
-            turno.estado = 'CONFIRMADO'
-            turno.inspector = request.user 
-            messages.success(request, f"Turno CONFIRMADO. Notificaciones enviadas.")
-            
-            Notificacion.objects.create(
-                usuario=propietario,
-                titulo="¡Turno Aprobado! ✅",
-                mensaje=f"Su inspección para {turno.establecimiento.nombre_comercial} ha sido confirmada.",
-                tipo="SUCCESS",
-                link="/portal/"
-            )
-            
-            subject = "Inspección Confirmada ✅"
-            datos_email['mensaje_principal'] = "Nos complace informarle que su solicitud de inspección ha sido APROBADA."
-            datos_email['estado'] = "CONFIRMADO"
-            datos_email['color_estado'] = "#198754" # Verde
-            datos_email['instrucciones'] = "Por favor, asegúrese de que una persona mayor de edad se encuentre en el establecimiento para recibir al inspector."
-        
-        elif accion == 'rechazar':
-            turno.estado = 'RECHAZADO'
-            messages.warning(request, f"Turno RECHAZADO.")
-            
-            Notificacion.objects.create(
-                usuario=propietario,
-                titulo="Solicitud Rechazada ⚠️",
-                mensaje=f"No pudimos procesar su turno para {turno.establecimiento.nombre_comercial}.",
-                tipo="WARNING",
-                link="/portal/"
-            )
+    if destino == 'CONFIRMADO':
+        messages.success(request, f"Turno CONFIRMADO. Notificaciones enviadas.")
+    else:
+        messages.warning(request, f"Turno RECHAZADO.")
 
-            subject = "Actualización de Solicitud ⚠️"
-            datos_email['mensaje_principal'] = "Le informamos que su solicitud de inspección no pudo ser procesada en la fecha seleccionada."
-            datos_email['estado'] = "RECHAZADO"
-            datos_email['color_estado'] = "#dc3545" # Rojo
-            datos_email['instrucciones'] = "Esto puede deberse a falta de disponibilidad operativa en su zona o datos incompletos. Por favor ingrese al portal y seleccione una nueva fecha."
-        
-        turno.save()
-    
-    if email_usuario:
+    for email_usuario, subject, datos_email in correos_de_triaje([turno_id], destino):
         enviar_correo_html(email_usuario, subject, datos_email)
 
     return redirect('solicitudes_pendientes')
 
+# Contenido del correo al aprobar/rechazar una solicitud
+CORREOS_TRIAJE = {
+    'CONFIRMADO': ("Inspección Confirmada ✅", {
+        'mensaje_principal': "Nos complace informarle que su solicitud de inspección ha sido APROBADA.",
+        'estado': "CONFIRMADO",
+        'color_estado': "#198754", # Verde
+        'instrucciones': "Por favor, asegúrese de que una persona mayor de edad se encuentre en el establecimiento para recibir al inspector.",
+    }),
+    'RECHAZADO': ("Actualización de Solicitud ⚠️", {
+        'mensaje_principal': "Le informamos que su solicitud de inspección no pudo ser procesada en la fecha seleccionada.",
+        'estado': "RECHAZADO",
+        'color_estado': "#dc3545", # Rojo
+        'instrucciones': "Esto puede deberse a falta de disponibilidad operativa en su zona o datos incompletos. Por favor ingrese al portal y seleccione una nueva fecha.",
+    }),
+}
+MAX_TRIAJE_LOTE = 500
+
+def correos_de_triaje(ids, destino):
+    """[(email, asunto, datos)] de los turnos indicados, con una sola consulta."""
+    subject, datos_base = CORREOS_TRIAJE[destino]
+    jornadas = dict(Turno.BLOQUES)
+    filas = Turno.objects.filter(id__in=ids).values(
+        'bloque',
+        email=F('establecimiento__propietario__email'),
+        nombre=F('establecimiento__propietario__first_name'),
+        local=F('establecimiento__nombre_comercial'),
+        fecha=F('fecha_agenda'),
+    )
+    return [
+        (f['email'], subject, {
+            **datos_base,
+            'nombre': f['nombre'],
+            'local': f['local'],
+            'fecha': f['fecha'].strftime("%d/%m/%Y"),
+            'jornada': jornadas.get(f['bloque'], f['bloque']),
+        })
+        for f in filas if f['email']
+    ]
+
+@login_required
+@user_passes_test(es_staff)
+def triaje_solicitudes(request):
+    """
+    Aprobación/rechazo masivo de solicitudes pendientes.
+    Recibe `ids` y `accion` (JSON o formulario) y devuelve el resultado por id.
+    Las filas que otro inspector tiene bloqueadas se saltan (SKIP LOCKED) en
+    lugar de esperar; las notificaciones se crean en bloque y los correos se
+    encolan en un solo lote tras el commit.
+    """
+    if request.method != 'POST':
+        return respuestas.respuesta_json(request, {'error': 'Método no permitido'}, status=405)
+
+    if request.content_type == 'application/json':
+        try:
+            datos = json.loads(request.body or b'{}')
+        except ValueError:
+            return respuestas.respuesta_json(request, {'error': 'JSON inválido'}, status=400)
+        if not isinstance(datos, dict):
+            return respuestas.respuesta_json(request, {'error': 'Se esperaba un objeto JSON'}, status=400)
+        ids, accion = datos.get('ids', []), datos.get('accion')
+        # bool es subclase de int: true/false no son ids
+        if not isinstance(ids, list) or not all(type(i) is int for i in ids):
+            return respuestas.respuesta_json(request, {'error': 'Ids inválidos'}, status=400)
+    else:
+        accion = request.POST.get('accion')
+        try:
+            ids = [int(i) for i in request.POST.getlist('ids')]
+        except ValueError:
+            return respuestas.respuesta_json(request, {'error': 'Ids inválidos'}, status=400)
+
+    destino = {'confirmar': 'CONFIRMADO', 'rechazar': 'RECHAZADO'}.get(accion)
+    if not destino:
+        return respuestas.respuesta_json(request, {'error': 'Acción no válida'}, status=400)
+    if not ids or len(ids) > MAX_TRIAJE_LOTE:
+        return respuestas.respuesta_json(request, {'error': f'Envíe entre 1 y {MAX_TRIAJE_LOTE} solicitudes'}, status=400)
+
+    campos = {'inspector': request.user} if destino == 'CONFIRMADO' else {}
+    with transaction.atomic():
+        resultados = transiciones.transicionar_lote(
+            ids, destino, desde='PENDIENTE', campos=campos, saltar_bloqueados=True, sms=True, actor=request.user,
+        )
+        procesados = [r.id for r in resultados if r.ok]
+        correos = encolar_correos_html(correos_de_triaje(procesados, destino)) if procesados else 0
+
+    return respuestas.respuesta_json(request, {
+        'accion': accion,
+        'procesados': len(procesados),
+        'correos': correos,
+        'resultados': [
+            {'id': r.id, 'ok': r.ok, 'estado': r.estado, 'motivo': r.motivo} for r in resultados
+        ],
+    })
+
 @login_required
 @user_passes_test(es_staff)
 def finalizar_turno(request, turno_id):
     if request.method == 'POST':
-        turno = get_object_or_404(Turno, id=turno_id)
         num = request.POST.get('numero_formulario')
         if num:
-            turno.numero_formulario = num
-            turno.estado = 'TERMINADO'
-            turno.save()
-            
-            # Notificación final
-            Notificacion.objects.create(
-                usuario=turno.establecimiento.propietario,
-                titulo="Trámite Finalizado ✅",
-                mensaje=f"Proceso completado exitosamente. Formulario N° {num}.",
-                tipo="SUCCESS", link="/portal/"
+            # Notificación final: la crea el motor con el N° ya guardado
+            resultado = transiciones.transicionar(
+                turno_id, 'TERMINADO', campos={'numero_formulario': num}, actor=request.user,
             )
-            messages.success(request, f"Cerrado con formulario N° {num}.")
+            if resultado.ok:
+                messages.success(request, f"Cerrado con formulario N° {num}.")
+            else:
+                avisar_transicion_fallida(request, resultado)
         else:
             messages.error(request, "Ingrese el número.")
     return redirect('dashboard_staff')
@@ -385,12 +437,9 @@ def finalizar_turno(request, turno_id):
 #                              GENERACIÓN DE INFORMES (CORREGIDO)
 # ==============================================================================
 
-@login_required
-@user_passes_test(es_staff)
-def generar_informe_mensual(request):
+def parametros_informe(request):
+    """Periodo pedido (tipo_reporte: mensual, anual o ytd); también identifica su PDF."""
     hoy = date.today()
-    
-    # 1. Obtener Parámetros
     try:
         anio = int(request.GET.get('anio', hoy.year))
         mes = int(request.GET.get('mes', hoy.month))
@@ -398,48 +447,58 @@ def generar_informe_mensual(request):
         anio = hoy.year
         mes = hoy.month
 
-    tipo_reporte = request.GET.get('tipo_reporte', 'mensual') # mensual, anual, ytd
-    print_mode = request.GET.get('print_mode') == '1' # ¿Es para imprimir?
-
-    # 2. Filtro Base: Estado TERMINADO y Año seleccionado
-    turnos = Turno.objects.filter(
-        estado='TERMINADO',
-        agenda__fecha__year=anio
-    ).select_related('establecimiento__propietario', 'agenda', 'inspector').order_by('agenda__fecha')
+    parametros = {'tipo_reporte': request.GET.get('tipo_reporte', 'mensual'), 'anio': anio, 'mes': mes}
+    if parametros['tipo_reporte'] == 'ytd':
+        parametros['hasta'] = hoy.isoformat()  # El acumulado cambia cada día
+    return parametros
 
-    # 3. Aplicar Lógica de Fechas
+def filas_informe(tipo_reporte, anio, mes, hasta=None):
+    """(filas, título) del periodo: inspecciones TERMINADAS ya aplanadas (ver core.informes)."""
+    turnos = FilaInforme.objects.filter(fecha__year=anio)
     titulo_periodo = f"Año {anio}"
-    
+
     if tipo_reporte == 'mensual':
-        turnos = turnos.filter(agenda__fecha__month=mes)
+        turnos = turnos.filter(fecha__month=mes)
         nombres_meses = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
         titulo_periodo = f"{nombres_meses[mes]} {anio}"
-        
+
     elif tipo_reporte == 'ytd':
         # Hasta la fecha de hoy
-        turnos = turnos.filter(agenda__fecha__lte=hoy)
-        titulo_periodo = f"Enero - {hoy.strftime('%B')} {anio} (A la fecha)"
-        
+        hasta = date.fromisoformat(hasta) if hasta else date.today()
+        turnos = turnos.filter(fecha__lte=hasta)
+        titulo_periodo = f"Enero - {hasta.strftime('%B')} {anio} (A la fecha)"
+
     elif tipo_reporte == 'anual':
         # Todo el año (ya filtrado por base)
         titulo_periodo = f"Ejercicio Fiscal {anio}"
 
+    return turnos, titulo_periodo
+
+@leer_de_replica()
+def contexto_informe(tipo_reporte, anio, mes, hasta=None):
+    """Contexto de pdf/informe.html (se ejecuta en el pool de core.pdf)."""
+    turnos, titulo_periodo = filas_informe(tipo_reporte, anio, mes, hasta)
+    filas = list(turnos)
+    return {'titulo_periodo': titulo_periodo, 'filas': filas, 'total': len(filas)}
+
+@login_required
+@user_passes_test(es_staff)
+@leer_de_replica()
+def generar_informe_mensual(request):
+    hoy = date.today()
+
+    # 1. Parámetros y filas del periodo
+    parametros = parametros_informe(request)
+    anio, mes, tipo_reporte = parametros['anio'], parametros['mes'], parametros['tipo_reporte']
+    print_mode = request.GET.get('print_mode') == '1' # ¿Es para imprimir?
+    turnos, titulo_periodo = filas_informe(**parametros)
+
     # Totales
     total_registros = turnos.count()
 
-    # 4. Paginación (Solo si NO estamos en modo impresión)
-    if not print_mode:
-        paginator = Paginator(turnos, 20) # 20 por página en pantalla
-        page_number = request.GET.get('page')
-        turnos_paginados = paginator.get_page(page_number)
-    else:
-        turnos_paginados = turnos # Sin paginar para impresión completa
-
     # Contexto
     rango_anios = range(2024, hoy.year + 2)
-
-    return render(request, 'staff/informe_mensual.html', {
-        'turnos': turnos_paginados,
+    contexto = {
         'mes': mes,
         'anio': anio,
         'rango_anios': rango_anios,
@@ -448,10 +507,26 @@ def generar_informe_mensual(request):
         'total': total_registros,
         'print_mode': print_mode, # Para activar JS de impresión automática
         'anio_actual': hoy.year
-    })
+    }
+
+    # 4. Impresión: el periodo completo sin paginar, en streaming (un año entero
+    # no se arma en memoria; el navegador recibe la cabecera de inmediato)
+    if print_mode and total_registros:
+        return respuestas.respuesta_html_por_partes(
+            request, 'staff/informe_mensual.html', contexto, turnos, 'staff/informe_fila.html',
+        )
+
+    # 5. Paginación en pantalla
+    if not print_mode:
+        paginator = Paginator(turnos, 20) # 20 por página en pantalla
+        page_number = request.GET.get('page')
+        turnos = paginator.get_page(page_number)
+
+    return render(request, 'staff/informe_mensual.html', {**contexto, 'turnos': turnos})
 
 @login_required
 @user_passes_test(es_staff)
+@leer_de_replica()
 def exportar_excel_mensual(request):
     try:
         mes = int(request.GET.get('mes', date.today().month))
@@ -460,15 +535,12 @@ def exportar_excel_mensual(request):
         mes = date.today().month
         anio = date.today().year
 
-    # Filtro Base Excel
-    turnos = Turno.objects.filter(
-        estado='TERMINADO', # Ajustar a TERMINADO o FINALIZADO
-        agenda__fecha__year=anio
-    ).select_related('establecimiento__propietario', 'agenda', 'inspector').order_by('agenda__fecha')
+    # Filtro Base Excel (mismas filas que el informe)
+    turnos = FilaInforme.objects.filter(fecha__year=anio)
 
     titulo_reporte = f"Inspecciones {anio}"
     if mes > 0:
-        turnos = turnos.filter(agenda__fecha__month=mes)
+        turnos = turnos.filter(fecha__month=mes)
         titulo_reporte = f"Inspecciones {mes}-{anio}"
 
     # Generar Excel
@@ -493,17 +565,12 @@ def exportar_excel_mensual(request):
         cell = ws.cell(row=3, column=col_num)
         cell.font = font_header; cell.fill = fill_header; cell.alignment = alignment_center; cell.border = thin_border
 
-    for idx, turno in enumerate(turnos, 1):
-        inspector = f"{turno.inspector.first_name} {turno.inspector.last_name}" if turno.inspector else "--"
-        # Manejo seguro de RUC (puede no tener perfil si es data antigua)
-        ruc = "N/A"
-        if hasattr(turno.establecimiento.propietario, 'perfil'):
-             ruc = turno.establecimiento.propietario.perfil.ruc
-        
+    for idx, fila in enumerate(turnos.iterator(), 1):
+        # RUC "N/A": el propietario puede no tener perfil si es data antigua
         ws.append([
-            idx, turno.agenda.fecha, turno.numero_formulario or "S/N",
-            turno.establecimiento.nombre_comercial, turno.establecimiento.direccion,
-            ruc, inspector, turno.observaciones or ""
+            idx, fila.fecha, fila.formulario or "S/N",
+            fila.local, fila.direccion,
+            fila.ruc or "N/A", fila.inspector or "--", fila.observaciones or ""
         ])
         
         for col_num in range(1, len(headers) + 1):
@@ -522,56 +589,132 @@ def exportar_excel_mensual(request):
 @login_required
 @user_passes_test(es_staff)
 def hoja_ruta(request):
-    origen = Point(-77.7071697, 0.8234943, srid=4326) 
-    
-    bloque_actual = request.GET.get('bloque', 'MANANA')
-    zona_seleccionada = request.GET.get('zona', 'SUR')
-    fecha_str = request.GET.get('fecha')
-    
-    if fecha_str:
-        try:
-            fecha_filtro = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-        except ValueError:
-            fecha_filtro = date.today()
-    else:
-        fecha_filtro = date.today()
-
-    filtro_parroquia = 'TULCAN_CENTRO'
-    if zona_seleccionada == 'NORTE':
-        filtro_parroquia = 'GONZALEZ_SUAREZ'
+    contexto = contexto_hoja_ruta(**parametros_hoja_ruta(request))
+    return render(request, 'staff/hoja_ruta.html', {**contexto, 'print_mode': request.GET.get('print_mode') == '1'})
 
-    pendientes = list(Turno.objects.filter(
-        agenda__fecha=fecha_filtro, 
-        estado='CONFIRMADO',
-        establecimiento__parroquia=filtro_parroquia,
-        bloque=bloque_actual
-    ).select_related('establecimiento'))
+# Zona de la hoja de ruta -> parroquia que recorre
+ZONAS_HOJA_RUTA = {'SUR': 'TULCAN_CENTRO', 'NORTE': 'GONZALEZ_SUAREZ'}
 
-    ruta_optimizada = []
-    punto_actual = origen
-    
-    while pendientes:
-        pendientes_con_ubicacion = [p for p in pendientes if p.establecimiento.ubicacion]
-        
-        if not pendientes_con_ubicacion:
-            break 
+def parametros_hoja_ruta(request):
+    """
+    Fecha (ISO), zona y bloque pedidos; también identifican el PDF de la hoja.
+    Zona y bloque desconocidos caen a SUR y MANANA: un valor libre no debe
+    crear otra clave (y otro archivo) para la misma hoja.
+    """
+    fecha_str = request.GET.get('fecha')
+    try:
+        fecha_filtro = datetime.strptime(fecha_str, '%Y-%m-%d').date() if fecha_str else date.today()
+    except ValueError:
+        fecha_filtro = date.today()
+    zona, bloque = request.GET.get('zona'), request.GET.get('bloque')
+    return {
+        'fecha': fecha_filtro.isoformat(),
+        'zona': zona if zona in ZONAS_HOJA_RUTA else 'SUR',
+        'bloque': bloque if bloque in dict(Turno.BLOQUES) else 'MANANA',
+    }
 
-        siguiente = min(
-            pendientes_con_ubicacion, 
-            key=lambda t: t.establecimiento.ubicacion.distance(punto_actual)
-        )
-        ruta_optimizada.append(siguiente)
-        pendientes.remove(siguiente)
-        if siguiente in pendientes: pendientes.remove(siguiente) 
-        punto_actual = siguiente.establecimiento.ubicacion
+def contexto_hoja_ruta(fecha, zona, bloque):
+    """Paradas confirmadas del bloque en orden de visita (pantalla y pdf/hoja_ruta.html)."""
+    fecha_filtro = date.fromisoformat(fecha)
+    bloque_actual = bloque
+    zona_seleccionada = zona
+
+    filtro_parroquia = ZONAS_HOJA_RUTA[zona_seleccionada]
+
+    # Solo las columnas que pinta la hoja; las coordenadas vienen ya como float
+    pendientes = geo.coordenadas(
+        Turno.objects.filter(
+            fecha_agenda=fecha_filtro,
+            estado='CONFIRMADO',
+            establecimiento__parroquia=filtro_parroquia,
+            bloque=bloque_actual
+        ),
+        'id', 'hora_estimada', 'referencia_ubicacion', 'telefono_contacto',
+        'establecimiento__nombre_comercial', 'establecimiento__direccion',
+        prefijo='establecimiento__',
+    )
+    paradas = [
+        {**p, 'nombre_comercial': p['establecimiento__nombre_comercial'], 'direccion': p['establecimiento__direccion']}
+        for p in pendientes
+    ]
+    ruta_optimizada = geo.ruta_vecino_mas_cercano(paradas)
 
-    return render(request, 'staff/hoja_ruta.html', {
+    return {
         'ruta': ruta_optimizada,
         'hoy': fecha_filtro,
         'bloque_actual': bloque_actual,
         'zona_actual': zona_seleccionada
+    }
+
+# Vecinos de una parada que la hoja de ruta ofrece aprovechar en la visita
+RADIO_CERCANOS = 500  # metros
+MAX_CERCANOS = 10
+
+@login_required
+@user_passes_test(es_staff)
+def api_locales_cercanos(request, turno_id):
+    """
+    Locales a menos de RADIO_CERCANOS metros de una parada de la hoja de ruta,
+    del más cercano al más lejano: ST_DWithin y KNN sobre geography en una
+    sola consulta (ver core.geo).
+    """
+    parada = get_object_or_404(
+        Turno.objects.values(
+            'establecimiento_id', lat=F('establecimiento__latitud'), lng=F('establecimiento__longitud'),
+        ),
+        id=turno_id,
+    )
+    if parada['lat'] is None:
+        return respuestas.respuesta_json(request, {'radio_m': RADIO_CERCANOS, 'locales': []})
+
+    vecinos = geo.dentro_de_radio(
+        parada['lat'], parada['lng'], RADIO_CERCANOS,
+        queryset=Establecimiento.objects.exclude(id=parada['establecimiento_id']),
+    )
+    cercanos = geo.mas_cercanos(parada['lat'], parada['lng'], queryset=vecinos, limite=MAX_CERCANOS)
+    return respuestas.respuesta_json(request, {
+        'radio_m': RADIO_CERCANOS,
+        'locales': [
+            {
+                'id': c['id'], 'nombre_comercial': c['nombre_comercial'], 'direccion': c['direccion'],
+                # Fuera de PostGIS, Distance devuelve una medida y no un float
+                'distancia_m': round(getattr(c['distancia_m'], 'm', c['distancia_m'])),
+            }
+            for c in cercanos.values('id', 'nombre_comercial', 'direccion', 'distancia_m')
+        ],
     })
 
+# Parámetros de cada documento de core.pdf y su versión imprimible en HTML
+PDF_PARAMETROS = {'hoja_ruta': parametros_hoja_ruta, 'informe': parametros_informe}
+PDF_IMPRIMIBLE = {'hoja_ruta': 'hoja_ruta', 'informe': 'generar_informe_mensual'}
+
+@login_required
+@user_passes_test(es_staff)
+def descargar_pdf(request, documento):
+    """
+    PDF de la hoja de ruta o del informe, con los mismos parámetros GET que la
+    pantalla. Si ya está generado se descarga; si no, responde 202 mientras el
+    pool de core.pdf lo genera y el navegador reintenta la misma URL.
+    """
+    if documento not in pdf.DOCUMENTOS:
+        raise Http404
+    if not pdf.disponible():
+        # Sin WeasyPrint en el servidor: la versión imprimible de siempre
+        consulta = request.GET.copy()
+        consulta['print_mode'] = '1'
+        return redirect(f"{reverse(PDF_IMPRIMIBLE[documento])}?{consulta.urlencode()}")
+
+    trabajo = pdf.solicitar(documento, PDF_PARAMETROS[documento](request))
+    if trabajo.listo:
+        return FileResponse(open(trabajo.ruta, 'rb'), as_attachment=True,
+                            filename=f"{documento}.pdf", content_type='application/pdf')
+    if trabajo.estado == 'ERROR':
+        return respuestas.respuesta_json(request, {'trabajo': trabajo.clave, 'estado': trabajo.estado}, status=500)
+
+    response = respuestas.respuesta_json(request, {'trabajo': trabajo.clave, 'estado': trabajo.estado}, status=202)
+    response['Retry-After'] = '2'
+    return response
+
 # ==============================================================================
 #                              GESTIÓN DE USUARIOS
 # ==============================================================================
@@ -702,8 +845,8 @@ def alta_contribuyente(request):
         form = AltaContribuyenteForm()
     return render(request, 'staff/alta_contribuyente.html', {'form': form})
 
-@login_required
-def api_buscar_propietario(request):
+@asincrono.login_requerido_async
+async def api_buscar_propietario(request):
     cedula = request.GET.get('cedula')
     response = {
         'existe': False, 
@@ -715,7 +858,8 @@ def api_buscar_propietario(request):
     
     if cedula and len(cedula) >= 10:
         try:
-            user = User.objects.get(username=cedula)
+            # select_related: el perfil (o su ausencia) queda cargado y hasattr no consulta
+            user = await User.objects.select_related('perfil').aget(username=cedula)
             response['existe'] = True
             response['first_name'] = user.first_name
             response['last_name'] = user.last_name
@@ -724,7 +868,7 @@ def api_buscar_propietario(request):
                 response['ruc'] = user.perfil.ruc
             
             # Obtener locales con nombre de parroquia legible
-            for loc in user.establecimientos.all():
+            async for loc in Establecimiento.objects.filter(propietario=user):
                 response['locales'].append({
                     'nombre_comercial': loc.nombre_comercial,
                     'direccion': loc.direccion,
@@ -734,7 +878,7 @@ def api_buscar_propietario(request):
         except User.DoesNotExist:
             pass
             
-    return JsonResponse(response)
+    return respuestas.respuesta_json(request, response)
 
 # --- AGENDA (MASIVA) ---
 @login_required
@@ -763,6 +907,7 @@ def habilitar_agenda(request):
 
                 count = 0
                 notif_count = 0
+                creadas = []
                 
                 # Zonas Urbanas (No notificamos masivamente para no hacer spam diario)
                 zonas_urbanas = ['GONZALEZ_SUAREZ', 'TULCAN_CENTRO']
@@ -784,6 +929,7 @@ def habilitar_agenda(request):
                                 
                                 if created: 
                                     count += 1
+                                    creadas.append(agenda)
                                     
                                     # --- LÓGICA DE NOTIFICACIÓN RURAL ---
                                     # Si la zona es RURAL, avisamos a todos los locales de esa zona
@@ -793,12 +939,12 @@ def habilitar_agenda(request):
                                             establecimientos__parroquia=z
                                         ).distinct()
                                         
-                                        notificaciones = []
+                                        avisos = []
                                         fecha_fmt = d.strftime("%d/%m")
                                         zona_nombre = dict(OPCIONES_PARROQUIA).get(z, z)
                                         
                                         for u in usuarios_afectados:
-                                            notificaciones.append(Notificacion(
+                                            avisos.append(Notificacion(
                                                 usuario=u,
                                                 titulo="Visita Programada 🚒",
                                                 mensaje=f"El Cuerpo de Bomberos estará en {zona_nombre} el día {fecha_fmt}. Por favor ingrese al portal y reserve su turno.",
@@ -807,14 +953,18 @@ def habilitar_agenda(request):
                                             ))
                                         
                                         # Guardar en bloque (Optimizado)
-                                        if notificaciones:
-                                            Notificacion.objects.bulk_create(notificaciones)
-                                            notif_count += len(notificaciones)
+                                        if avisos:
+                                            notificaciones.crear_en_bloque(avisos)
+                                            notif_count += len(avisos)
                                             
                             except Exception as e:
                                 print(f"Error creando agenda: {e}")
                                 pass
                                 
+                # Sobrecupo según el historial de ausencias de cada parroquia y día
+                if creadas and config.sobrecupo_automatico:
+                    capacidad.aplicar(capacidad.recomendar(creadas, riesgo=config.riesgo_sobrecupo))
+
                 msg = f"{count} fechas creadas."
                 if notif_count > 0:
                     msg += f" Se enviaron {notif_count} alertas a ciudadanos rurales."
@@ -934,7 +1084,7 @@ def directorio_establecimientos(request):
 @user_passes_test(es_staff)
 def detalle_establecimiento(request, local_id):
     local = get_object_or_404(Establecimiento, id=local_id)
-    historial = Turno.objects.filter(establecimiento=local).order_by('-agenda__fecha')
+    historial = Turno.objects.filter(establecimiento=local).order_by('-fecha_agenda')
     
     if request.method == 'POST':
         local.nombre_comercial = request.POST.get('nombre_comercial').upper()
@@ -991,7 +1141,7 @@ def agendar_presencial_detalle(request, local_id):
     turno_activo = Turno.objects.filter(
         establecimiento=local,
         estado__in=['PENDIENTE', 'CONFIRMADO'],
-        agenda__fecha__gte=date.today()
+        fecha_agenda__gte=date.today()
     ).first()
     
     if turno_activo:
@@ -1010,59 +1160,41 @@ def agendar_presencial_detalle(request, local_id):
 
     # 3. PROCESAR GUARDADO
     if request.method == 'POST':
-        with transaction.atomic():
-            agenda = AgendaDiaria.objects.select_for_update().get(id=request.POST.get('agenda_id'))
-            bloque = request.POST.get('bloque')
-            
-            # Validar Cupo Real
-            ocupados = Turno.objects.filter(agenda=agenda, bloque=bloque).exclude(estado='CANCELADO').count()
-            capacidad = agenda.capacidad_manana if bloque == 'MANANA' else agenda.capacidad_tarde
-            
-            if ocupados >= capacidad:
-                messages.error(request, "❌ Error: El cupo seleccionado acaba de llenarse.")
-                return redirect('agendar_presencial_detalle', local_id=local.id)
-
-            Turno.objects.create(
-                agenda=agenda,
-                establecimiento=local,
-                bloque=bloque,
-                estado='CONFIRMADO',
-                inspector=request.user,
-                observaciones="VENTANILLA",
-                telefono_contacto=request.POST.get('telefono'),
-                referencia_ubicacion=request.POST.get('referencia')
-            )
-            
-            Notificacion.objects.create(
-                usuario=local.propietario,
-                titulo="Turno Asignado ✅",
-                mensaje=f"Confirmado turno presencial para {local.nombre_comercial}.",
-                tipo="SUCCESS", link="/portal/"
-            )
-            messages.success(request, "Turno confirmado exitosamente.")
-            return redirect('dashboard_staff')
+        agenda_id = admision.agenda_pedida(request)
+        if agenda_id is None:
+            messages.error(request, "Seleccione una fecha de la agenda.")
+            return redirect('agendar_presencial_detalle', local_id=local.id)
+        try:
+            with admision.cola_reserva(agenda_id):
+                return _guardar_turno_presencial(request, local)
+        except admision.ColaLlena:
+            messages.warning(request, "Hay muchas reservas en curso para esa fecha. Intente nuevamente.")
+            return redirect('agendar_presencial_detalle', local_id=local.id)
 
-    # 4. CALCULAR CUPOS
+    # 4. CALCULAR CUPOS (Una consulta agregada compartida entre peticiones simultáneas)
     opciones = []
+    ocupacion = admision.ocupacion(local.parroquia)
     for ag in agendas:
-        ocup_man = Turno.objects.filter(agenda=ag, bloque='MANANA').exclude(estado='CANCELADO').count()
-        ocup_tar = Turno.objects.filter(agenda=ag, bloque='TARDE').exclude(estado='CANCELADO').count()
+        ocup_man = ocupacion.get((ag.id, 'MANANA'), 0)
+        ocup_tar = ocupacion.get((ag.id, 'TARDE'), 0)
         bloques = []
         
         if ag.capacidad_manana > 0:
-            pct = int((ocup_man / ag.capacidad_manana) * 100)
+            cupo = ag.cupo('MANANA')
+            pct = int((ocup_man / cupo) * 100)
             bloques.append({
                 'codigo': 'MANANA', 'label': 'MAÑANA', 'hora': '09:00 - 12:30', 
-                'ocupados': ocup_man, 'total': ag.capacidad_manana, 'pct': pct, 
-                'disponible': ocup_man < ag.capacidad_manana
+                'ocupados': ocup_man, 'total': cupo, 'pct': pct, 
+                'disponible': ocup_man < cupo
             })
             
         if ag.capacidad_tarde > 0:
-            pct = int((ocup_tar / ag.capacidad_tarde) * 100)
+            cupo = ag.cupo('TARDE')
+            pct = int((ocup_tar / cupo) * 100)
             bloques.append({
                 'codigo': 'TARDE', 'label': 'TARDE', 'hora': '14:45 - 16:30', 
-                'ocupados': ocup_tar, 'total': ag.capacidad_tarde, 'pct': pct, 
-                'disponible': ocup_tar < ag.capacidad_tarde
+                'ocupados': ocup_tar, 'total': cupo, 'pct': pct, 
+                'disponible': ocup_tar < cupo
             })
             
         if bloques:
@@ -1070,25 +1202,65 @@ def agendar_presencial_detalle(request, local_id):
 
     return render(request, 'staff/agendar_presencial.html', {'local': local, 'opciones': opciones})
 
+def _guardar_turno_presencial(request, local):
+    # Reserva en ventanilla (ya dentro de la cola de la agenda)
+    with transaction.atomic():
+        agenda = AgendaDiaria.objects.select_for_update().get(id=request.POST.get('agenda_id'))
+        bloque = request.POST.get('bloque')
+        
+        # Validar Cupo Real
+        ocupados = Turno.objects.filter(agenda=agenda, bloque=bloque).exclude(estado__in=Turno.ESTADOS_SIN_CUPO).count()
+        cupo = agenda.cupo(bloque)  # Capacidad + sobrecupo
+        
+        if ocupados >= cupo:
+            messages.error(request, "❌ Error: El cupo seleccionado acaba de llenarse.")
+            return redirect('agendar_presencial_detalle', local_id=local.id)
+
+        Turno.objects.create(
+            agenda=agenda,
+            establecimiento=local,
+            bloque=bloque,
+            estado='CONFIRMADO',
+            inspector=request.user,
+            observaciones="VENTANILLA",
+            telefono_contacto=request.POST.get('telefono'),
+            referencia_ubicacion=request.POST.get('referencia')
+        )
+        lista_espera.retirar(local)
+        
+        Notificacion.objects.create(
+            usuario=local.propietario,
+            titulo="Turno Asignado ✅",
+            mensaje=f"Confirmado turno presencial para {local.nombre_comercial}.",
+            tipo="SUCCESS", link="/portal/"
+        )
+        transaction.on_commit(admision.invalidar_disponibilidad)
+        messages.success(request, "Turno confirmado exitosamente.")
+        return redirect('dashboard_staff')
+
 # ==============================================================================
 #                              PORTAL CIUDADANO
 # ==============================================================================
 
-@login_required
-def api_mis_notificaciones(request):
-    notifs = Notificacion.objects.filter(usuario=request.user, leido=False)[:5]
-    data = [{'id': n.id, 'titulo': n.titulo, 'mensaje': n.mensaje, 'tipo': n.tipo, 'fecha': n.fecha_creacion.strftime("%H:%M"), 'link': n.link} for n in notifs]
-    return JsonResponse({'count': len(data), 'notificaciones': data})
+@asincrono.login_requerido_async
+async def api_mis_notificaciones(request):
+    notifs = Notificacion.objects.vigentes().filter(usuario=request.user, leido=False)[:5]
+    data = [{'id': n.id, 'titulo': n.titulo, 'mensaje': n.mensaje, 'tipo': n.tipo, 'fecha': n.fecha_creacion.strftime("%H:%M"), 'link': n.link} async for n in notifs]
+    return respuestas.respuesta_json(request, {'count': len(data), 'notificaciones': data})
 
 @login_required
 def api_marcar_leida(request, notificacion_id):
-    try:
-        n = Notificacion.objects.get(id=notificacion_id, usuario=request.user)
-        n.leido = True
-        n.save()
-        return JsonResponse({'status': 'ok'})
-    except Notificacion.DoesNotExist:
-        return JsonResponse({'status': 'error'}, status=404)
+    # Un UPDATE: 0 filas si no existe, no es suya o ya estaba leída
+    if notificaciones.marcar_leidas(request.user, [notificacion_id]) or \
+            Notificacion.objects.filter(id=notificacion_id, usuario=request.user).exists():
+        return respuestas.respuesta_json(request, {'status': 'ok'})
+    return respuestas.respuesta_json(request, {'status': 'error'}, status=404)
+
+@login_required
+def api_marcar_todas_leidas(request):
+    if request.method != 'POST':
+        return respuestas.respuesta_json(request, {'status': 'error'}, status=405)
+    return respuestas.respuesta_json(request, {'status': 'ok', 'marcadas': notificaciones.marcar_leidas(request.user)})
 
 @login_required
 def home_ciudadano(request):
@@ -1111,9 +1283,9 @@ def home_ciudadano(request):
     # Esto previene que un turno de ayer aparezca aquí aunque el script de limpieza no haya corrido aún.
     turnos_activos = Turno.objects.filter(
         establecimiento__in=mis_locales,
-        agenda__fecha__gte=today, # <--- FILTRO CRÍTICO: Mayor o igual a hoy
+        fecha_agenda__gte=today, # <--- FILTRO CRÍTICO: Mayor o igual a hoy
         estado__in=['PENDIENTE', 'CONFIRMADO']
-    ).order_by('agenda__fecha')
+    ).order_by('fecha_agenda')
     
     # 2. HISTORIAL: Todo lo demás
     # Incluye: Pasados, Rechazados, Terminados, Cancelados, No Realizados
@@ -1121,7 +1293,7 @@ def home_ciudadano(request):
         establecimiento__in=mis_locales
     ).exclude(
         id__in=turnos_activos
-    ).order_by('-agenda__fecha')
+    ).order_by('-fecha_agenda')
 
     return render(request, 'ciudadano/home.html', {
         'locales': mis_locales,
@@ -1157,10 +1329,11 @@ def verificar_ubicacion(request, local_id):
 @login_required
 def detalle_local_ciudadano(request, local_id):
     local = get_object_or_404(Establecimiento, id=local_id, propietario=request.user)
-    historial = Turno.objects.filter(establecimiento=local).order_by('-agenda__fecha')
+    historial = Turno.objects.filter(establecimiento=local).order_by('-fecha_agenda')
     return render(request, 'ciudadano/detalle_local.html', {'local': local, 'historial': historial})
 
 @login_required
+@admision.limitar_reservas
 def agendar_turno(request):
     local = get_object_or_404(Establecimiento, id=request.GET.get('local_id'), propietario=request.user)
     
@@ -1168,7 +1341,7 @@ def agendar_turno(request):
     turno_activo = Turno.objects.filter(
         establecimiento=local,
         estado__in=['PENDIENTE', 'CONFIRMADO'],
-        agenda__fecha__gte=date.today()
+        fecha_agenda__gte=date.today()
     ).first()
     
     if turno_activo:
@@ -1182,76 +1355,109 @@ def agendar_turno(request):
     ).order_by('fecha')
 
     if request.method == 'POST':
-        with transaction.atomic():
-            agenda = AgendaDiaria.objects.select_for_update().get(id=request.POST.get('agenda_id'))
-            bloque = request.POST.get('bloque')
-            
-            ocupados = Turno.objects.filter(agenda=agenda, bloque=bloque).exclude(estado='CANCELADO').count()
-            cap = agenda.capacidad_manana if bloque == 'MANANA' else agenda.capacidad_tarde
-            
-            if ocupados >= cap:
-                messages.error(request, "Cupo lleno.")
-                return redirect(f"/portal/agendar/?local_id={local.id}")
-            
-            Turno.objects.create(
-                agenda=agenda, establecimiento=local, bloque=bloque,
-                telefono_contacto=request.POST.get('telefono'),
-                referencia_ubicacion=request.POST.get('referencia'),
-                estado='PENDIENTE'
-            )
-            
-            # Notificar Staff
-            for insp in User.objects.filter(is_staff=True):
-                Notificacion.objects.create(
-                    usuario=insp,
-                    titulo="Nueva Solicitud 📥",
-                    mensaje=f"{local.nombre_comercial} ha solicitado turno.",
-                    tipo="INFO",
-                    link="/panel-operativo/"
-                )
-
-            messages.success(request, "Solicitud enviada.")
-            return redirect('home_ciudadano')
+        agenda_id = admision.agenda_pedida(request)
+        if agenda_id is None:
+            messages.error(request, "Seleccione una fecha de la agenda.")
+            return redirect(f"/portal/agendar/?local_id={local.id}")
+        # Cola corta por agenda: en una ráfaga se avisa enseguida en lugar de esperar el bloqueo de la BD
+        try:
+            with admision.cola_reserva(agenda_id):
+                return _guardar_solicitud(request, local)
+        except admision.ColaLlena:
+            messages.warning(request, "Hay muchas solicitudes en curso para esa fecha. Intente nuevamente en unos segundos.")
+            return redirect(f"/portal/agendar/?local_id={local.id}")
 
+    # Disponibilidad: una consulta agregada compartida entre peticiones simultáneas
     opciones = []
+    en_espera = lista_espera.posiciones(local)
+    ocupacion = admision.ocupacion(local.parroquia)
     for ag in agendas:
-        ocup_man = Turno.objects.filter(agenda=ag, bloque='MANANA').exclude(estado='CANCELADO').count()
-        ocup_tar = Turno.objects.filter(agenda=ag, bloque='TARDE').exclude(estado='CANCELADO').count()
+        ocup_man = ocupacion.get((ag.id, 'MANANA'), 0)
+        ocup_tar = ocupacion.get((ag.id, 'TARDE'), 0)
         
         bloques = []
+        cupo_man, cupo_tar = ag.cupo('MANANA'), ag.cupo('TARDE')
         if ag.capacidad_manana > 0:
-             pct = int((ocup_man/ag.capacidad_manana)*100)
-             bloques.append({'codigo': 'MANANA', 'label': 'MAÑANA', 'hora': '09:00 - 12:30', 'ocupados': ocup_man, 'total': ag.capacidad_manana, 'pct': pct, 'disponible': ocup_man < ag.capacidad_manana})
+             pct = int((ocup_man/cupo_man)*100)
+             bloques.append({'codigo': 'MANANA', 'label': 'MAÑANA', 'hora': '09:00 - 12:30', 'ocupados': ocup_man, 'total': cupo_man, 'pct': pct, 'disponible': ocup_man < cupo_man, 'posicion_espera': en_espera.get((ag.id, 'MANANA'))})
         if ag.capacidad_tarde > 0:
-             pct = int((ocup_tar/ag.capacidad_tarde)*100)
-             bloques.append({'codigo': 'TARDE', 'label': 'TARDE', 'hora': '14:45 - 16:30', 'ocupados': ocup_tar, 'total': ag.capacidad_tarde, 'pct': pct, 'disponible': ocup_tar < ag.capacidad_tarde})
+             pct = int((ocup_tar/cupo_tar)*100)
+             bloques.append({'codigo': 'TARDE', 'label': 'TARDE', 'hora': '14:45 - 16:30', 'ocupados': ocup_tar, 'total': cupo_tar, 'pct': pct, 'disponible': ocup_tar < cupo_tar, 'posicion_espera': en_espera.get((ag.id, 'TARDE'))})
         if bloques: opciones.append({'info': ag, 'bloques': bloques})
 
     return render(request, 'ciudadano/agendar.html', {'local': local, 'opciones': opciones})
 
-@login_required
-def cancelar_turno(request, turno_id):
-    turno = get_object_or_404(Turno, id=turno_id)
-    
-    if not request.user.is_staff and turno.establecimiento.propietario != request.user:
-        messages.error(request, "No tiene permiso.")
-        return redirect('home_ciudadano')
+def _guardar_solicitud(request, local):
+    # Solicitud del ciudadano (ya dentro de la cola de la agenda)
+    with transaction.atomic():
+        agenda = AgendaDiaria.objects.select_for_update().get(id=request.POST.get('agenda_id'))
+        bloque = request.POST.get('bloque')
+        
+        ocupados = Turno.objects.filter(agenda=agenda, bloque=bloque).exclude(estado__in=Turno.ESTADOS_SIN_CUPO).count()
+        cap = agenda.cupo(bloque)  # Capacidad + sobrecupo
+        
+        if ocupados >= cap:
+            if request.POST.get('lista_espera'):
+                # Jornada llena: el local entra a la fila y se promueve al liberarse un cupo
+                _, creada = lista_espera.inscribir(
+                    local, agenda, bloque, request.POST.get('telefono'), request.POST.get('referencia'),
+                )
+                if creada:
+                    messages.success(request, "Quedó en lista de espera. Le avisaremos si se libera un cupo.")
+                else:
+                    messages.info(request, "Este local ya está en la lista de espera de esa jornada.")
+                return redirect(f"/portal/agendar/?local_id={local.id}")
+            messages.error(request, "Cupo lleno.")
+            return redirect(f"/portal/agendar/?local_id={local.id}")
+        
+        Turno.objects.create(
+            agenda=agenda, establecimiento=local, bloque=bloque,
+            telefono_contacto=request.POST.get('telefono'),
+            referencia_ubicacion=request.POST.get('referencia'),
+            estado='PENDIENTE'
+        )
+        lista_espera.retirar(local)
+        
+        # Notificar Staff (Un INSERT para todos: el bloqueo de la agenda dura menos)
+        notificaciones.crear_en_bloque([
+            Notificacion(
+                usuario_id=insp_id,
+                titulo="Nueva Solicitud 📥",
+                mensaje=f"{local.nombre_comercial} ha solicitado turno.",
+                tipo="INFO",
+                link="/panel-operativo/"
+            ) for insp_id in User.objects.filter(is_staff=True).values_list('id', flat=True)
+        ])
+        transaction.on_commit(admision.invalidar_disponibilidad)
 
-    if turno.agenda.fecha <= date.today():
-        messages.error(request, "No se puede cancelar el mismo día.")
-        if request.user.is_staff: return redirect('dashboard_staff')
+        messages.success(request, "Solicitud enviada.")
         return redirect('home_ciudadano')
 
-    turno.estado = 'CANCELADO'
-    turno.save()
-    
-    if request.user.is_staff:
-        Notificacion.objects.create(
-            usuario=turno.establecimiento.propietario,
-            titulo="Turno Cancelado",
-            mensaje=f"Su turno para {turno.establecimiento.nombre_comercial} ha sido cancelado.",
-            tipo="WARNING"
-        )
+@login_required
+def cancelar_turno(request, turno_id):
+    es_staff_usuario = request.user.is_staff
+    destino_error = 'dashboard_staff' if es_staff_usuario else 'home_ciudadano'
+
+    # El ciudadano solo cancela lo suyo; nadie cancela el mismo día
+    condicion = Q(fecha_agenda__gt=date.today())
+    if not es_staff_usuario:
+        condicion &= Q(establecimiento__propietario=request.user)
+
+    # Aviso y SMS solo cuando cancela el staff (el ciudadano ya lo sabe)
+    resultado = transiciones.transicionar(
+        turno_id, 'CANCELADO', condicion=condicion, actor=request.user,
+        aviso=None if es_staff_usuario else False, sms=es_staff_usuario,
+    )
+    if not resultado.ok:
+        if resultado.motivo == 'no_existe':
+            raise Http404
+        if not es_staff_usuario and not Turno.objects.filter(
+            id=turno_id, establecimiento_id__in=identidad.ids_establecimientos(request.user),
+        ).exists():
+            messages.error(request, "No tiene permiso.")
+        else:
+            avisar_transicion_fallida(request, resultado, "No se puede cancelar el mismo día.")
+        return redirect(destino_error)
     
     messages.success(request, "El turno ha sido cancelado.")
     
@@ -1303,17 +1509,6 @@ def ver_tasas_impuestos(request):
 def ver_guia_requisitos(request):
     return render(request, 'ciudadano/docs/requisitos.html', {'anio_fiscal': date.today().year, 'requisitos': RequisitoLegal.objects.all()})
 
-@login_required
-def api_mis_notificaciones(request):
-    notifs = Notificacion.objects.filter(usuario=request.user, leido=False)[:5]
-    data = [{'id': n.id, 'titulo': n.titulo, 'mensaje': n.mensaje, 'tipo': n.tipo, 'link': n.link, 'fecha': n.fecha_creacion.strftime("%H:%M")} for n in notifs]
-    return JsonResponse({'count': len(data), 'notificaciones': data})
-
-@login_required
-def api_marcar_leida(request, notificacion_id):
-    try: n = Notificacion.objects.get(id=notificacion_id, usuario=request.user); n.leido = True; n.save(); return JsonResponse({'status': 'ok'})
-    except: return JsonResponse({'status': 'error'}, status=404)
-
 @login_required
 @user_passes_test(es_staff)
 def gestion_documentacion(request):
@@ -1370,57 +1565,65 @@ def eliminar_documento(request, tipo, id_obj):
     return redirect('gestion_documentacion')
 
 @login_required
-def api_estadisticas(request):
+@user_passes_test(es_staff)
+def api_mapa_turnos(request, z, x, y):
+    """
+    GeoJSON de una tesela XYZ del mapa operativo. Se agrupa en el servidor
+    según el zoom y se cachea por tesela hasta que algún turno cambia.
+    """
+    if not 0 <= z <= 20 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return respuestas.respuesta_json(request, {'error': 'Tesela fuera de rango'}, status=400)
+
+    # La versión de la caché cambia al guardar un turno; el día entra en la
+    # clave porque 'CONFIRMADO vigente' depende de la fecha.
+    datos = geo.tesela_cacheada(
+        f"turnos:{date.today().isoformat()}", z, x, y,
+        lambda: geo.tesela_geojson(turnos_en_mapa(), z, x, y),
+    )
+
+    return respuestas.respuesta_json(request, datos, max_age=30)
+
+@asincrono.login_requerido_async
+async def api_estadisticas(request):
     """
     Devuelve estadísticas con caché de 30 segundos para evitar saturación.
     """
-    # Intentar obtener de caché
-    cache_key = 'dashboard_stats_global'
-    stats = cache.get(cache_key)
-
-    if not stats:
-        # Si no existe, calcular
-        stats = Turno.objects.aggregate(
-            pendientes=Count('id', filter=Q(estado='PENDIENTE')),
-            confirmados=Count('id', filter=Q(estado='CONFIRMADO')),
-            rechazados=Count('id', filter=Q(estado='RECHAZADO')),
-            terminados=Count('id', filter=Q(estado='TERMINADO')),
-            cancelados=Count('id', filter=Q(estado='CANCELADO')),
-            no_realizadas=Count('id', filter=Q(estado='NO_REALIZADA')),
-        )
-        # Guardar en caché por 30 segundos
-        cache.set(cache_key, stats, 30)
-    
-    return JsonResponse(stats)
+    # Se calcula una sola vez por ventana aunque lleguen varias peticiones a la vez
+    stats = await cache.ESTADISTICAS.aobtener('global', lambda: Turno.objects.aaggregate(
+        pendientes=Count('id', filter=Q(estado='PENDIENTE')),
+        confirmados=Count('id', filter=Q(estado='CONFIRMADO')),
+        rechazados=Count('id', filter=Q(estado='RECHAZADO')),
+        terminados=Count('id', filter=Q(estado='TERMINADO')),
+        cancelados=Count('id', filter=Q(estado='CANCELADO')),
+        no_realizadas=Count('id', filter=Q(estado='NO_REALIZADA')),
+    ))
+    return respuestas.respuesta_json(request, stats)
 
 @login_required
 @user_passes_test(es_staff)
 def reportar_ausencia(request, turno_id):
     if request.method == 'POST':
-        turno = get_object_or_404(Turno, id=turno_id)
-        
-        # Solo se puede reportar ausencia el MISMO DÍA de la agenda
-        if turno.agenda.fecha != date.today():
-            messages.error(request, "Solo puede reportar ausencia el día de la inspección.")
-            return redirect('dashboard_staff')
-
-        turno.estado = 'AUSENTE'
-        turno.observaciones = "El inspector acudió al sitio pero no hubo atención."
-        turno.save()
-        
-        # Notificar al ciudadano
-        Notificacion.objects.create(
-            usuario=turno.establecimiento.propietario,
-            titulo="Visita Fallida 🏠",
-            mensaje="Nuestro inspector visitó su local hoy pero no fue atendido.",
-            tipo="WARNING",
-            link="/portal/"
+        # Solo se puede reportar ausencia el MISMO DÍA de la agenda.
+        # 'Ausente' se registra como NO_REALIZADA (el único estado válido para ese caso).
+        resultado = transiciones.transicionar(
+            turno_id, 'NO_REALIZADA', desde='CONFIRMADO', actor=request.user,
+            condicion=Q(fecha_agenda=date.today()),
+            campos={'observaciones': "El inspector acudió al sitio pero no hubo atención."},
+            aviso=("Visita Fallida 🏠", "Nuestro inspector visitó su local hoy pero no fue atendido.", 'WARNING'),
         )
-        
-        messages.warning(request, f"Turno marcado como CLIENTE AUSENTE.")
+        if resultado.ok:
+            messages.warning(request, f"Turno marcado como CLIENTE AUSENTE.")
+        else:
+            avisar_transicion_fallida(request, resultado, "Solo puede reportar ausencia el día de la inspección.")
             
     return redirect('dashboard_staff')
 
+@login_required
+@user_passes_test(es_staff)
+def metricas_prometheus(request):
+    """Expone las métricas del perfilamiento (por worker) en formato Prometheus."""
+    return HttpResponse(metricas.registro.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def error_404(request, exception):
     """Muestra la página de página no encontrada."""
     return render(request, '404.html', status=404)